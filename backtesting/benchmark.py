@@ -0,0 +1,321 @@
+# backtesting/benchmark.py
+"""
+Benchmark de throughput del stack de backtesting (velas/seg y pico de RSS).
+
+Genera velas sintéticas deterministas (mismo seed = mismas velas) en varios
+tamaños y mide por separado:
+  breakout_indicators  BreakoutBotStrategy.calculate_indicators
+  scalper_indicators   DataProcessor.calculate_indicators (batch)
+  volume_profile       volume_profile_series (288 velas, 100 bins)
+  signals              bucle de fidelidad 1h (get_signal vela a vela)
+  exits                simulate_exits con una entrada cada 50 velas
+  portfolio            run_realistic_sim sobre 4 símbolos (el tamaño se reparte)
+
+Cada caso corre en un proceso nuevo: el pico de RSS es solo suyo y no
+arrastra lo que dejaron los casos anteriores. Los resultados se agregan a
+backtesting/data/benchmarks/history.jsonl y cada caso se compara con la
+corrida más reciente de la misma máquina que lo midió sin regresión: si baja
+más de --threshold en velas/seg (o sube en RSS), se marca como regresión y el
+script sale con código 1. Los casos con regresión quedan marcados en el
+historial y no sirven de baseline (salvo --accept: el cambio es esperado).
+
+Uso:
+  python backtesting/benchmark.py                      # 10k, 100k y 1M velas
+  python backtesting/benchmark.py --sizes 10000,100000 --cases signals,exits
+  python backtesting/benchmark.py --no-save            # medir sin tocar el historial
+  python backtesting/benchmark.py --accept             # aceptar las regresiones como nuevo baseline
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import contextlib
+import subprocess
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCALPER_DIR = os.path.join(ROOT, 'bots', 'scalper_pro')
+sys.path.append(ROOT)
+sys.path.append(SCALPER_DIR)
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), 'data', 'benchmarks', 'history.jsonl')
+
+SIZES = [10_000, 100_000, 1_000_000]
+CASES = ['breakout_indicators', 'scalper_indicators', 'volume_profile', 'signals', 'exits', 'portfolio']
+REPEAT = 3                  # mejor de N (solo hasta 100k velas; 1M se corre una vez)
+THRESHOLD = 0.15            # caída tolerada en velas/seg antes de marcar regresión
+RSS_THRESHOLD = 0.25        # suba tolerada en pico de RSS
+SEED = 7
+START_MS = 1672531200000    # 2023-01-01
+TF_MS = 3_600_000           # 1h (la misma grilla para todos los casos)
+
+# Valores fijos de DataProcessor: el benchmark no depende del config local
+SCALPER_CONFIG = {'ATR_PERCENTILE': 0.25, 'VOLUME_MA_PERIOD': 20}
+
+BREAKOUT_PARAMS = {'sl_atr': 2.0, 'tp_partial_atr': 4.0, 'trailing_dist_atr': 3.0, 'vol_multiplier': 1.5}
+
+
+# ==============================================================================
+# DATOS Y MEMORIA
+# ==============================================================================
+
+def synthetic_ohlcv(n, seed=SEED, capitalized=False):
+    """n velas 1h deterministas (columnas open/high/... o Open/High/... con índice de fechas)."""
+    from shared.fake_exchange import synthetic_candles
+    rows = synthetic_candles(START_MS, START_MS + n * TF_MS, '1h', seed=seed)
+    df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    if capitalized:
+        df = df.set_index('timestamp').rename(columns=str.capitalize)
+    return df
+
+
+def _reset_peak_rss():
+    """Reinicia el high-water mark de RSS (Linux); en otros SO se mide el pico del proceso."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+# ==============================================================================
+# CASOS: setup(n) -> (función a medir, velas procesadas). El setup no se mide.
+# ==============================================================================
+
+def _breakout_indicators(n):
+    from bots.breakout.strategy import BreakoutBotStrategy
+    df = synthetic_ohlcv(n, capitalized=True)
+    strategy = BreakoutBotStrategy()
+    return lambda: strategy.calculate_indicators(df), n
+
+
+def _scalper_indicators(n):
+    import config
+    for name, value in SCALPER_CONFIG.items():
+        setattr(config, name, value)
+    from core.data_processor import DataProcessor
+    df = synthetic_ohlcv(n)
+    processor = DataProcessor()
+    return lambda: processor.calculate_indicators(df.copy()), n
+
+
+def _volume_profile(n):
+    from core.volume_profile import volume_profile_series
+    df = synthetic_ohlcv(n)
+    return lambda: volume_profile_series(df), n
+
+
+def _signals(n):
+    from run_backtest_1h import make_strategy, simulate_fidelity
+    from shared.bar_view import BarFrame
+    strategy = make_strategy(BREAKOUT_PARAMS)
+    frame = BarFrame(strategy.calculate_indicators(synthetic_ohlcv(n, capitalized=True)))
+    # Estrategia nueva por corrida: el estado (cooldown, trailing) no pasa de una a otra
+    return lambda: simulate_fidelity(make_strategy(BREAKOUT_PARAMS), frame), n
+
+
+def _exits(n):
+    from core.exit_simulator import simulate_exits
+    df = synthetic_ohlcv(n)
+    high, low, close = (df[c].to_numpy() for c in ('high', 'low', 'close'))
+    entry_idx = np.arange(50, n - 1, 50)
+    direction = np.where(np.arange(len(entry_idx)) % 2, -1, 1)
+    entry_price = close[entry_idx]
+    stop_dist = entry_price * 0.004
+    return lambda: simulate_exits(high, low, close, entry_idx, direction, entry_price, stop_dist), n
+
+
+def _portfolio(n):
+    import run_portfolio_backtest as rpb
+    from shared.timeline import Timeline
+    symbols = list(rpb.PORTFOLIO)[:4]
+    per_symbol = n // len(symbols)
+    frames, strategies = {}, {}
+    for seed, symbol in enumerate(symbols, start=SEED):
+        strat = rpb.make_strategy(rpb.PORTFOLIO[symbol]['params'])
+        frames[symbol] = strat.calculate_indicators(synthetic_ohlcv(per_symbol, seed=seed, capitalized=True))
+        strategies[symbol] = strat
+    tl = Timeline(frames)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            rpb.run_realistic_sim(tl, strategies)
+    return run, per_symbol * len(symbols)
+
+
+SETUPS = {
+    'breakout_indicators': _breakout_indicators,
+    'scalper_indicators': _scalper_indicators,
+    'volume_profile': _volume_profile,
+    'signals': _signals,
+    'exits': _exits,
+    'portfolio': _portfolio,
+}
+
+
+def run_case(case, n, repeat):
+    """Corre en un proceso nuevo: setup, reset del pico de RSS y mejor tiempo de 'repeat'."""
+    run, bars = SETUPS[case](n)
+    _reset_peak_rss()
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - t0)
+    return {'bars': bars, 'seconds': best, 'bars_per_sec': bars / best if best else 0.0,
+            'peak_rss_mb': _peak_rss_mb()}
+
+
+# ==============================================================================
+# HISTORIAL Y COMPARACIÓN
+# ==============================================================================
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, machine, names):
+    """
+    {caso: corrida} con la más reciente de la misma máquina (entre máquinas los
+    números no se comparan) que midió ese caso sin error ni regresión.
+    """
+    base = {}
+    for name in names:
+        for record in reversed(history):
+            result = record['results'].get(name)
+            if (record.get('machine') == machine and result and 'error' not in result
+                    and name not in record.get('regressions', [])):
+                base[name] = record
+                break
+    return base
+
+
+def compare(results, base, threshold=THRESHOLD, rss_threshold=RSS_THRESHOLD):
+    """[(caso, métrica, antes, ahora, cambio)] de lo que empeoró más de lo tolerado."""
+    regressions = []
+    for name, now in results.items():
+        before = base[name]['results'][name] if name in base else None
+        if not before or 'error' in now or 'error' in before:
+            continue
+        speed = now['bars_per_sec'] / before['bars_per_sec'] - 1 if before['bars_per_sec'] else 0.0
+        if speed < -threshold:
+            regressions.append((name, 'bars_per_sec', before['bars_per_sec'], now['bars_per_sec'], speed))
+        rss = now['peak_rss_mb'] / before['peak_rss_mb'] - 1 if before['peak_rss_mb'] else 0.0
+        if rss > rss_threshold:
+            regressions.append((name, 'peak_rss_mb', before['peak_rss_mb'], now['peak_rss_mb'], rss))
+    return regressions
+
+
+def run_benchmarks(sizes=SIZES, cases=CASES, repeat=REPEAT):
+    results = {}
+    ctx = mp.get_context('spawn')
+    for n in sizes:
+        for case in cases:
+            name = f"{case}@{n}"
+            print(f"⏱️  {name:<32}", end=" ", flush=True)
+            with ctx.Pool(1) as pool:
+                try:
+                    result = pool.apply(run_case, (case, n, repeat if n <= 100_000 else 1))
+                except Exception as e:
+                    result = {'error': f"{type(e).__name__}: {e}"}
+            results[name] = result
+            if 'error' in result:
+                print(f"❌ {result['error']}")
+            else:
+                print(f"{result['bars_per_sec']:>14,.0f} velas/s | {result['seconds']:8.3f}s | "
+                      f"RSS {result['peak_rss_mb']:7.1f} MB")
+    return results
+
+
+def print_comparison(results, base):
+    if not base:
+        print("\nℹ️ Sin corrida anterior en esta máquina: esta queda como baseline.")
+        return
+    print("\n📊 VS BASELINE")
+    for name, now in results.items():
+        if name not in base or 'error' in now:
+            print(f"   {name:<32} (sin baseline)")
+            continue
+        record = base[name]
+        before = record['results'][name]
+        change = now['bars_per_sec'] / before['bars_per_sec'] - 1 if before['bars_per_sec'] else 0.0
+        print(f"   {name:<32} {before['bars_per_sec']:>14,.0f} -> {now['bars_per_sec']:>14,.0f} ({change:+.1%}) "
+              f"| {record['timestamp']} commit {record.get('commit')}")
+
+
+def main(argv):
+    def option(name, default):
+        return argv[argv.index(name) + 1] if name in argv else default
+
+    sizes = [int(x) for x in option('--sizes', ','.join(map(str, SIZES))).split(',')]
+    cases = option('--cases', ','.join(CASES)).split(',')
+    unknown = [c for c in cases if c not in SETUPS]
+    if unknown:
+        print(f"❌ Casos desconocidos: {unknown} (disponibles: {CASES})")
+        return 2
+    threshold = float(option('--threshold', THRESHOLD))
+    repeat = int(option('--repeat', REPEAT))
+
+    machine = f"{platform.node()}|{platform.machine()}|{os.cpu_count()}"
+    print(f"🏁 BENCHMARK ({machine} | Python {platform.python_version()} | numpy {np.__version__} | pandas {pd.__version__})")
+    results = run_benchmarks(sizes, cases, repeat)
+
+    history = load_history()
+    base = baseline(history, machine, results)
+    print_comparison(results, base)
+    regressions = compare(results, base, threshold)
+    for name, metric, before, now, change in regressions:
+        print(f"🚨 REGRESIÓN {name} {metric}: {before:,.1f} -> {now:,.1f} ({change:+.1%})")
+    if base and not regressions:
+        print("✅ Sin regresiones.")
+    accept = '--accept' in argv
+    if regressions and accept:
+        print("👌 Regresiones aceptadas (--accept): esta corrida queda como baseline.")
+
+    if '--no-save' not in argv:
+        record = {'timestamp': pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds'),
+                  'commit': _git_commit(), 'machine': machine,
+                  'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                  'results': results,
+                  # Casos con regresión no aceptada: quedan en el historial pero no como baseline
+                  'regressions': [] if accept else sorted({r[0] for r in regressions})}
+        os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+        with open(HISTORY_PATH, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"💾 Historial: {HISTORY_PATH}")
+    return 1 if regressions and not accept else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
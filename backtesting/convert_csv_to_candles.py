@@ -0,0 +1,59 @@
+import sys
+import os
+import glob
+import time
+import pandas as pd
+
+# Convierte una sola vez los CSV de caché (data/, data_futures/) al formato
+# columnar .candles. Los CSV quedan como estaban; los scripts prefieren el .candles.
+# Uso: python convert_csv_to_candles.py [--float32]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.candle_format import EXT, write_candles, read_candles
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIRS = [os.path.join(BASE_DIR, 'data'), os.path.join(BASE_DIR, 'data_futures')]
+
+
+def convert_all(dtype='float64'):
+    print(f"🔄 CONVIRTIENDO CSV -> {EXT} ({dtype})...\n")
+    total_csv = total_bin = 0
+
+    for data_dir in DATA_DIRS:
+        for csv_path in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+            name = os.path.basename(csv_path)
+            try:
+                df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+                out_path = csv_path[:-4] + EXT
+                write_candles(out_path, df, dtype=dtype)
+            except (KeyError, ValueError, TypeError) as e:
+                # No es un CSV de velas (ej: funding, trades exportados)
+                print(f"⏭️  {name}: no es OHLCV ({e})")
+                continue
+
+            # Verificación rápida: mismas filas
+            check = read_candles(out_path)
+            if len(check) != len(df):
+                print(f"❌ {name}: {len(df)} filas en CSV vs {len(check)} en {EXT}")
+                continue
+
+            csv_size = os.path.getsize(csv_path); bin_size = os.path.getsize(out_path)
+            total_csv += csv_size; total_bin += bin_size
+            print(f"✅ {name:<35} {len(df):>7} velas | {csv_size/1e6:6.2f} MB -> {bin_size/1e6:6.2f} MB")
+
+    if total_csv:
+        print(f"\n📦 Total: {total_csv/1e6:.1f} MB (CSV) -> {total_bin/1e6:.1f} MB ({EXT})")
+
+
+def benchmark_load():
+    # Lectura de todo lo convertido (lo que hacen los backtests al arrancar)
+    files = [f for d in DATA_DIRS for f in glob.glob(os.path.join(d, f'*{EXT}'))]
+    if not files: return
+    t0 = time.perf_counter()
+    rows = sum(len(read_candles(f)) for f in files)
+    elapsed = time.perf_counter() - t0
+    print(f"⏱️  Carga de {len(files)} archivos ({rows} velas): {elapsed*1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    convert_all('float32' if '--float32' in sys.argv else 'float64')
+    benchmark_load()
@@ -10,6 +10,9 @@ if PROJECT_ROOT not in sys.path: sys.path.append(PROJECT_ROOT)
 
 try:
     from bots.breakout.strategy import BreakoutBotStrategy
+    from shared.candle_format import EXT, load_ohlcv
+    from shared.resample import resample_frame
+    from shared.timeline import Timeline
     print("✅ Estrategia importada.")
 except ImportError as e:
     sys.exit(1)
@@ -42,6 +45,11 @@ CONFIG = {
 # Generamos el portfolio dict estándar
 PORTFOLIO = {k: {'tf': '4h'} for k in CONFIG.keys()}
 
+def find_candle_files(pattern):
+    # Rutas sin extensión (.candles o .csv) que matchean el patrón
+    files = glob.glob(pattern + EXT) + glob.glob(pattern + '.csv')
+    return sorted({os.path.splitext(f)[0] for f in files})
+
 def clean_columns(df):
     df.columns = [c.strip().capitalize() for c in df.columns]
     rename_map = {'Vol': 'Volume', 'Vol.': 'Volume', 'Op': 'Open', 'Hi': 'High', 'Lo': 'Low', 'Cl': 'Close'}
@@ -55,12 +63,12 @@ def run_debug_sim():
     print("\n🛠️ CARGANDO DATOS Y APLICANDO 'SMART TRAILING'...")
     for symbol in PORTFOLIO.keys():
         safe_symbol = symbol.replace('/', '_')
-        pattern = os.path.join(DATA_DIR, f"{safe_symbol}_4h*.csv")
-        files = glob.glob(pattern)
+        pattern = os.path.join(DATA_DIR, f"{safe_symbol}_4h*")
+        files = find_candle_files(pattern)
         
         if not files:
-            pattern_1h = os.path.join(DATA_DIR, f"{safe_symbol}_1h*.csv")
-            files = glob.glob(pattern_1h)
+            pattern_1h = os.path.join(DATA_DIR, f"{safe_symbol}_1h*")
+            files = find_candle_files(pattern_1h)
             tf_source = '1h'
         else:
             tf_source = '4h'
@@ -69,12 +77,11 @@ def run_debug_sim():
         target_file = next((f for f in files if "FULL" in f), files[0])
         
         try:
-            df = pd.read_csv(target_file, index_col=0, parse_dates=True)
+            df = load_ohlcv(target_file) # .candles si existe, si no el CSV
             df = clean_columns(df)
             
             if tf_source == '1h':
-                logic = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
-                df = df.resample('4h').agg(logic).dropna()
+                df = resample_frame(df, '4h')
             
             strat = BreakoutBotStrategy()
             
@@ -102,39 +109,36 @@ def run_debug_sim():
 
     if not market_data: return
 
-    # REGIMEN BTC
-    btc_regime = pd.Series(True, index=pd.date_range('2023-01-01', '2025-12-31', freq='4h'))
+    # REGIMEN BTC (vigente en cada paso vía el eje común, sin reindex/get_indexer)
     if 'BTC/USDT' in market_data:
         btc_df = market_data['BTC/USDT']
         btc_sma = btc_df['Close'].rolling(window=200).mean()
-        btc_is_bullish = btc_df['Close'] > btc_sma
-        btc_regime = btc_is_bullish.reindex(btc_regime.index, method='ffill').fillna(False)
+        market_data['BTC/USDT'] = btc_df.assign(Bullish=btc_df['Close'] > btc_sma)
+
+    # Eje común: todo el bucle trabaja con índices enteros (símbolo k, paso t)
+    tl = Timeline(market_data, fields=('Low', 'Bullish'))
+    low = tl.field('Low')
+    btc_k = tl.symbols.index('BTC/USDT') if 'BTC/USDT' in market_data else None
+    btc_bullish = tl.field('Bullish')[btc_k] == 1.0 if btc_k is not None else None
+    check_order = [tl.symbols.index(sym) for sym in PORTFOLIO if sym in market_data and sym != 'BTC/USDT']
 
-    full_timeline = sorted(list(set().union(*[df.index for df in market_data.values()])))
     wallet = INITIAL_CAPITAL
     bot_memory = {sym: {'status': 'WAITING_BREAKOUT', 'last_exit_time': None} for sym in PORTFOLIO}
-    active_positions = {} 
+    active_positions = {}   # {k: posición}
     
     symbol_stats = {sym: {'trades': 0, 'pnl': 0.0, 'wins': 0} for sym in PORTFOLIO}
     
     print(f"\n🚀 SIMULACIÓN ($1k Start)...")
     
-    for i, current_time in enumerate(full_timeline):
-        
-        is_macro_bullish = True
-        try:
-            if 'BTC/USDT' in market_data:
-                idx = btc_regime.index.get_indexer([current_time], method='pad')[0]
-                if idx != -1: is_macro_bullish = btc_regime.iloc[idx]
-        except: pass
+    for t in range(len(tl)):
+        is_macro_bullish = True if btc_bullish is None else btc_bullish[t]
 
         # A) SALIDAS
         closed_ids = []
-        for sym, pos in active_positions.items():
-            df = market_data[sym]
-            if current_time not in df.index: continue
+        for k, pos in active_positions.items():
+            if not tl.valid[k, t]: continue
             
-            curr = df.loc[current_time]
+            sym = tl.symbols[k]
             strat = strategies[sym]
             st = {
                 'status': 'IN_POSITION', 'entry_price': pos['entry'], 'stop_loss': pos['sl'],
@@ -142,9 +146,7 @@ def run_debug_sim():
                 'trailing_active': pos['trail'], 'highest_price_post_tp': pos['h_post']
             }
             
-            idx = df.index.get_loc(current_time)
-            window = df.iloc[max(0, idx-50):idx+1]
-            signal = strat.get_signal(window, st)
+            signal = strat.get_signal(tl.window(k, t), st)
             act = signal['action']
 
             if act == 'EXIT_PARTIAL':
@@ -153,36 +155,33 @@ def run_debug_sim():
                 wallet += (pos['risk_blocked'] * 0.5) + realized
                 pos['coins'] *= 0.5; pos['risk_blocked'] *= 0.5; pos['size_pct'] = 0.5
                 pos['sl'] = signal['new_sl']; pos['trail'] = True; pos['h_post'] = signal['highest_price_post_tp']
-                active_positions[sym] = pos
                 symbol_stats[sym]['pnl'] += realized
 
             elif act in ['EXIT_SL', 'EXIT_TRAILING']:
-                exit_price = min(curr['Low'], pos['sl'])
+                exit_price = min(low[k, t], pos['sl'])
                 realized = (pos['coins'] * exit_price) - (pos['coins'] * pos['entry'])
                 wallet += pos['risk_blocked'] + realized
-                closed_ids.append(sym)
-                bot_memory[sym] = {'status': 'COOLDOWN', 'last_exit_time': str(current_time)}
+                closed_ids.append(k)
+                bot_memory[sym] = {'status': 'COOLDOWN', 'last_exit_time': str(tl.dates[t])}
                 symbol_stats[sym]['pnl'] += realized
                 symbol_stats[sym]['trades'] += 1
                 if realized > 0: symbol_stats[sym]['wins'] += 1
 
             elif act == 'UPDATE_TRAILING':
                 pos['sl'] = signal['new_sl']; pos['h_post'] = signal['highest_price_post_tp']
-                active_positions[sym] = pos
 
-        for sym in closed_ids: del active_positions[sym]
+        for k in closed_ids: del active_positions[k]
 
         # B) ENTRADAS
         if len(active_positions) >= MAX_OPEN_POSITIONS: continue
         if not is_macro_bullish: continue
         
         # Filtro Cluster
-        active_types = [CONFIG[s]['type'] for s in active_positions.keys()]
+        active_types = [CONFIG[tl.symbols[k]]['type'] for k in active_positions]
 
-        for sym in PORTFOLIO.keys():
-            if sym in active_positions: continue
-            if sym not in market_data: continue
-            if sym == 'BTC/USDT': continue 
+        for k in check_order:
+            if k in active_positions: continue
+            sym = tl.symbols[k]
             
             # FILTRO CLUSTER: Si ya hay un MEME, no entro en otro MEME.
             # (Opcional: Si tienes 3 cupos y 4 memes en Tier S, quizás quieras relajar esto? 
@@ -192,16 +191,12 @@ def run_debug_sim():
 
             if len(active_positions) >= MAX_OPEN_POSITIONS: break
             
-            df = market_data[sym]
-            if current_time not in df.index: continue
-            
-            idx = df.index.get_loc(current_time)
-            if idx < 50: continue
-            window = df.iloc[idx-50 : idx+1]
+            if not tl.valid[k, t]: continue
+            if tl.pos[k, t] < 50: continue
             st_mem = bot_memory.get(sym, {'status': 'WAITING_BREAKOUT'})
             
             try:
-                signal = strategies[sym].get_signal(window, st_mem)
+                signal = strategies[sym].get_signal(tl.window(k, t), st_mem)
                 
                 if signal['action'] == 'ENTER_LONG':
                     entry = signal['entry_price']
@@ -223,7 +218,7 @@ def run_debug_sim():
                             coins = (wallet * 0.4) / entry; risk_amt = coins * dist
                         
                         wallet -= risk_amt
-                        active_positions[sym] = {
+                        active_positions[k] = {
                             'entry': entry, 'sl': sl, 'tp': signal['tp_partial'],
                             'coins': coins, 'size_pct': 1.0, 'trail': False, 
                             'h_post': 0.0, 'risk_blocked': risk_amt
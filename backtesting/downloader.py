@@ -1,7 +1,10 @@
-import ccxt
-import pandas as pd
 import os
-import time
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.candle_format import EXT, write_candles
+from shared.candle_store import CandleStore
+from shared.async_downloader import download_history
 
 # --- CONFIGURACIÓN ---
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
@@ -18,42 +21,23 @@ TIMEFRAME = '4h'
 START_DATE = "2023-01-01 00:00:00"
 
 def download_data():
-    exchange = ccxt.binance({'enableRateLimit': True})
-    since_ms = exchange.parse8601(START_DATE)
-    
     print(f"🚀 DESCARGANDO DATA 'HIGH OCTANE' ({TIMEFRAME})...\n")
 
+    # Todos los símbolos en paralelo; lo ya bajado queda en el caché de velas
+    download_history(SYMBOLS, [TIMEFRAME], START_DATE, market_type='spot')
+
+    # Exportamos al archivo que leen los backtests
+    store = CandleStore(offline=True)
     for symbol in SYMBOLS:
-        print(f"⏳ {symbol}...", end=" ")
-        all_candles = []
-        current_since = since_ms
-        
-        while True:
-            try:
-                candles = exchange.fetch_ohlcv(symbol, timeframe=TIMEFRAME, since=current_since, limit=1000)
-                if not candles: break
-                all_candles += candles
-                current_since = candles[-1][0] + 1
-                if len(candles) < 1000: break
-                time.sleep(exchange.rateLimit / 1000)
-                print(".", end="", flush=True)
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                break
-        
-        if not all_candles: continue
-
-        df = pd.DataFrame(all_candles, columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        df['Date'] = pd.to_datetime(df['Timestamp'], unit='ms')
-        df.set_index('Date', inplace=True)
-        df.drop(columns=['Timestamp'], inplace=True)
-        
+        df = store.load(symbol, TIMEFRAME, START_DATE)
+        if df.empty: continue
+
         safe_symbol = symbol.replace('/', '_')
         if safe_symbol == 'PEPE_USDT': safe_symbol = '1000PEPE_USDT'
             
-        path = os.path.join(DATA_DIR, f"{safe_symbol}_{TIMEFRAME}_FULL.csv")
-        df.to_csv(path)
-        print(f" ✅ ({len(df)})")
+        path = os.path.join(DATA_DIR, f"{safe_symbol}_{TIMEFRAME}_FULL{EXT}")
+        write_candles(path, df)
+        print(f"💾 {symbol} ✅ ({len(df)})")
 
 if __name__ == "__main__":
-    download_data()
\ No newline at end of file
+    download_data()
@@ -1,7 +1,11 @@
-import ccxt
-import pandas as pd
 import os
-import time
+import sys
+import asyncio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.candle_format import EXT, write_candles
+from shared.candle_store import CandleStore
+from shared.async_downloader import AsyncDownloader, create_exchange, usdt_perpetuals
 
 # --- CONFIGURACIÓN ---
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data_futures') # Guardamos en carpeta separada
@@ -21,49 +25,35 @@ SYMBOLS = [
 TIMEFRAME = '4h'
 START_DATE = "2023-01-01 00:00:00"
 
-def download_futures_data():
-    # INSTANCIAMOS BINANCE FUTURES
-    exchange = ccxt.binance({
-        'enableRateLimit': True,
-        'options': {'defaultType': 'future'} # <--- LA CLAVE
-    })
-    
-    since_ms = exchange.parse8601(START_DATE)
-    print(f"🚀 DESCARGANDO FUTUROS PERPETUOS ({TIMEFRAME})...\n")
+async def download_all(all_markets=False):
+    # INSTANCIAMOS BINANCE FUTURES (cliente async, rate limit por peso compartido)
+    exchange = create_exchange('future')
+    try:
+        symbols = await usdt_perpetuals(exchange) if all_markets else SYMBOLS
+        print(f"🚀 DESCARGANDO FUTUROS PERPETUOS ({TIMEFRAME}) | {len(symbols)} pares en paralelo...\n")
+        downloader = AsyncDownloader(exchange, market_type='future')
+        await downloader.run(symbols, [TIMEFRAME], START_DATE)
+        return symbols
+    finally:
+        await exchange.close()
 
-    for symbol in SYMBOLS:
-        print(f"⏳ {symbol}...", end=" ")
-        all_candles = []
-        current_since = since_ms
-        
-        while True:
-            try:
-                candles = exchange.fetch_ohlcv(symbol, timeframe=TIMEFRAME, since=current_since, limit=1000)
-                if not candles: break
-                all_candles += candles
-                current_since = candles[-1][0] + 1
-                if len(candles) < 1000: break
-                time.sleep(exchange.rateLimit / 1000)
-                print(".", end="", flush=True)
-            except Exception as e:
-                # A veces el ticker cambia nombre (ej: 1000PEPE vs PEPE)
-                print(f"❌ Error: {e}")
-                break
-        
-        if not all_candles: continue
+def download_futures_data(all_markets=False):
+    symbols = asyncio.run(download_all(all_markets))
+
+    # Exportamos con el nombre de archivo que usan los backtests
+    store = CandleStore(offline=True)
+    for symbol in symbols:
+        df = store.load(symbol, TIMEFRAME, START_DATE, market_type='future')
+        if df.empty: continue
 
-        df = pd.DataFrame(all_candles, columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        df['Date'] = pd.to_datetime(df['Timestamp'], unit='ms')
-        df.set_index('Date', inplace=True)
-        df.drop(columns=['Timestamp'], inplace=True)
-        
         # Nombre de archivo distintivo
-        safe_symbol = symbol.replace('/', '')
-        filename = f"{safe_symbol}_{TIMEFRAME}_FUTURES.csv"
+        safe_symbol = symbol.split(':')[0].replace('/', '')
+        filename = f"{safe_symbol}_{TIMEFRAME}_FUTURES{EXT}"
         path = os.path.join(DATA_DIR, filename)
         
-        df.to_csv(path)
-        print(f" ✅ ({len(df)} velas)")
+        write_candles(path, df)
+        print(f"💾 {symbol} ✅ ({len(df)} velas)")
 
 if __name__ == "__main__":
-    download_futures_data()
\ No newline at end of file
+    # --all: todo el universo de perpetuos USDT
+    download_futures_data(all_markets='--all' in sys.argv)
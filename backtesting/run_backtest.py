@@ -11,28 +11,35 @@ from tabulate import tabulate
 # Esto garantiza que usamos LA MISMA lógica que el bot en vivo
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from bots.breakout.strategy import BreakoutBotStrategy
+from shared.candle_format import EXT, load_ohlcv, write_candles
+from shared.bar_view import BarFrame
+from shared.result_cache import cached_result, cached_indicators, make_key, data_hash, params_hash, source_hash
+from shared.intrabar import LazyIntrabar, SL_FIRST
+from shared.timeline import index_to_ms
+from shared.market_cache import load_markets
 
 # Configuración
 TIMEFRAME = '4h'
 SINCE_STR = "2023-01-01 00:00:00" # Backtest desde 2023
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 FEE_TAKER = 0.0006 # 0.06% (0.05% Binance + 0.01% Slippage estimado)
+INTRABAR = True # Vela que toca SL y TP: orden real con velas 1m (Futuros), bajadas solo para esas velas
 
 if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
 
 def fetch_full_history(symbol, timeframe, since_str):
     """Descarga datos usando la misma API de Futuros que producción."""
     safe_symbol = symbol.replace('/', '_').replace(':', '_')
-    csv_path = os.path.join(DATA_DIR, f"{safe_symbol}_{timeframe}.csv")
+    cache_path = os.path.join(DATA_DIR, f"{safe_symbol}_{timeframe}")
     
-    if os.path.exists(csv_path):
+    df = load_ohlcv(cache_path) # .candles (o CSV viejo)
+    if df is not None:
         print(f"📂 Cargando {symbol} desde caché...")
-        df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
         return df
 
     print(f"📥 Descargando historial de {symbol} (Futuros)...")
     exchange = ccxt.binance({'enableRateLimit': True, 'options': {'defaultType': 'future'}})
-    exchange.load_markets()
+    load_markets(exchange)   # caché en disco compartida con los bots
     
     since = exchange.parse8601(since_str)
     all_ohlcv = []
@@ -54,13 +61,43 @@ def fetch_full_history(symbol, timeframe, since_str):
     df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     df.set_index('timestamp', inplace=True)
-    df.to_csv(csv_path)
+    write_candles(cache_path + EXT, df)
     return df
 
-def run_fidelity_simulation(symbol, df, strategy_params):
+def run_fidelity_simulation(symbol, df, strategy_params, intrabar=False):
     """
     Simulación de Alta Fidelidad: Replica el bucle while True del main_breakout.py
+    Si las velas, el código y los parámetros no cambiaron, sale del caché de resultados.
+    intrabar: resolver SL/TP dentro de la vela con 1m de Futuros (solo velas ambiguas).
     """
+    key = make_key('fidelity', TIMEFRAME, symbol, data_hash(df), params_hash(strategy_params), FEE_TAKER,
+                   'm1-future' if intrabar else None,
+                   source_hash(BreakoutBotStrategy, simulate_fidelity, resolve_exit, LazyIntrabar))
+    result = cached_result(key, lambda: simulate_fidelity(symbol, df, strategy_params, intrabar))
+    return result['summary']['equity'], result['summary']['trades']
+
+def resolve_exit(intrabar, i, action, state, frame):
+    """
+    Con velas 1m: si la vela toca TP parcial y SL, el orden real decide (la estrategia
+    asume TP primero); y el stop se llena en la apertura del minuto si abrió pasado el nivel.
+    El 1m solo se baja para las velas ambiguas; un stop simple usa el gap solo si
+    el 1m de esa vela ya estaba cargado.
+    Devuelve (acción, precio de salida del stop).
+    """
+    stop = state.get('stop_loss')
+    if action == 'EXIT_PARTIAL' and frame.columns['Low'][i] <= stop:
+        first, minute = intrabar.first_touch(i, True, stop, state['tp_partial'])
+        if first != SL_FIRST:
+            return action, stop
+        action = 'EXIT_SL'
+    elif action in ('EXIT_SL', 'EXIT_TRAILING') and intrabar.loaded(i):
+        minute = intrabar.first_touch(i, True, stop, np.inf)[1]
+    else:
+        return action, stop
+    return action, intrabar.stop_fill(minute, True, stop)
+
+def simulate_fidelity(symbol, df, strategy_params, intrabar=False):
+    """Devuelve (resumen, log de trades, curva de equity)."""
     # 1. Instanciar la MISMA clase de estrategia
     strategy = BreakoutBotStrategy()
     strategy.sl_atr = strategy_params['sl_atr']
@@ -68,8 +105,8 @@ def run_fidelity_simulation(symbol, df, strategy_params):
     strategy.trailing_dist_atr = strategy_params['trailing_dist_atr']
     strategy.vol_multiplier = strategy_params['vol_multiplier']
 
-    # 2. Calcular indicadores (igual que en producción)
-    df = strategy.calculate_indicators(df.copy())
+    # 2. Calcular indicadores (igual que en producción; reusados si las velas no cambiaron)
+    df = cached_indicators(df, strategy.calculate_indicators, BreakoutBotStrategy)
     
     # Estado inicial (Simula el JSON vacío)
     state = {'status': 'WAITING_BREAKOUT'}
@@ -78,18 +115,24 @@ def run_fidelity_simulation(symbol, df, strategy_params):
     equity = 1000.0  # Capital inicial simulado
     initial_equity = equity
     
+    # Indicadores a numpy una sola vez: cada vela es una vista, no un corte del DataFrame
+    frame = BarFrame(df)
+    intrabar = LazyIntrabar(symbol, index_to_ms(df.index), TIMEFRAME, market_type='future') if intrabar else None
+    
     # --- BUCLE VELA A VELA (Simulando el paso del tiempo) ---
     # Empezamos en 200 para dar espacio a la EMA200
     for i in range(200, len(df)):
         # Simulamos que "df" es lo que el bot ve en ese momento (ohlcv limit=300)
-        # Cortamos el dataframe hasta la vela 'i'
-        current_window = df.iloc[:i+1]
-        current_candle = current_window.iloc[-1]
-        current_date = current_window.index[-1]
+        # Ventana hasta la vela 'i' (equivale a df.iloc[:i+1], sin copiar)
+        current_window = frame.window(i)
+        current_date = frame.dates[i]
         
         # 3. Obtener Señal (Igual que main.py)
         signal = strategy.get_signal(current_window, state)
         action = signal['action']
+        stop_fill = state.get('stop_loss')
+        if intrabar is not None:
+            action, stop_fill = resolve_exit(intrabar, i, action, state, frame)
         
         # --- REPLICANDO LA LÓGICA DE EJECUCIÓN DEL MAIN ---
         
@@ -148,7 +191,7 @@ def run_fidelity_simulation(symbol, df, strategy_params):
 
         elif action in ['EXIT_SL', 'EXIT_TRAILING']:
             # main.py: Cierra lo que queda (100% o 50%)
-            exit_price = state['stop_loss']
+            exit_price = stop_fill
             entry_price = state['entry_price']
             size_pct = state['position_size_pct'] # 1.0 o 0.5
             
@@ -177,7 +220,8 @@ def run_fidelity_simulation(symbol, df, strategy_params):
         elif action == 'RESET_STATE':
              state['status'] = 'WAITING_BREAKOUT'
 
-    return equity, len(trades)
+    equity_curve = [[t[0], t[-1]] for t in trades]
+    return {'equity': equity, 'trades': len(trades)}, trades, equity_curve
 
 if __name__ == "__main__":
     results = []
@@ -207,7 +251,7 @@ if __name__ == "__main__":
                 print(f"⚠️ Sin datos para {symbol}")
                 continue
 
-            final_cap, num_trades = run_fidelity_simulation(symbol, df, params)
+            final_cap, num_trades = run_fidelity_simulation(symbol, df, params, INTRABAR)
             
             roi = ((final_cap - 1000) / 1000) * 100
             color_roi = f"\033[92m{roi:.2f}%\033[0m" if roi > 0 else f"\033[91m{roi:.2f}%\033[0m"
@@ -10,6 +10,11 @@ from tabulate import tabulate
 # --- IMPORTACIÓN DE ESTRATEGIA ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from bots.breakout.strategy import BreakoutBotStrategy
+from shared.candle_format import EXT, load_ohlcv, write_candles
+from shared.bar_view import BarFrame
+from shared.sweep import run_sweep, ranking, results_path
+from shared.timeline import index_to_ms
+from shared.result_cache import cached_result, cached_indicators, make_key, data_hash, params_hash, source_hash
 
 # --- CONFIGURACIÓN DEL EXPERIMENTO ---
 TIMEFRAME = '1h'
@@ -35,12 +40,12 @@ configs = {
 
 def fetch_full_history(symbol, timeframe, since_str):
     safe_symbol = symbol.replace('/', '_').replace(':', '_')
-    csv_path = os.path.join(DATA_DIR, f"{safe_symbol}_{timeframe}_FULL.csv")
+    cache_path = os.path.join(DATA_DIR, f"{safe_symbol}_{timeframe}_FULL")
     
-    # Si existe, cargamos y chequeamos si tiene datos viejos
-    if os.path.exists(csv_path):
+    # Si existe (.candles o CSV viejo), cargamos y chequeamos si tiene datos viejos
+    df = load_ohlcv(cache_path)
+    if df is not None:
         print(f"📂 Cargando {symbol} desde caché...", end=" ")
-        df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
         # Si el caché empieza después de lo que pedimos, forzamos descarga nueva
         if df.index[0] > pd.to_datetime(since_str):
             print("Datos insuficientes (necesitamos 2023). Descargando de nuevo...")
@@ -70,27 +75,45 @@ def fetch_full_history(symbol, timeframe, since_str):
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     df.set_index('timestamp', inplace=True)
     df = df[~df.index.duplicated(keep='first')]
-    df.to_csv(csv_path)
+    write_candles(cache_path + EXT, df)
     return df
 
-def run_fidelity_simulation(symbol, df, strategy_params):
+def make_strategy(strategy_params):
     strategy = BreakoutBotStrategy()
     strategy.sl_atr = strategy_params['sl_atr']
     strategy.tp_partial_atr = strategy_params['tp_partial_atr']
     strategy.trailing_dist_atr = strategy_params['trailing_dist_atr']
     strategy.vol_multiplier = strategy_params['vol_multiplier']
+    if 'cooldown' in strategy_params: strategy.cooldown_candles = strategy_params['cooldown']
+    return strategy
+
+def run_fidelity_simulation(symbol, df, strategy_params):
+    # Mismas velas + mismo código + mismos parámetros -> sale del caché sin simular
+    key = make_key('fidelity', TIMEFRAME, symbol, data_hash(df), params_hash(strategy_params), FEE_TAKER,
+                   source_hash(BreakoutBotStrategy, make_strategy, simulate_fidelity))
+    result = cached_result(key, lambda: _simulate(df, strategy_params))
+    return result['summary']['equity'], result['summary']['trades']
+
+def _simulate(df, strategy_params):
+    strategy = make_strategy(strategy_params)
 
     # Calculamos indicadores sobre TODO el dataframe para no perder EMAs al cortar años
-    df = strategy.calculate_indicators(df.copy())
+    # (si las velas no cambiaron, el DataFrame de indicadores sale del caché)
+    df = cached_indicators(df, strategy.calculate_indicators, BreakoutBotStrategy)
     
+    equity, trades = simulate_fidelity(strategy, BarFrame(df))   # vistas numpy en vez de df.iloc[:i+1] por vela
+    return {'equity': equity, 'trades': len(trades)}, trades, [[t[0], t[-1]] for t in trades]
+
+def simulate_fidelity(strategy, frame):
+    """Bucle vela a vela sobre indicadores ya calculados (BarFrame)."""
     state = {'status': 'WAITING_BREAKOUT'}
     trades = []
     equity = 1000.0
     
     # IMPORTANTE: Empezamos en 200 para tener indicadores listos
-    for i in range(200, len(df)):
-        current_window = df.iloc[:i+1]
-        current_date = current_window.index[-1]
+    for i in range(200, len(frame)):
+        current_window = frame.window(i)
+        current_date = frame.dates[i]
         
         signal = strategy.get_signal(current_window, state)
         action = signal['action']
@@ -136,6 +159,7 @@ def run_fidelity_simulation(symbol, df, strategy_params):
             gross_profit = amount * pnl_pct
             fee = amount * FEE_TAKER
             equity += (gross_profit - fee)
+            trades.append([current_date, action, pnl_pct*100, equity])
             
             state = {'status': 'COOLDOWN', 'last_exit_time': str(current_date)}
 
@@ -144,9 +168,42 @@ def run_fidelity_simulation(symbol, df, strategy_params):
             if 'breakout_level' in signal: state['breakout_level'] = signal['breakout_level']
             if 'atr_at_breakout' in signal: state['atr_at_breakout'] = signal['atr_at_breakout']
             
-    return equity, len(trades) # (Nota: equity es acumulativo)
+    return equity, trades # (Nota: equity es acumulativo)
+
+# --- SWEEP (python run_backtest_1h.py --sweep) ---
+# Grilla por símbolo sobre todo el historial; los indicadores no dependen de estos
+# parámetros, así que se calculan una vez y viajan a los workers en memoria compartida.
+SWEEP_GRID = {
+    'sl_atr': [1.5, 2.0, 2.5, 3.0],
+    'tp_partial_atr': [3.0, 4.0, 5.0, 6.0],
+    'trailing_dist_atr': [2.0, 2.5, 3.0, 3.5, 4.0],
+    'vol_multiplier': [1.5],
+    'cooldown': [5, 10, 20],
+}
 
-if __name__ == "__main__":
+def sweep_evaluate(arrays, params):
+    """Función del sweep: corre en los workers sobre los arrays compartidos."""
+    index = pd.to_datetime(arrays['timestamp'], unit='ms')
+    final_cap, trades = simulate_fidelity(make_strategy(params), BarFrame.from_arrays(arrays, index))
+    return {'equity': float(final_cap), 'roi': (final_cap - 1000) / 10, 'trades': len(trades)}
+
+def run_parameter_sweep(workers=None):
+    datasets = {}
+    for symbol in configs:
+        df = fetch_full_history(symbol, TIMEFRAME, SINCE_STR)
+        if df.empty: continue
+        df = cached_indicators(df, BreakoutBotStrategy().calculate_indicators, BreakoutBotStrategy)
+        columns = {col: df[col].to_numpy() for col in df.columns}
+        columns['timestamp'] = index_to_ms(df.index)
+        datasets[symbol] = columns
+
+    path = results_path(f"breakout_{TIMEFRAME}")
+    version = make_key(source_hash(BreakoutBotStrategy, make_strategy, simulate_fidelity, sweep_evaluate), FEE_TAKER)
+    run_sweep(datasets, SWEEP_GRID, sweep_evaluate, path, workers=workers, metric='roi', version=version)
+    top = ranking(path, 'roi', top=25, min_trades=10)
+    print(tabulate(top, headers='keys', tablefmt='grid', showindex=False))
+
+def run_yearly_backtest():
     print(f"🚀 BACKTEST ANUALIZADO (1H) - {SINCE_STR[:4]} a HOY")
     
     for year in TEST_YEARS:
@@ -187,4 +244,10 @@ if __name__ == "__main__":
                 results.append([symbol, "ERROR", str(e)[:10]])
 
         print(tabulate(results, headers=['Par', 'Capital Final ($1000)', 'ROI %'], tablefmt='grid'))
-        print(f"💰 PnL Año {year}: ${total_profit:.2f}")
\ No newline at end of file
+        print(f"💰 PnL Año {year}: ${total_profit:.2f}")
+
+if __name__ == "__main__":
+    if '--sweep' in sys.argv:
+        run_parameter_sweep()
+    else:
+        run_yearly_backtest()
\ No newline at end of file
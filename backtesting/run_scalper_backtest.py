@@ -4,6 +4,10 @@ import ccxt
 import os
 import sys
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bots.scalper_pro.core.exit_simulator import simulate_exits, V64_RULES
+from shared.candle_store import get_store
+
 # ==============================================================================
 # 🎛️ CONFIGURACIÓN V7 (TREND FILTERED MEAN REVERSION)
 # ==============================================================================
@@ -30,6 +34,24 @@ TEST_MAP = {
     'AVAX/USDT': 'TREND_SCALPER'
 }
 
+# Gestión: SL -1R, TP en tp_mult, stop a BE al tocar 1R, time stop en 287 velas
+# (niveles en precio, igual que sl_price/tp_price/be_trigger)
+SCALPER_EXIT_RULES = dict(V64_RULES, checkpoints=[], sl=-1.0, tp1=1.0, tp1_floor=None,
+                          be_after_tp1=True, time_stop=287, order=('sl', 'tp2', 'tp1', 'time'),
+                          levels='price')
+
+# Modo streaming (python run_scalper_backtest.py --stream): lee el candle store en
+# bloques y arrastra entre bloques el warm-up de indicadores y los trades abiertos.
+# La memoria queda acotada por STREAM_BLOCK sin importar cuántos años se prueben
+# (años de 1m de varios símbolos entran en el límite de 1G del docker-compose).
+# También en la primera corrida: el store baja y guarda de a SYNC_ROWS velas.
+STREAM_TIMEFRAME = '5m'     # '1m' para la base completa
+STREAM_MARKET = 'future'
+STREAM_BLOCK = 100_000      # Velas por bloque
+WARMUP = 300                # Velas crudas que se arrastran (rolling de 300)
+SIGNAL_START = 300          # Primeras velas (ya con indicadores) sin buscar señales
+ENTRY_HOLDBACK = 12         # Últimas velas del historial sin buscar señales
+
 # ==============================================================================
 # ⚙️ MOTOR
 # ==============================================================================
@@ -48,10 +70,19 @@ def fetch_futures_data(symbol):
     return pd.DataFrame() 
 
 def calculate_indicators(df):
-    df = df.copy()
-    
+    return add_indicators(df.copy()).dropna()
+
+def add_indicators(df, ema_seed=None):
+    """
+    Indicadores sobre df (en el lugar, sin borrar filas).
+    ema_seed: EMA200 de la vela anterior a df (streaming); la EMA sigue exactamente desde ahí.
+    """
     # 1. EMA 200 (FILTRO DE TENDENCIA MAESTRO)
-    df['EMA200'] = df['close'].ewm(span=200, adjust=False).mean()
+    if ema_seed is None:
+        df['EMA200'] = df['close'].ewm(span=200, adjust=False).mean()
+    else:
+        seeded = pd.Series(np.r_[ema_seed, df['close'].to_numpy(dtype=float)])
+        df['EMA200'] = seeded.ewm(span=200, adjust=False).mean().to_numpy()[1:]
     
     # 2. RSI 14
     delta = df['close'].diff()
@@ -75,7 +106,79 @@ def calculate_indicators(df):
     df['VAH'] = df['rolling_mean'] + (df['rolling_std'] * 2)
     df['VAL'] = df['rolling_mean'] - (df['rolling_std'] * 2)
     
-    return df.dropna()
+    return df
+
+def to_arrays(df):
+    return {col: df[col].to_numpy(dtype=float) for col in
+            ('open', 'high', 'low', 'close', 'volume', 'Vol_MA', 'RSI', 'ATR', 'VAH', 'VAL', 'EMA200')}
+
+def scan_signals(arrays, lo, hi, params, cooldown=0):
+    """
+    Señales en las velas [lo, hi) de los arrays.
+    Devuelve (entradas, direcciones, riesgos, cooldown pendiente) para seguir en el próximo tramo.
+    """
+    closes = arrays['close']; opens = arrays['open']
+    highs = arrays['high']; lows = arrays['low']
+    vols = arrays['volume']; vol_mas = arrays['Vol_MA']
+    rsis = arrays['RSI']; atrs = arrays['ATR']
+    vahs = arrays['VAH']; vals = arrays['VAL']
+    ema200 = arrays['EMA200']
+    entries, directions, risks = [], [], []
+
+    for i in range(lo, hi):
+        if cooldown > 0: cooldown -= 1; continue
+
+        # Filtro Volumen
+        if vols[i] < (vol_mas[i] * params['vol_threshold']): continue
+        
+        signal = None
+        sl_price = 0
+        
+        # --- LÓGICA CON FILTRO DE TENDENCIA ---
+        
+        # LONG:
+        # 1. Precio > EMA 200 (Tendencia Alcista)
+        # 2. Reversión en la banda inferior (Comprar el Dip)
+        if closes[i] > ema200[i]: 
+            touched_prev = lows[i-1] <= vals[i-1]
+            confirm_curr = closes[i] > highs[i-1] and closes[i] > opens[i]
+            
+            if touched_prev and confirm_curr:
+                 if rsis[i] < params['rsi_long']:
+                     signal = 'LONG'
+                     sl_price = closes[i] - (atrs[i] * params['sl_atr'])
+
+        # SHORT:
+        # 1. Precio < EMA 200 (Tendencia Bajista)
+        # 2. Reversión en la banda superior (Vender el rebote)
+        elif closes[i] < ema200[i]:
+            touched_prev_high = highs[i-1] >= vahs[i-1]
+            confirm_curr_low = closes[i] < lows[i-1] and closes[i] < opens[i]
+
+            if touched_prev_high and confirm_curr_low:
+                 if rsis[i] > params['rsi_short']:
+                     signal = 'SHORT'
+                     sl_price = closes[i] + (atrs[i] * params['sl_atr'])
+        
+        # --- SIMULACIÓN (CON BREAKEVEN) --- se resuelve en bloque al final
+        if signal:
+            entry = closes[i]
+            risk = abs(entry - sl_price)
+            if risk == 0: continue
+
+            entries.append(i); directions.append(1 if signal == 'LONG' else -1); risks.append(risk)
+            cooldown = params['cooldown']
+
+    return entries, directions, risks, cooldown
+
+def print_symbol(symbol, trades):
+    if trades:
+        net_r = sum(trades)
+        win_rate = len([x for x in trades if x > 0])/len(trades)
+        print(f" -> {symbol: <10}: {len(trades):3d} trades | WR: {win_rate:.0%} | R Neto: {net_r:+.2f} R")
+        return net_r
+    print(f" -> {symbol: <10}:   0 trades")
+    return 0
 
 def run_simulation():
     print(f"\n🧪 SCALPER BACKTEST 5.0 (TREND FILTERED)")
@@ -91,105 +194,101 @@ def run_simulation():
         df = calculate_indicators(df)
         params = PROFILES[profile_name]
         
-        trades = []
-        cooldown = 0
-        
         # Vectores
-        closes = df['close'].values; opens = df['open'].values
-        highs = df['high'].values; lows = df['low'].values
-        vols = df['volume'].values; vol_mas = df['Vol_MA'].values
-        rsis = df['RSI'].values; atrs = df['ATR'].values
-        vahs = df['VAH'].values; vals = df['VAL'].values
-        ema200 = df['EMA200'].values # Nuevo Vector
-        
-        for i in range(300, len(df)-12):
-            if cooldown > 0: cooldown -= 1; continue
+        arrays = to_arrays(df)
+        closes = arrays['close']; highs = arrays['high']; lows = arrays['low']
+        entries, directions, risks, _ = scan_signals(arrays, SIGNAL_START, len(df)-ENTRY_HOLDBACK, params)
 
-            # Filtro Volumen
-            if vols[i] < (vol_mas[i] * params['vol_threshold']): continue
-            
-            signal = None
-            sl_price = 0
-            
-            # --- LÓGICA CON FILTRO DE TENDENCIA ---
-            
-            # LONG:
-            # 1. Precio > EMA 200 (Tendencia Alcista)
-            # 2. Reversión en la banda inferior (Comprar el Dip)
-            if closes[i] > ema200[i]: 
-                touched_prev = lows[i-1] <= vals[i-1]
-                confirm_curr = closes[i] > highs[i-1] and closes[i] > opens[i]
-                
-                if touched_prev and confirm_curr:
-                     if rsis[i] < params['rsi_long']:
-                         signal = 'LONG'
-                         sl_price = closes[i] - (atrs[i] * params['sl_atr'])
-
-            # SHORT:
-            # 1. Precio < EMA 200 (Tendencia Bajista)
-            # 2. Reversión en la banda superior (Vender el rebote)
-            elif closes[i] < ema200[i]:
-                touched_prev_high = highs[i-1] >= vahs[i-1]
-                confirm_curr_low = closes[i] < lows[i-1] and closes[i] < opens[i]
-
-                if touched_prev_high and confirm_curr_low:
-                     if rsis[i] > params['rsi_short']:
-                         signal = 'SHORT'
-                         sl_price = closes[i] + (atrs[i] * params['sl_atr'])
-            
-            # --- SIMULACIÓN (CON BREAKEVEN) ---
-            if signal:
-                entry = closes[i]
-                risk = abs(entry - sl_price)
-                if risk == 0: continue
-                
-                tp_dist = risk * params['tp_mult']
-                tp_price = entry + tp_dist if signal == 'LONG' else entry - tp_dist
-                be_trigger = entry + risk if signal == 'LONG' else entry - risk
-                
-                outcome_r = 0
-                sl_moved_to_be = False 
-                
-                for j in range(1, 288): 
-                    idx = i + j
-                    if idx >= len(closes): break
-                    
-                    current_low = lows[idx]; current_high = highs[idx]
-
-                    if signal == 'LONG':
-                        if current_low <= sl_price: 
-                            outcome_r = 0.0 if sl_moved_to_be else -1.0; break
-                        if current_high >= tp_price: 
-                            outcome_r = params['tp_mult']; break
-                        if not sl_moved_to_be and current_high >= be_trigger:
-                            sl_price = entry; sl_moved_to_be = True
-                    else: 
-                        if current_high >= sl_price: 
-                            outcome_r = 0.0 if sl_moved_to_be else -1.0; break
-                        if current_low <= tp_price: 
-                            outcome_r = params['tp_mult']; break
-                        if not sl_moved_to_be and current_low <= be_trigger:
-                            sl_price = entry; sl_moved_to_be = True
-                    
-                    if j == 287: # Time Stop
-                        pnl = (closes[idx]-entry) if signal=='LONG' else (entry-closes[idx])
-                        outcome_r = pnl/risk
-
-                r_net = outcome_r - 0.05 
-                trades.append(r_net)
-                cooldown = params['cooldown']
-        
-        if trades:
-            net_r = sum(trades)
-            win_rate = len([x for x in trades if x > 0])/len(trades)
-            print(f" -> {symbol: <10}: {len(trades):3d} trades | WR: {win_rate:.0%} | R Neto: {net_r:+.2f} R")
-            total_r += net_r
-        else:
-            print(f" -> {symbol: <10}:   0 trades")
+        # Salidas de todos los trades de una vez: SL / TP / BE al llegar a 1R / time stop (287 velas)
+        entries = np.array(entries, dtype=np.int64)
+        rules = dict(SCALPER_EXIT_RULES, tp2=params['tp_mult'])
+        _, outcome_r, _ = simulate_exits(highs, lows, closes, entries, directions,
+                                         closes[entries], risks, rules)
+        trades = list(outcome_r - 0.05)
+        total_r += print_symbol(symbol, trades)
+
+    print("-" * 60)
+    print(f"💰 RESULTADO FINAL: {total_r:+.2f} R")
+    print("=" * 60)
+
+def simulate_stream(blocks, params):
+    """
+    Un símbolo de a bloques (iterable de DataFrames consecutivos, formato candle store).
+    Entre bloques se arrastran: las últimas WARMUP velas crudas + la EMA200 anterior
+    (indicadores), el cooldown, y las filas con indicadores desde el trade abierto
+    más viejo (sus salidas se resuelven cuando ya hay time_stop velas por delante).
+    Devuelve la lista de R netos por trade, en orden de entrada (mismos trades que el batch).
+    """
+    rules = dict(SCALPER_EXIT_RULES, tp2=params['tp_mult'])
+    horizon = rules['time_stop']
+    raw_tail, ema_seed = None, None
+    buf, g0 = None, 0               # filas con indicadores (sin NaN); buf[0] es la fila global g0
+    next_scan, cooldown = SIGNAL_START, 0
+    pending = []                    # (entrada global, dirección, riesgo)
+    trades = []
+
+    blocks = iter(blocks)
+    block = next(blocks, None)
+    while block is not None:
+        following = next(blocks, None)
+        last = following is None
+
+        # 1. Indicadores del bloque con el warm-up del anterior
+        n_tail = 0 if raw_tail is None else len(raw_tail)
+        raw = block if raw_tail is None else pd.concat([raw_tail, block], ignore_index=True)
+        columns = list(raw.columns)
+        ind = add_indicators(raw, ema_seed)
+        cut = max(len(ind) - WARMUP, 0)
+        if cut > 0:
+            ema_seed = ind['EMA200'].iat[cut - 1]
+        raw_tail = ind[columns].iloc[cut:].reset_index(drop=True)
+
+        new = to_arrays(ind.iloc[n_tail:].dropna())
+        buf = new if buf is None else {col: np.r_[buf[col], new[col]] for col in buf}
+        g_end = g0 + len(buf['close'])
+
+        # 2. Señales (las últimas ENTRY_HOLDBACK velas esperan al próximo bloque)
+        hi = g_end - ENTRY_HOLDBACK
+        if hi > next_scan:
+            entries, directions, risks, cooldown = scan_signals(buf, next_scan - g0, hi - g0, params, cooldown)
+            pending += [(g0 + i, d, r) for i, d, r in zip(entries, directions, risks)]
+            next_scan = hi
+
+        # 3. Salidas de los trades que ya tienen todo su horizonte (al final, todos)
+        ready = [t for t in pending if last or t[0] + horizon < g_end]
+        if ready:
+            idx = np.array([t[0] - g0 for t in ready], dtype=np.int64)
+            _, outcome_r, _ = simulate_exits(buf['high'], buf['low'], buf['close'], idx,
+                                             [t[1] for t in ready], buf['close'][idx], [t[2] for t in ready], rules)
+            trades += list(outcome_r - 0.05)
+            pending = pending[len(ready):]
+
+        # 4. Recortar: solo quedan la vela anterior a la próxima a escanear y los trades abiertos
+        # (sin pasar de g_end: si el bloque no llegó a SIGNAL_START, next_scan queda adelante)
+        keep = min([next_scan - 1, g_end] + [t[0] for t in pending])
+        if keep > g0:
+            buf = {col: values[keep - g0:].copy() for col, values in buf.items()}
+            g0 = keep
+        block = following
+    return trades
+
+def run_simulation_streaming():
+    print(f"\n🧪 SCALPER BACKTEST 5.0 (TREND FILTERED) - STREAMING {STREAM_TIMEFRAME} ({STREAM_BLOCK} velas/bloque)")
+    print("="*60)
+
+    total_r = 0
+    store = get_store()
+    for symbol, profile_name in TEST_MAP.items():
+        blocks = store.iter_blocks(symbol, STREAM_TIMEFRAME, START_DATE, END_DATE, rows=STREAM_BLOCK,
+                                   market_type=STREAM_MARKET)
+        total_r += print_symbol(symbol, simulate_stream(blocks, PROFILES[profile_name]))
 
     print("-" * 60)
     print(f"💰 RESULTADO FINAL: {total_r:+.2f} R")
     print("=" * 60)
 
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    if '--stream' in sys.argv:
+        run_simulation_streaming()
+    else:
+        run_simulation()
\ No newline at end of file
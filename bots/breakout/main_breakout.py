@@ -13,16 +13,29 @@ from bots.breakout.strategy import BreakoutBotStrategy
 from shared.ccxt_handler import BinanceHandler
 from shared.telegram_bot import TelegramBot
 from shared.risk_manager import RiskManager
+from shared.kline_feed import KlineFeed
+from shared.bar_scheduler import BarScheduler
 
 # --- INICIALIZACIÓN ---
 bot_telegram = TelegramBot()
 exchange = BinanceHandler()
 strategy = BreakoutBotStrategy()
+feed = None  # KlineFeed (se arranca en __main__ si config.KLINE_FEED)
+
+def fetch_candles(symbol, timeframe, limit):
+    """Velas del feed WebSocket si está conectado; si no, REST (mismo formato que BinanceHandler)."""
+    if feed is not None and feed.connected.is_set():
+        df = feed.frame(symbol, timeframe, limit=limit)
+        if df is not None:
+            df = df.set_index('timestamp')
+            df.columns = [col.capitalize() for col in df.columns]
+            return df
+    return exchange.fetch_candles(symbol, timeframe=timeframe, limit=limit)
 
 def get_btc_regime():
     """Chequea si BTC está alcista (Filtro Macro)"""
     try:
-        df = exchange.fetch_candles(config.BTC_SYMBOL, timeframe='4h', limit=205)
+        df = fetch_candles(config.BTC_SYMBOL, '4h', 205)
         if df is None or len(df) < 200: return False
         
         sma200 = df['Close'].rolling(window=200).mean().iloc[-1]
@@ -37,7 +50,7 @@ def run_bot_cycle():
     """Un ciclo de ejecución (se repite cada X minutos)"""
     print(f"\n🔄 Ciclo iniciado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    # 1. Actualizar Datos de Cuenta
+    # 1. Actualizar Datos de Cuenta (una sola foto para todo el ciclo)
     balance = exchange.get_balance()
     open_positions = exchange.get_open_positions() # Lista de dicts
     risk_manager = RiskManager(balance)
@@ -60,9 +73,10 @@ def run_bot_cycle():
                     break
             # -----------------------------------------------
 
-            # Descargar datos (Velas 4H)
-            df = exchange.fetch_candles(symbol, timeframe=config.TIMEFRAME, limit=100)
-            if df is None: continue
+            # Descargar datos (Velas 4H) y evaluar solo las cerradas (sin la fila en formación)
+            df = fetch_candles(symbol, config.TIMEFRAME, 101)
+            if df is None or len(df) < 2: continue
+            df = df.iloc[:-1]
             
             # Calcular Indicadores
             df = strategy.calculate_indicators(df)
@@ -107,6 +121,7 @@ def run_bot_cycle():
                         
                         # 2. Market Buy (ACTIVADO)
                         order = exchange.exchange.create_market_buy_order(symbol, qty)
+                        exchange.account.invalidate()   # ya hay posición aunque falle el SL
                         
                         # 3. Stop Loss Order (ACTIVADO)
                         exchange.exchange.create_order(symbol, 'stop_market', 'sell', qty, params={'stopPrice': sl_price, 'reduceOnly': True})
@@ -126,6 +141,7 @@ def run_bot_cycle():
                         # 1. Cerrar la posición a Mercado
                         qty = abs(float(current_pos['amount']))
                         exchange.exchange.create_market_sell_order(symbol, qty, params={'reduceOnly': True})
+                        exchange.account.invalidate()
                         
                         # 2. Cancelar órdenes pendientes (SL viejo)
                         exchange.exchange.cancel_all_orders(symbol)
@@ -147,6 +163,7 @@ def run_bot_cycle():
                     try:
                         # 1. Cancelar el Stop Loss anterior
                         exchange.exchange.cancel_all_orders(symbol)
+                        exchange.account.invalidate()
                         
                         # 2. Crear el nuevo Stop Loss más arriba
                         qty = abs(float(current_pos['amount']))
@@ -173,19 +190,26 @@ if __name__ == "__main__":
     if os.path.exists("STOP_SIGNAL"):
         os.remove("STOP_SIGNAL")
 
+    if getattr(config, 'KLINE_FEED', False):
+        streams = [(config.BTC_SYMBOL, '4h')] + [(s, config.TIMEFRAME) for s in config.PAIRS_CONFIG]
+        feed = KlineFeed(streams, rest=exchange.exchange, history=250).start()
+
+    # Un ciclo por vela cerrada del timeframe (el STOP_SIGNAL se revisa mientras espera)
+    scheduler = BarScheduler(config.TIMEFRAME, offset=getattr(config, 'BAR_SETTLE_SECONDS', 5))
+
     while True:
+        wake = scheduler.wait(should_stop=lambda: os.path.exists("STOP_SIGNAL"))
+
         # Check de Parada Suave
-        if os.path.exists("STOP_SIGNAL"):
+        if wake is None:
             print("🛑 SEÑAL DE PARADA DETECTADA. Cerrando bot...")
             bot_telegram.send_msg("🛑 <b>BOT DETENIDO POR COMANDO</b>")
             os.remove("STOP_SIGNAL")
             sys.exit(0)
 
+        print(f"⏰ Vela {config.TIMEFRAME} cerrada | despertar +{wake.late:.2f}s | salteadas: {scheduler.skipped}")
         try:
             run_bot_cycle()
         except Exception as e:
             print(f"💥 Error crítico en main loop: {e}")
             time.sleep(60)
-        
-        # Esperar 5 minutos
-        time.sleep(300)
\ No newline at end of file
@@ -1,5 +1,12 @@
 import pandas as pd
 import numpy as np
+from functools import lru_cache
+
+
+@lru_cache(maxsize=32)
+def _parse_time(value):
+    # last_exit_time se repite en cada vela de COOLDOWN: parsear el texto una sola vez
+    return pd.to_datetime(value)
 
 class BreakoutBotStrategy:
     def __init__(self):
@@ -103,7 +110,7 @@ class BreakoutBotStrategy:
         # --- ENTRADAS (MODO RUNNER) ---
         if status == 'WAITING_BREAKOUT' or status == 'COOLDOWN':
             if status == 'COOLDOWN':
-                 last_exit = pd.to_datetime(state_data.get('last_exit_time'))
+                 last_exit = _parse_time(state_data.get('last_exit_time'))
                  if (curr.name - last_exit).total_seconds() / 3600 < (self.cooldown_candles * 4): 
                      return {'action': 'HOLD'}
 
@@ -4,6 +4,9 @@ import pandas as pd
 import time
 from dotenv import load_dotenv
 
+from shared.account_snapshot import AccountSnapshot
+from shared.market_cache import MarketCache
+
 # Cargar entorno
 load_dotenv()
 
@@ -18,15 +21,22 @@ class BinanceAPI:
 
         # Inicializar CCXT
         # OJO: Aquí usamos 'self.client', NO 'self.exchange'
-        self.client = ccxt.binance({
+        self.config = {
             'apiKey': api_key,
             'secret': api_secret,
             'enableRateLimit': True,
             'options': {'defaultType': 'future'}
-        })
+        }
+        self.client = ccxt.binance(self.config)
         
+        # Balance / posiciones: una consulta por ciclo (TTL), no una por símbolo
+        self.account = AccountSnapshot(self.client)
+
+        # Markets desde la caché en disco (sin bajar el exchangeInfo en cada arranque)
+        self.markets = MarketCache(self.client)
         try:
-            self.client.load_markets()
+            self.markets.load()
+            self.markets.start()
             print("✅ Binance API (Legacy) Conectado.")
         except Exception as e:
             print(f"❌ Error conectando Binance Legacy: {e}")
@@ -34,17 +44,21 @@ class BinanceAPI:
     def get_balance_usdt(self):
         """Obtiene saldo disponible en USDT"""
         try:
-            # CORRECCIÓN: Usamos self.client
-            balance = self.client.fetch_balance()
-            return float(balance['total']['USDT'])
+            return self.account.balance('USDT', 'total')
         except Exception as e:
             print(f"⚠️ Error Balance: {e}")
             return 0.0
 
-    def get_historical_data(self, symbol, timeframe='5m', limit=100):
-        """Descarga velas"""
+    def thread_client(self):
+        """Cliente ccxt aparte (mismo config) para un thread de descarga: reusa los markets ya cargados."""
+        client = ccxt.binance(dict(self.config, options=dict(self.config['options'])))
+        client.set_markets(self.client.markets, self.client.currencies)
+        return client
+
+    def get_historical_data(self, symbol, timeframe='5m', limit=100, client=None):
+        """Descarga velas (client: el de un thread de descarga; por defecto el del bot)"""
         try:
-            ohlcv = self.client.fetch_ohlcv(symbol, timeframe, limit=limit)
+            ohlcv = (client or self.client).fetch_ohlcv(symbol, timeframe, limit=limit)
             if not ohlcv: return None
             
             df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
@@ -62,7 +76,9 @@ class BinanceAPI:
     def place_order(self, symbol, side, amount, order_type='MARKET', params={}):
         """Ejecutar orden"""
         try:
-            return self.client.create_order(symbol, order_type, side, amount, None, params)
+            order = self.client.create_order(symbol, order_type, side, amount, None, params)
+            self.account.invalidate()   # la foto de la cuenta ya no sirve
+            return order
         except Exception as e:
             print(f"❌ Error Order {symbol} {side}: {e}")
             return None
@@ -70,12 +86,8 @@ class BinanceAPI:
     def get_open_positions_symbols(self):
         """Devuelve lista de símbolos con posiciones abiertas"""
         try:
-            bal = self.client.fetch_balance()
-            positions = bal['info']['positions']
-            active = [p['symbol'] for p in positions if float(p['positionAmt']) != 0]
-            # Convertir formato si es necesario (ej: BTCUSDT -> BTC/USDT)
-            # CCXT suele manejar esto, pero por si acaso devolvemos lista limpia
-            return active 
+            # Ids de Binance (ej: BTCUSDT), desde la foto de la cuenta
+            return self.account.open_symbols()
         except Exception as e:
             print(f"⚠️ Error Open Positions: {e}")
             return []
\ No newline at end of file
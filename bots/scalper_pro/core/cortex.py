@@ -0,0 +1,227 @@
+# core/cortex.py
+"""
+Cortex V9.2 (gatekeeper de IA): features del Miner V9.2 y autorización de trades.
+
+- calculate_features(df): cálculo batch de las columnas feat_* (backtests, feature store).
+- FeatureStream: las mismas features vela a vela para UN símbolo. Cada vela
+  cerrada se aplica una sola vez (O(1)), en vez de recalcular 300 velas en
+  cada ciclo de 10s del bot.
+- Gatekeeper: modelo + umbral por símbolo. En vivo consulta al modelo una vez
+  por vela cerrada (la probabilidad se guarda hasta que cierre la siguiente).
+"""
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from core.indicator_stream import _RollingMean
+
+FEATURE_COLUMNS = [
+    'feat_volatility_z', 'feat_squeeze',
+    'feat_clv', 'feat_wick_up', 'feat_wick_down', 'feat_body_r',
+    'feat_volume_z', 'feat_vol_impact',
+    'feat_rsi', 'feat_dist_sma',
+]
+
+# Velas necesarias para que todas las features estén completas (ATR lento 100 + shift)
+WARMUP = 101
+
+# Clases del modelo: TOXIC(0), NOISE(1), PROFIT(2)
+PROFIT_CLASS = 2
+# BTC requiere certeza absoluta; las alts toleran un poco más de riesgo
+THRESHOLDS = {'BTC': 0.60}
+DEFAULT_THRESHOLD = 0.50
+
+
+def calculate_features(df):
+    """
+    CÁLCULO DE FEATURES (Copia exacta del Miner V9.2).
+    Devuelve un DataFrame (mismo índice que df) solo con las columnas feat_*.
+    """
+    out = pd.DataFrame(index=df.index)
+
+    # A. DINÁMICA
+    high_low = df['high'] - df['low']
+    high_close = np.abs(df['high'] - df['close'].shift())
+    low_close = np.abs(df['low'] - df['close'].shift())
+    ranges = pd.concat([high_low, high_close, low_close], axis=1)
+    true_range = np.max(ranges, axis=1)
+
+    atr_fast = true_range.rolling(14).mean()
+    atr_slow = true_range.rolling(100).mean()
+
+    out['feat_volatility_z'] = atr_fast / atr_slow
+    out['feat_squeeze'] = (atr_fast / df['close']).rolling(20).std()
+
+    # B. MICROESTRUCTURA
+    candle_range = df['high'] - df['low']
+    candle_range = candle_range.replace(0, 0.000001)
+    out['feat_clv'] = ((df['close'] - df['low']) - (df['high'] - df['close'])) / candle_range
+
+    upper_wick = df['high'] - df[['close', 'open']].max(axis=1)
+    lower_wick = df[['close', 'open']].min(axis=1) - df['low']
+    out['feat_wick_up'] = upper_wick / candle_range
+    out['feat_wick_down'] = lower_wick / candle_range
+
+    body_size = abs(df['close'] - df['open'])
+    out['feat_body_r'] = body_size / candle_range
+
+    # C. IMPACTO
+    vol_ma = df['volume'].rolling(50).mean()
+    out['feat_volume_z'] = df['volume'] / vol_ma
+    out['feat_vol_impact'] = (df['volume'] * out['feat_clv']).rolling(3).mean()
+
+    # D. TENDENCIA
+    delta = df['close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    rs = gain / loss
+    out['feat_rsi'] = 100 - (100 / (1 + rs))
+
+    sma50 = df['close'].rolling(50).mean()
+    out['feat_dist_sma'] = (df['close'] - sma50) / atr_fast
+
+    return out[FEATURE_COLUMNS]
+
+
+class _RollingStd:
+    """Desvío estándar muestral (ddof=1) de las últimas 'window' observaciones (NaN si falta alguna)."""
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+
+    def step(self, val):
+        self.values.append(val)
+        if len(self.values) < self.values.maxlen or any(v != v for v in self.values):
+            return math.nan
+        return float(np.std(np.fromiter(self.values, float), ddof=1))
+
+
+class FeatureStream:
+    """
+    Estado incremental de las features V9.2 para UN símbolo.
+    Mismo resultado que calculate_features() sobre todo el historial visto
+    (salvo redondeo en el último decimal del desvío del squeeze).
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.atr_fast = _RollingMean(14)
+        self.atr_slow = _RollingMean(100)
+        self.squeeze = _RollingStd(20)
+        self.vol_ma = _RollingMean(50)
+        self.impact = _RollingMean(3)
+        self.gain = _RollingMean(14)
+        self.loss = _RollingMean(14)
+        self.sma50 = _RollingMean(50)
+        self.prev_close = math.nan
+        self.last_ts = None
+        self.features = None
+
+    def push(self, o, h, l, c, v):
+        """Aplica una vela cerrada y devuelve sus features (dict)."""
+        prev = self.prev_close
+        tr = h - l
+        if prev == prev:
+            tr = max(tr, abs(h - prev), abs(l - prev))
+        atr_fast = self.atr_fast.step(tr)
+        atr_slow = self.atr_slow.step(tr)
+
+        candle_range = h - l
+        if candle_range == 0: candle_range = 0.000001
+        clv = ((c - l) - (h - c)) / candle_range
+
+        delta = c - prev
+        gain = self.gain.step(delta if delta > 0 else 0.0)
+        loss = self.loss.step(-delta if delta < 0 else 0.0)
+        vol_ma = self.vol_ma.step(v)
+        sma50 = self.sma50.step(c)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.features = {
+                'feat_volatility_z': float(np.float64(atr_fast) / atr_slow),
+                'feat_squeeze': self.squeeze.step(atr_fast / c),
+                'feat_clv': clv,
+                'feat_wick_up': (h - max(c, o)) / candle_range,
+                'feat_wick_down': (min(c, o) - l) / candle_range,
+                'feat_body_r': abs(c - o) / candle_range,
+                'feat_volume_z': float(np.float64(v) / vol_ma),
+                'feat_vol_impact': self.impact.step(v * clv),
+                'feat_rsi': float(100 - (100 / (1 + np.float64(gain) / loss))),
+                'feat_dist_sma': float(np.float64(c - sma50) / atr_fast),
+            }
+        self.prev_close = c
+        return self.features
+
+    def ready(self):
+        return self.features is not None and all(v == v for v in self.features.values())
+
+    def update(self, df):
+        """
+        DataFrame de velas del bot (ordenado, última fila = vela en formación).
+        Aplica solo las velas cerradas nuevas y devuelve las features de la última cerrada.
+        """
+        ts = df['timestamp'].values
+        n = len(df) - 1     # la última está en formación
+        start = 0
+        if self.last_ts is not None:
+            pos = int(np.searchsorted(ts[:n], self.last_ts))
+            if pos < n and ts[pos] == self.last_ts:
+                start = pos + 1
+            else:
+                self.reset()   # hueco o reinicio: warm-up con lo que hay
+        o, h, l = df['open'].values, df['high'].values, df['low'].values
+        c, v = df['close'].values, df['volume'].values
+        for k in range(start, n):
+            self.push(float(o[k]), float(h[k]), float(l[k]), float(c[k]), float(v[k]))
+            self.last_ts = ts[k]
+        return self.features
+
+
+class Gatekeeper:
+    """Autoriza (o bloquea) trades según P(PROFIT) del modelo Cortex."""
+    def __init__(self, model, thresholds=THRESHOLDS, default=DEFAULT_THRESHOLD):
+        self.model = model
+        self.thresholds = thresholds
+        self.default = default
+        self.profit_idx = {label: idx for idx, label in enumerate(model.classes_)}.get(PROFIT_CLASS)
+        if self.profit_idx is None:
+            raise ValueError(f"El modelo no tiene la clase PROFIT ({PROFIT_CLASS}): {model.classes_}")
+        self.streams = {}
+        self.cache = {}     # symbol -> (timestamp de la vela, p_profit)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        import joblib
+        return cls(joblib.load(path), **kwargs)
+
+    def threshold(self, symbol):
+        for key, value in self.thresholds.items():
+            if key in symbol:
+                return value
+        return self.default
+
+    def is_authorized(self, symbol, p_profit):
+        return p_profit > self.threshold(symbol)
+
+    def p_profit(self, symbol, df):
+        """P(PROFIT) de la última vela cerrada de df (NaN mientras falte warm-up)."""
+        stream = self.streams.get(symbol)
+        if stream is None:
+            stream = self.streams[symbol] = FeatureStream()
+        features = stream.update(df)
+        cached = self.cache.get(symbol)
+        if cached is not None and cached[0] == stream.last_ts:
+            return cached[1]
+        if not stream.ready():
+            return math.nan
+        X = pd.DataFrame([features], columns=FEATURE_COLUMNS)
+        p = float(self.model.predict_proba(X)[0][self.profit_idx])
+        self.cache[symbol] = (stream.last_ts, p)
+        return p
+
+    def authorize(self, symbol, df):
+        """True si la IA autoriza operar 'symbol' con las velas de df."""
+        p = self.p_profit(symbol, df)
+        return p == p and self.is_authorized(symbol, p)
@@ -7,18 +7,26 @@ import os
 # Importar configuración
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from core.indicator_stream import IndicatorStream
+from core.volume_profile import volume_profile_zones, volume_profile_series
 
 class DataProcessor:
-    def __init__(self):
-        pass
+    def __init__(self, streaming=False):
+        # streaming=True: guarda el estado de los indicadores por símbolo y
+        # en cada ciclo solo aplica las velas nuevas (modo producción)
+        self.streaming = streaming
+        self.streams = {}
 
-    def calculate_indicators(self, df):
+    def calculate_indicators(self, df, symbol=None):
         """
         Aplica los indicadores de la Estrategia V6.4
         """
         if df is None or df.empty:
             return df
 
+        if self.streaming:
+            return self._calculate_streaming(df, symbol)
+
         # 1. RSI Manual (14 periodos)
         delta = df['close'].diff()
         gain = (delta.where(delta > 0, 0)).fillna(0)
@@ -48,6 +56,20 @@ class DataProcessor:
 
         return df
 
+    def _calculate_streaming(self, df, symbol=None):
+        """
+        Mismo resultado que el cálculo batch sobre todo el historial visto,
+        pero O(1) por vela cerrada en vez de recalcular las 300 velas.
+        """
+        if symbol is None:
+            symbol = df['symbol_name'].iloc[0] if 'symbol_name' in df.columns else 'DEFAULT'
+
+        stream = self.streams.get(symbol)
+        if stream is None:
+            stream = IndicatorStream(config.ATR_PERCENTILE, config.VOLUME_MA_PERIOD)
+            self.streams[symbol] = stream
+        return stream.update(df)
+
     def get_volume_profile_zones(self, df, lookback_bars=288):
         """
         Calcula VAH y VAL usando Volume Profile simplificado.
@@ -56,32 +78,13 @@ class DataProcessor:
         if len(df) < lookback_bars:
             return None
 
-        subset = df.iloc[-lookback_bars:].copy()
-        price_min = subset['low'].min()
-        price_max = subset['high'].max()
-        
-        if price_min == price_max: return None
+        subset = df.iloc[-lookback_bars:]
+        return volume_profile_zones(subset['high'].values, subset['low'].values,
+                                    subset['close'].values, subset['volume'].values)
 
-        # Crear 100 niveles de precio (bins)
-        bins = np.linspace(price_min, price_max, 100)
-        subset['bin'] = pd.cut(subset['close'], bins=bins)
-        
-        # Agrupar volumen por nivel de precio
-        vp = subset.groupby('bin', observed=False)['volume'].sum().reset_index()
-        
-        # Calcular Value Area (70%)
-        total_volume = vp['volume'].sum()
-        value_area_vol = total_volume * 0.70
-        
-        vp_sorted = vp.sort_values(by='volume', ascending=False)
-        vp_sorted['cum_vol'] = vp_sorted['volume'].cumsum()
-        
-        va_df = vp_sorted[vp_sorted['cum_vol'] <= value_area_vol]
-        
-        if va_df.empty: return None
-        
-        # Determinar límites
-        vah = va_df['bin'].apply(lambda x: x.right).max()
-        val = va_df['bin'].apply(lambda x: x.left).min()
-        
-        return {'VAH': vah, 'VAL': val}
\ No newline at end of file
+    def get_volume_profile_series(self, df, lookback_bars=288):
+        """
+        VAH/VAL de todas las velas en una sola pasada (ventana deslizante).
+        La posición i equivale a get_volume_profile_zones(df.iloc[:i+1]); NaN si no hay zonas.
+        """
+        return volume_profile_series(df, lookback=lookback_bars)
@@ -0,0 +1,160 @@
+# core/exit_simulator.py
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Códigos de salida (índice en esta tupla)
+OUTCOMES = ('HOLD', 'SL_HIT', 'BE_STOP', 'TP2_HIT', 'TIME_STOP', 'FORCE_CLOSE',
+            'FAILED_FT', 'STAGNANT', 'STAGNANT_LATE')
+
+# Reglas de salida V6.4 (labs time machine / multipair stress).
+#   checkpoints: (barra, R mínimo al cierre, R realizado, outcome) -> sale si close_r < mínimo
+#   order: prioridad de las reglas dentro de una misma barra
+#   tp1: R que arma el piso de tp1_floor en el time stop (y el BE si be_after_tp1)
+#   on_data_end: 'hold' (R 0, sin cerrar) o 'close' (FORCE_CLOSE al último cierre)
+#   levels: 'r' compara SL/TP en múltiplos de R; 'price' contra niveles de precio
+V64_RULES = {
+    'checkpoints': [(2, -0.10, -0.15, 'FAILED_FT'),
+                    (4, 0.25, 0.0, 'STAGNANT'),
+                    (6, 0.20, -0.15, 'STAGNANT_LATE')],
+    'tp2': 3.0,
+    'sl': -1.1,
+    'tp1': 1.0,
+    'tp1_floor': 0.5,
+    'be_after_tp1': False,
+    'time_stop': 12,
+    'order': ('checkpoints', 'tp2', 'sl', 'tp1', 'time'),
+    'on_data_end': 'hold',
+    'levels': 'r',
+}
+
+
+def simulate_exits(high, low, close, entry_idx, direction, entry_price, stop_dist, rules=V64_RULES,
+                   intrabar=None):
+    """
+    Simula la salida de muchos trades a la vez (sin loop por vela).
+    direction: +1 LONG / -1 SHORT. stop_dist: distancia al SL (1R) en precio.
+    Para cada regla busca la primera barra donde dispara sobre ventanas hacia
+    adelante (vistas con stride, sin copiar la serie) y se queda con la primera
+    según barra y prioridad.
+    intrabar: shared.intrabar.IntrabarIndex; si la misma barra toca SL y TP2,
+    el orden sale de la data 1m en vez de 'order' (si no se puede, queda 'order').
+    Devuelve (códigos de OUTCOMES, R realizado, barras en el trade).
+    """
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)
+    n = len(entry_idx)
+    bars = int(rules['time_stop'])
+    order = list(rules['order'])
+
+    if n == 0:
+        return np.empty(0, dtype=np.int8), np.empty(0), np.empty(0, dtype=np.int64)
+
+    # Ventanas [i+1, i+bars]; más allá del final de la serie queda NaN
+    pad = np.full(bars, np.nan)
+    def windows(values):
+        return sliding_window_view(np.r_[np.asarray(values, dtype=float), pad], bars)[entry_idx + 1]
+    w_high, w_low, w_close = windows(high), windows(low), windows(close)
+
+    is_long = (np.asarray(direction) > 0)[:, None]
+    e = np.asarray(entry_price, dtype=float)[:, None]
+    d = np.asarray(stop_dist, dtype=float)[:, None]
+    close_r = np.where(is_long, (w_close - e) / d, (e - w_close) / d)
+    if rules.get('levels') == 'price':
+        # Niveles en precio (entry ± R * stop_dist), como los backtests que comparan contra sl_price/tp_price
+        def reach(x):
+            level = np.where(is_long, e + d * x, e - d * x)
+            return np.where(is_long, w_high >= level, w_low <= level)
+        def breach(x):
+            level = np.where(is_long, e + d * x, e - d * x)
+            return np.where(is_long, w_low <= level, w_high >= level)
+    else:
+        best_r = np.where(is_long, (w_high - e) / d, (e - w_low) / d)     # extremo a favor
+        worst_r = np.where(is_long, (w_low - e) / d, (e - w_high) / d)    # extremo en contra
+        def reach(x): return best_r >= x
+        def breach(x): return worst_r <= x
+
+    never = bars   # columna "no disparó"
+    cols = np.arange(bars)
+    available = (~np.isnan(w_close)).sum(axis=1)   # barras con datos
+
+    def first(hit):
+        return np.where(hit.any(axis=1), hit.argmax(axis=1), never)
+
+    # Estado TP1: desde qué columna cuenta (si se evalúa después que otra regla, recién en la barra siguiente)
+    tp1_col = first(reach(rules['tp1'])) if rules.get('tp1') is not None else np.full(n, never)
+    def tp1_armed(rule):
+        lag = 0 if 'tp1' in order and order.index('tp1') < order.index(rule) else 1
+        return tp1_col[:, None] + lag <= cols[None, :]
+
+    # Candidatos: (columna, prioridad, código, R)
+    candidates = []
+    prio = {rule: k for k, rule in enumerate(order)}
+
+    for bar, min_r, r_real, name in rules.get('checkpoints', []):
+        if bar > bars: continue
+        hit = close_r[:, bar - 1] < min_r
+        candidates.append((np.where(hit, bar - 1, never), prio['checkpoints'],
+                           np.full(n, OUTCOMES.index(name)), np.full(n, float(r_real))))
+
+    if rules.get('tp2') is not None:
+        candidates.append((first(reach(rules['tp2'])), prio['tp2'],
+                           np.full(n, OUTCOMES.index('TP2_HIT')), np.full(n, float(rules['tp2']))))
+
+    if rules.get('sl') is not None:
+        sl_hit = breach(rules['sl'])
+        if rules.get('be_after_tp1'):
+            be = tp1_armed('sl')
+            col = first(sl_hit | (be & breach(0.0)))
+            at_be = be[np.arange(n), np.minimum(col, bars - 1)] & (col < never)
+            code = np.where(at_be, OUTCOMES.index('BE_STOP'), OUTCOMES.index('SL_HIT'))
+            candidates.append((col, prio['sl'], code, np.where(at_be, 0.0, float(rules['sl']))))
+        else:
+            candidates.append((first(sl_hit), prio['sl'],
+                               np.full(n, OUTCOMES.index('SL_HIT')), np.full(n, float(rules['sl']))))
+
+    # SL y TP2 en la misma barra: se descarta el que la data 1m dice que llegó segundo
+    if intrabar is not None and rules.get('tp2') is not None and rules.get('sl') is not None:
+        tp_col = next(c[0] for c in candidates if c[1] == prio['tp2'])
+        sl_col, sl_r = next((c[0], c[3]) for c in candidates if c[1] == prio['sl'])
+        rows = np.flatnonzero((sl_col == tp_col) & (sl_col < never))
+        if len(rows):
+            long_rows = is_long[rows, 0]
+            sign = np.where(long_rows, 1.0, -1.0)
+            stop = e[rows, 0] + sign * d[rows, 0] * sl_r[rows]
+            target = e[rows, 0] + sign * d[rows, 0] * float(rules['tp2'])
+            first_hit = intrabar.resolve(entry_idx[rows] + 1 + sl_col[rows], long_rows, stop, target)
+            sl_col[rows[first_hit > 0]] = never
+            tp_col[rows[first_hit < 0]] = never
+
+    # Time stop: cierre de la última barra (con piso si se tocó TP1)
+    t_col = np.where(available >= bars, bars - 1, never)
+    t_r = close_r[:, bars - 1].copy()
+    if rules.get('tp1') is not None and rules.get('tp1_floor') is not None:
+        armed = tp1_armed('time')[:, bars - 1]
+        t_r = np.where(armed, np.maximum(t_r, rules['tp1_floor']), t_r)
+    candidates.append((t_col, prio['time'], np.full(n, OUTCOMES.index('TIME_STOP')), t_r))
+
+    # Primera regla en disparar (barra, después prioridad)
+    keys = np.stack([c[0] * len(order) + c[1] for c in candidates])
+    pick = keys.argmin(axis=0)
+    rows = np.arange(n)
+    col = np.stack([c[0] for c in candidates])[pick, rows]
+    codes = np.stack([c[2] for c in candidates])[pick, rows].astype(np.int8)
+    r = np.stack([c[3] for c in candidates])[pick, rows]
+    held = col + 1
+
+    # Se acabó la data sin salida
+    ended = col >= never
+    if ended.any():
+        last = np.maximum(available[ended] - 1, 0)
+        held[ended] = available[ended]
+        if rules.get('on_data_end') == 'close':
+            codes[ended] = OUTCOMES.index('FORCE_CLOSE')
+            r[ended] = np.where(available[ended] > 0, close_r[ended, last], 0.0)
+        else:
+            codes[ended] = OUTCOMES.index('HOLD')
+            r[ended] = 0.0
+    return codes, r, held
+
+
+def outcome_names(codes):
+    return np.asarray(OUTCOMES, dtype=object)[np.asarray(codes, dtype=np.int64)]
@@ -0,0 +1,203 @@
+# core/indicator_stream.py
+import math
+from collections import deque
+
+import numpy as np
+
+from core.rolling_quantile import RollingQuantile
+
+# Columnas que produce DataProcessor.calculate_indicators (mismo orden)
+INDICATOR_COLUMNS = ['RSI', 'delta_norm', 'cvd', 'ATR', 'ATR_Threshold', 'Vol_MA']
+
+
+class _WilderEWM:
+    """
+    Réplica exacta de Series.ewm(alpha=..., adjust=False).mean() de pandas.
+    Mismas operaciones y en el mismo orden => mismo resultado bit a bit.
+    """
+    def __init__(self, alpha):
+        com = (1 - alpha) / alpha          # pandas convierte alpha -> center of mass
+        self.new_wt = 1.0 / (1.0 + com)    # ... y de vuelta a alpha
+        self.old_wt = 1.0 - self.new_wt
+        self.weighted = None
+
+    def step(self, cur, commit=True):
+        weighted = self.weighted
+        if weighted is None:
+            weighted = cur
+        elif weighted == weighted and cur == cur and weighted != cur:
+            weighted = (self.old_wt * weighted + self.new_wt * cur) / (self.old_wt + self.new_wt)
+        elif weighted != weighted:
+            weighted = cur
+        if commit:
+            self.weighted = weighted
+        return weighted
+
+
+class _RollingMean:
+    """
+    Réplica exacta de Series.rolling(window).mean() de pandas:
+    suma incremental con compensación de Kahan (separada para altas y bajas).
+    """
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_ct = 0
+        self.prev = math.nan
+
+    def step(self, val, commit=True):
+        nobs, neg_ct, sum_x = self.nobs, self.neg_ct, self.sum_x
+        comp_add, comp_remove = self.comp_add, self.comp_remove
+        same_ct, prev = self.same_ct, self.prev
+
+        # 1. Sale la vela más vieja de la ventana
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if old == old:
+                nobs -= 1
+                y = -old - comp_remove
+                t = sum_x + y
+                comp_remove = t - sum_x - y
+                sum_x = t
+                if math.copysign(1.0, old) < 0: neg_ct -= 1
+
+        # 2. Entra la vela nueva
+        if val == val:
+            nobs += 1
+            y = val - comp_add
+            t = sum_x + y
+            comp_add = t - sum_x - y
+            sum_x = t
+            if math.copysign(1.0, val) < 0: neg_ct += 1
+            same_ct = same_ct + 1 if val == prev else 1
+            prev = val
+
+        # 3. Resultado (mismas correcciones que pandas)
+        if nobs >= self.window and nobs > 0:
+            result = sum_x / nobs
+            if same_ct >= nobs: result = prev
+            elif neg_ct == 0 and result < 0: result = 0.0
+            elif neg_ct == nobs and result > 0: result = 0.0
+        else:
+            result = math.nan
+
+        if commit:
+            if len(self.values) == self.window: self.values.popleft()
+            self.values.append(val)
+            self.nobs, self.neg_ct, self.sum_x = nobs, neg_ct, sum_x
+            self.comp_add, self.comp_remove = comp_add, comp_remove
+            self.same_ct, self.prev = same_ct, prev
+        return result
+
+
+class IndicatorStream:
+    """
+    Estado incremental de los indicadores V6.4 para UN símbolo.
+    Cada vela cerrada se aplica una sola vez (O(1) por vela); la vela en
+    formación (última fila del DataFrame) se evalúa sin tocar el estado.
+    Resultado idéntico a calculate_indicators() sobre todo el historial visto.
+    """
+    def __init__(self, atr_percentile, vol_ma_period, rsi_period=14, atr_period=14, atr_rank_window=500):
+        self.atr_percentile = atr_percentile
+        self.vol_ma_period = vol_ma_period
+        self.rsi_period = rsi_period
+        self.atr_period = atr_period
+        self.atr_rank_window = atr_rank_window
+        self.reset()
+
+    def reset(self):
+        self.avg_gain = _WilderEWM(1 / self.rsi_period)
+        self.avg_loss = _WilderEWM(1 / self.rsi_period)
+        self.atr = _RollingMean(self.atr_period)
+        self.vol_ma = _RollingMean(self.vol_ma_period)
+        self.atr_threshold = RollingQuantile(self.atr_rank_window, self.atr_percentile)
+        self.prev_close = math.nan
+        self.cvd = None
+        self.last_ts = None
+        self.history_ts = []
+        self.history_rows = []
+        self.max_rows = 0
+
+    def _step(self, o, h, l, c, v, commit):
+        # 1. RSI (Wilder)
+        delta = c - self.prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        avg_gain = np.float64(self.avg_gain.step(gain, commit))
+        avg_loss = np.float64(self.avg_loss.step(loss, commit))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_gain / avg_loss
+            rsi = float(100 - (100 / (1 + rs)))
+
+        # 2. Delta Normalizado & CVD
+        range_candle = h - l
+        if range_candle == 0: range_candle = 0.000001
+        delta_norm = ((c - o) / range_candle) * v
+        cvd = delta_norm if self.cvd is None else self.cvd + delta_norm
+
+        # 3. ATR y ATR Threshold
+        tr = h - l
+        if self.prev_close == self.prev_close:
+            tr = max(tr, abs(h - self.prev_close), abs(l - self.prev_close))
+        atr = self.atr.step(tr, commit)
+        atr_threshold = self.atr_threshold.push(atr) if commit else self.atr_threshold.peek(atr)
+
+        # 4. Volume MA
+        vol_ma = self.vol_ma.step(v, commit)
+
+        if commit:
+            self.prev_close = c
+            self.cvd = cvd
+        return (rsi, delta_norm, cvd, atr, atr_threshold, vol_ma)
+
+    def update(self, df):
+        """
+        Recibe el DataFrame de velas (ordenado, última fila = vela en formación)
+        y devuelve el mismo DataFrame con las columnas de indicadores.
+        """
+        ts = df['timestamp'].values
+        opens = df['open'].values; highs = df['high'].values
+        lows = df['low'].values; closes = df['close'].values
+        vols = df['volume'].values
+        n = len(df)
+
+        # ¿El DataFrame continúa donde nos quedamos? Si no (hueco, reinicio), warm-up.
+        start = 0
+        if self.last_ts is not None:
+            pos = int(np.searchsorted(ts, self.last_ts))
+            if pos < n and ts[pos] == self.last_ts:
+                start = pos + 1
+            else:
+                self.reset()
+
+        # Velas cerradas nuevas -> entran al estado
+        for k in range(start, n - 1):
+            self.history_rows.append(self._step(opens[k], highs[k], lows[k], closes[k], vols[k], True))
+            self.history_ts.append(ts[k])
+            self.last_ts = ts[k]
+
+        # Historial acotado (lo justo para cubrir el DataFrame que nos pasan)
+        self.max_rows = max(self.max_rows, n)
+        if len(self.history_rows) > 2 * self.max_rows:
+            del self.history_rows[:-self.max_rows]
+            del self.history_ts[:-self.max_rows]
+
+        # Filas del DataFrame ya cerradas (salen del historial) + vela en formación
+        committed = n - 1 if start <= n - 1 else n
+        rows = self.history_rows[-committed:] if committed else []
+        if committed and not np.array_equal(np.asarray(self.history_ts[-committed:]), ts[:committed]):
+            # Timestamps desalineados (velas faltantes en medio): recalculamos desde cero
+            self.reset()
+            return self.update(df)
+        if committed < n:
+            rows = rows + [self._step(opens[-1], highs[-1], lows[-1], closes[-1], vols[-1], False)]
+
+        values = np.array(rows, dtype=float)
+        for j, col in enumerate(INDICATOR_COLUMNS):
+            df[col] = values[:, j]
+        return df
@@ -0,0 +1,166 @@
+# core/monte_carlo.py
+"""
+Monte Carlo / bootstrap sobre la secuencia de R por trade de cualquier lab.
+
+Se generan decenas de miles de caminos (filas de una matriz numpy) y todas las
+métricas salen de operaciones acumuladas vectorizadas sobre el eje de trades:
+drawdown máximo, R final, probabilidad de ruina y probabilidad de que salte
+el kill switch del ProductionController (pérdida diaria / racha perdedora).
+"""
+import numpy as np
+
+from core.production_controller import MAX_DAILY_LOSS_R, CONSECUTIVE_LOSSES_LIMIT
+
+# Cómo cuenta main.py la racha: suma si r < -0.8, resetea si r > 0.5 (y al cambiar el día UTC)
+STREAK_LOSS_R = -0.8
+STREAK_RESET_R = 0.5
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def resample_paths(r, n_paths=20_000, length=None, method='bootstrap', block=5, seed=None):
+    """
+    Matriz (n_paths x length) de R por trade.
+      bootstrap: trades sorteados con reposición
+      shuffle:   permutaciones del log original (mismo R final, otro orden)
+      block:     bloques consecutivos de 'block' trades (conserva rachas)
+    """
+    r = np.asarray(r, dtype=float)
+    rng = np.random.default_rng(seed)
+    length = length or len(r)
+    if method == 'shuffle':
+        return rng.permuted(np.broadcast_to(r[:length], (n_paths, min(length, len(r)))), axis=1)
+    if method == 'block':
+        block = max(1, min(block, len(r)))
+        n_blocks = -(-length // block)
+        starts = rng.integers(0, len(r) - block + 1, size=(n_paths, n_blocks))
+        return r[(starts[:, :, None] + np.arange(block)).reshape(n_paths, -1)[:, :length]]
+    return r[rng.integers(0, len(r), size=(n_paths, length))]
+
+
+def drawdowns(paths):
+    """Drawdown máximo (en R, negativo) de cada camino, partiendo de equity 0."""
+    equity = np.cumsum(paths, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0.0)
+    return (equity - peak).min(axis=1)
+
+
+def max_losing_streak(paths, loss_r=0.0):
+    """Racha más larga de trades con R < loss_r en cada camino."""
+    loss = paths < loss_r
+    count = np.cumsum(loss, axis=1)
+    last_reset = np.maximum.accumulate(np.where(loss, 0, count), axis=1)
+    return (count - last_reset).max(axis=1)
+
+
+def day_starts(length, trades_per_day):
+    """Primer trade de cada día cuando se hacen 'trades_per_day' trades por día (en promedio)."""
+    starts = np.unique(np.floor(np.arange(0, length, max(trades_per_day, 1e-9))).astype(np.int64))
+    return starts[starts < length]
+
+
+def kill_switch(paths, trades_per_day, daily_loss_r=MAX_DAILY_LOSS_R,
+                max_losses=CONSECUTIVE_LOSSES_LIMIT):
+    """
+    Replica el chequeo de main.py tras cada cierre, con reset diario.
+    Devuelve (dispara por pérdida diaria, dispara por racha, días del camino
+    en los que disparó cualquiera de los dos), cada uno por camino.
+    """
+    n, length = paths.shape
+    starts = day_starts(length, trades_per_day)
+    sizes = np.diff(np.r_[starts, length])
+    day_of = np.repeat(np.arange(len(starts)), sizes)
+
+    # PnL del día acumulado trade a trade
+    equity = np.cumsum(paths, axis=1)
+    before = np.concatenate([np.zeros((n, 1)), equity[:, :-1]], axis=1)
+    daily = equity - before[:, starts][:, day_of]
+    daily_hit = daily <= -daily_loss_r
+
+    # Racha: cuenta pérdidas desde el último reset (trade ganador o inicio de día)
+    loss = paths < STREAK_LOSS_R
+    count = np.cumsum(loss, axis=1)
+    base = np.where(paths > STREAK_RESET_R, count, 0)
+    base[:, starts] = np.maximum(base[:, starts], count[:, starts] - loss[:, starts])
+    streak_hit = (count - np.maximum.accumulate(base, axis=1)) >= max_losses
+
+    fired = daily_hit | streak_hit
+    days_fired = np.logical_or.reduceat(fired, starts, axis=1).sum(axis=1)
+    return daily_hit.any(axis=1), streak_hit.any(axis=1), days_fired
+
+
+def _percentiles(values):
+    return {p: float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def run_monte_carlo(r, n_paths=20_000, length=None, method='bootstrap', block=5,
+                    trades_per_day=None, ruin_r=10.0, seed=None, plot=None):
+    """
+    Distribuciones sobre n_paths caminos. trades_per_day habilita el análisis
+    del kill switch. plot: ruta .png para guardar histogramas (requiere matplotlib).
+    Devuelve dict con percentiles y probabilidades.
+    """
+    paths = resample_paths(r, n_paths, length, method, block, seed)
+    final = paths.sum(axis=1)
+    max_dd = drawdowns(paths)
+    streak = max_losing_streak(paths)
+    result = {
+        'paths': paths.shape[0],
+        'trades': paths.shape[1],
+        'method': method,
+        'final_r': _percentiles(final),
+        'max_dd': _percentiles(max_dd),
+        'max_losing_streak': _percentiles(streak),
+        'p_loss': float((final < 0).mean()),
+        'p_ruin': float((max_dd <= -ruin_r).mean()),
+        'ruin_r': ruin_r,
+    }
+    if trades_per_day:
+        daily_hit, streak_hit, days_fired = kill_switch(paths, trades_per_day)
+        n_days = len(day_starts(paths.shape[1], trades_per_day))
+        result['kill_switch'] = {
+            'trades_per_day': trades_per_day,
+            'days': n_days,
+            'p_daily_loss': float(daily_hit.mean()),
+            'p_streak': float(streak_hit.mean()),
+            'p_any': float((daily_hit | streak_hit).mean()),
+            'days_fired_pct': float(days_fired.mean() / max(n_days, 1)),
+        }
+    if plot:
+        _plot(final, max_dd, streak, plot)
+    return result
+
+
+def _plot(final, max_dd, streak, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ matplotlib no está instalado: sin gráficos.")
+        return
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    for ax, values, title in zip(axes, (final, max_dd, streak),
+                                 ('R final', 'Drawdown máximo (R)', 'Racha perdedora máx.')):
+        ax.hist(values, bins=60)
+        ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    print(f"🖼️ Gráficos: {path}")
+
+
+def print_report(result):
+    pct = lambda d: " | ".join(f"p{k}: {v:.2f}" for k, v in d.items() if k in (5, 50, 95))
+    print(f"\n🎲 MONTE CARLO ({result['method']}, {result['paths']} caminos x {result['trades']} trades)")
+    print(f"R Final:        {pct(result['final_r'])}")
+    print(f"Max Drawdown:   {pct(result['max_dd'])}")
+    print(f"Racha Perd.:    {pct(result['max_losing_streak'])}")
+    print(f"P(R final < 0): {result['p_loss']:.1%}")
+    print(f"P(ruina, DD <= -{result['ruin_r']:.0f}R): {result['p_ruin']:.1%}")
+    ks = result.get('kill_switch')
+    if ks:
+        print(f"\n💀 KILL SWITCH ({ks['trades_per_day']:.1f} trades/día, {ks['days']} días)")
+        print(f"P(pérdida diaria {MAX_DAILY_LOSS_R:.0f}R): {ks['p_daily_loss']:.1%}")
+        print(f"P(racha {CONSECUTIVE_LOSSES_LIMIT} pérdidas): {ks['p_streak']:.1%}")
+        print(f"P(cualquiera):  {ks['p_any']:.1%} | Días con disparo: {ks['days_fired_pct']:.1%}")
@@ -1,6 +1,10 @@
 import time
 from datetime import datetime
 
+# Kill Switch Limits (también los usa core/monte_carlo para estimar cuán seguido saltan)
+MAX_DAILY_LOSS_R = 3.0
+CONSECUTIVE_LOSSES_LIMIT = 3
+
 class ProductionController:
     def __init__(self, api, state_manager, telegram_bot, config):
         self.api = api
@@ -11,8 +15,8 @@ class ProductionController:
         self.max_errors = 5
         
         # Kill Switch Limits
-        self.max_daily_loss_r = 3.0
-        self.consecutive_losses_limit = 3
+        self.max_daily_loss_r = MAX_DAILY_LOSS_R
+        self.consecutive_losses_limit = CONSECUTIVE_LOSSES_LIMIT
 
     def audit_positions(self):
         """
@@ -0,0 +1,164 @@
+# core/rolling_quantile.py
+import math
+import heapq
+from collections import deque
+
+import numpy as np
+
+
+class RollingQuantile:
+    """
+    Cuantil móvil sobre una ventana deslizante (ej: ATR_Threshold, 500 velas).
+    Dos heaps con borrado perezoso: 'lo' guarda los idx+1 valores más chicos
+    (max-heap) y 'hi' el resto (min-heap), así el cuantil sale de sus topes.
+    push() es O(log w). Interpolación lineal igual que rolling().quantile()
+    de pandas; los NaN no cuentan como observación.
+    """
+    def __init__(self, window, quantile, min_periods=None):
+        if not 0 <= quantile <= 1:
+            raise ValueError(f"quantile value {quantile} not in [0, 1]")
+        self.window = window
+        self.quantile = quantile
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.lo = []          # max-heap (valores negados)
+        self.hi = []          # min-heap
+        self.lo_size = 0      # tamaños efectivos (sin contar borrados pendientes)
+        self.hi_size = 0
+        self.lo_deleted = {}
+        self.hi_deleted = {}
+        self.value = math.nan
+
+    @property
+    def nobs(self):
+        return self.lo_size + self.hi_size
+
+    # --- Multiset (altas / bajas) ---
+
+    def _prune(self):
+        # Saca de los topes los valores ya borrados
+        while self.lo and self.lo_deleted.get(-self.lo[0]):
+            x = -heapq.heappop(self.lo)
+            self._forget(self.lo_deleted, x)
+        while self.hi and self.hi_deleted.get(self.hi[0]):
+            x = heapq.heappop(self.hi)
+            self._forget(self.hi_deleted, x)
+
+    @staticmethod
+    def _forget(deleted, x):
+        if deleted[x] == 1: del deleted[x]
+        else: deleted[x] -= 1
+
+    def _add(self, x):
+        if self.lo_size and x <= -self.lo[0]:
+            heapq.heappush(self.lo, -x)
+            self.lo_size += 1
+        else:
+            heapq.heappush(self.hi, x)
+            self.hi_size += 1
+
+    def _remove(self, x):
+        # Si x <= tope de 'lo', hay una copia de x en 'lo' (todo 'hi' es >= ese tope)
+        if self.lo_size and x <= -self.lo[0]:
+            self.lo_deleted[x] = self.lo_deleted.get(x, 0) + 1
+            self.lo_size -= 1
+        else:
+            self.hi_deleted[x] = self.hi_deleted.get(x, 0) + 1
+            self.hi_size -= 1
+        self._prune()
+
+    def _rebalance(self):
+        nobs = self.nobs
+        target = int(self.quantile * (nobs - 1)) + 1 if nobs else 0
+        self._prune()
+        while self.lo_size > target:
+            x = -heapq.heappop(self.lo)
+            self.lo_size -= 1
+            heapq.heappush(self.hi, x)
+            self.hi_size += 1
+            self._prune()
+        while self.lo_size < target:
+            x = heapq.heappop(self.hi)
+            self.hi_size -= 1
+            heapq.heappush(self.lo, -x)
+            self.lo_size += 1
+            self._prune()
+        # Compactación ocasional para que la basura no crezca sin límite
+        if len(self.lo) + len(self.hi) > 2 * nobs + 64:
+            self._compact()
+
+    def _compact(self):
+        lo = [-x for x in self.lo]
+        hi = list(self.hi)
+        for heap_vals, deleted in ((lo, self.lo_deleted), (hi, self.hi_deleted)):
+            pending = dict(deleted)
+            kept = []
+            for x in heap_vals:
+                if pending.get(x):
+                    pending[x] -= 1
+                else:
+                    kept.append(x)
+            heap_vals[:] = kept
+        self.lo = [-x for x in lo]
+        self.hi = hi
+        heapq.heapify(self.lo)
+        heapq.heapify(self.hi)
+        self.lo_deleted = {}
+        self.hi_deleted = {}
+
+    def _current(self):
+        nobs = self.nobs
+        if nobs < self.min_periods or nobs == 0:
+            return math.nan
+        vlow = -self.lo[0]
+        if nobs == 1:
+            return vlow
+        idx_with_fraction = self.quantile * (nobs - 1)
+        idx = int(idx_with_fraction)
+        if idx_with_fraction == idx:
+            return vlow
+        vhigh = self.hi[0]
+        return vlow + (vhigh - vlow) * (idx_with_fraction - idx)
+
+    # --- API pública ---
+
+    def push(self, value):
+        """Agrega una observación (y saca la más vieja). Devuelve el cuantil actual."""
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if old == old: self._remove(old)
+        self.values.append(value)
+        if value == value: self._add(value)
+        self._rebalance()
+        self.value = self._current()
+        return self.value
+
+    def peek(self, value):
+        """Cuantil que daría push(value), sin modificar la ventana (vela en formación)."""
+        old = self.values[0] if len(self.values) == self.window else None
+        if old is not None and old == old: self._remove(old)
+        if value == value: self._add(value)
+        self._rebalance()
+        result = self._current()
+        # Deshacer
+        if value == value: self._remove(value)
+        if old is not None and old == old: self._add(old)
+        self._rebalance()
+        return result
+
+    def push_many(self, values):
+        """Aplica una serie completa de observaciones; devuelve el cuantil en cada paso."""
+        values = np.asarray(values, dtype=float)
+        out = np.empty(len(values))
+        push = self.push
+        for i, x in enumerate(values.tolist()):
+            out[i] = push(x)
+        return out
+
+
+def rolling_quantile(values, window, quantile, min_periods=None):
+    """
+    API batch: equivalente a pd.Series(values).rolling(window).quantile(quantile).
+    Devuelve un np.ndarray alineado con 'values'.
+    """
+    return RollingQuantile(window, quantile, min_periods).push_many(values)
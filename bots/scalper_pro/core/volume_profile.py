@@ -0,0 +1,170 @@
+# core/volume_profile.py
+from bisect import bisect_left
+from collections import deque
+
+import numpy as np
+
+
+def _round_edges(bins, precision):
+    # Réplica de pd.cut: los bordes de los intervalos se redondean a 'precision'
+    # decimales (o cifras significativas si el precio es < 1)
+    frac, whole = np.modf(bins)
+    with np.errstate(divide='ignore'):
+        digits = np.where(whole == 0, -np.floor(np.log10(np.abs(frac))) - 1 + precision, precision)
+    rounded = bins.copy()
+    finite = np.isfinite(bins) & (bins != 0) & np.isfinite(digits)
+    for d in np.unique(digits[finite]):
+        mask = finite & (digits == d)
+        rounded[mask] = np.around(bins[mask], int(d))
+    return rounded
+
+
+def label_edges(bins, base_precision=3):
+    """Bordes tal como los etiqueta pd.cut (sube la precisión hasta que sean únicos)."""
+    for precision in range(base_precision, 20):
+        edges = _round_edges(bins, precision)
+        if len(np.unique(edges)) == len(bins):
+            return edges
+    return _round_edges(bins, base_precision)
+
+
+def value_area_from_histogram(hist, edges, value_area=0.70):
+    """
+    Value Area (70% del volumen) a partir del histograma por nivel de precio.
+    Misma regla que el pipeline pandas original: niveles ordenados por volumen
+    (desc.), acumulado <= 70% del total; VAH/VAL = extremos de esos niveles.
+    """
+    total_volume = hist.sum()
+    # Orden descendente igual que sort_values(ascending=False) (mismos empates)
+    rev = hist[::-1]
+    order = (len(hist) - 1 - np.argsort(rev, kind='quicksort'))[::-1]
+    cum_vol = np.cumsum(hist[order])
+    va_bins = order[cum_vol <= total_volume * value_area]
+    if len(va_bins) == 0:
+        return None
+    return {'VAH': edges[va_bins.max() + 1], 'VAL': edges[va_bins.min()]}
+
+
+def _histogram(closes, volumes, bins):
+    # Intervalos (a, b] como pd.cut: el close == mínimo exacto queda afuera
+    codes = np.searchsorted(bins, closes, side='left') - 1
+    valid = (codes >= 0) & (codes < len(bins) - 1)
+    hist = np.bincount(codes[valid], weights=volumes[valid], minlength=len(bins) - 1)
+    return hist, codes
+
+
+def volume_profile_zones(highs, lows, closes, volumes, n_bins=100, value_area=0.70):
+    """Calcula VAH/VAL de una ventana (arrays numpy). None si no hay rango."""
+    price_min = lows.min()
+    price_max = highs.max()
+    if price_min == price_max:
+        return None
+    bins = np.linspace(price_min, price_max, n_bins)
+    hist, _ = _histogram(np.asarray(closes, dtype=float), np.asarray(volumes, dtype=float), bins)
+    return value_area_from_histogram(hist, label_edges(bins), value_area)
+
+
+class VolumeProfile:
+    """
+    Volume Profile de ventana deslizante (lookback velas).
+    push() agrega la vela nueva y descarga la más vieja: si el rango de precios
+    de la ventana no cambió, solo se tocan dos niveles del histograma; si cambió
+    (nuevo máximo/mínimo), se re-binea la ventana completa con bincount.
+    """
+    def __init__(self, lookback=288, n_bins=100, value_area=0.70):
+        self.lookback = lookback
+        self.n_bins = n_bins
+        self.value_area = value_area
+
+        self.closes = deque()
+        self.volumes = deque()
+        self.codes = deque()
+        self.max_q = deque()   # (idx, high) monótona decreciente
+        self.min_q = deque()   # (idx, low) monótona creciente
+        self.count = 0
+
+        self.price_range = None
+        self.bins = None
+        self.bin_edges = None
+        self.labels = None
+        self.hist = None
+
+    def _code(self, close):
+        code = bisect_left(self.bin_edges, close) - 1
+        return code if 0 <= code < self.n_bins - 1 else -1
+
+    def _rebuild(self, price_min, price_max):
+        self.price_range = (price_min, price_max)
+        self.bins = np.linspace(price_min, price_max, self.n_bins)
+        self.bin_edges = self.bins.tolist()
+        self.labels = label_edges(self.bins)
+        hist, codes = _histogram(np.array(self.closes), np.array(self.volumes), self.bins)
+        codes[(codes < 0) | (codes >= self.n_bins - 1)] = -1
+        self.hist = hist
+        self.codes = deque(codes.tolist())
+
+    def push(self, high, low, close, volume):
+        """Agrega una vela. Devuelve {'VAH', 'VAL'} de la ventana actual o None."""
+        idx = self.count
+        self.count += 1
+
+        # 1. Extremos de la ventana (colas monótonas, O(1) amortizado)
+        while self.max_q and self.max_q[-1][1] <= high: self.max_q.pop()
+        self.max_q.append((idx, high))
+        while self.min_q and self.min_q[-1][1] >= low: self.min_q.pop()
+        self.min_q.append((idx, low))
+        oldest = idx - self.lookback + 1
+        while self.max_q[0][0] < oldest: self.max_q.popleft()
+        while self.min_q[0][0] < oldest: self.min_q.popleft()
+
+        # 2. Ventana de velas (sale la más vieja)
+        evicted = None
+        if len(self.closes) == self.lookback:
+            evicted = (self.codes.popleft(), self.volumes.popleft())
+            self.closes.popleft()
+        self.closes.append(close)
+        self.volumes.append(volume)
+
+        if len(self.closes) < self.lookback:
+            self.codes.append(-1)
+            return None
+
+        price_min = self.min_q[0][1]
+        price_max = self.max_q[0][1]
+        if price_min == price_max:
+            self.codes.append(-1)
+            self.price_range = None
+            return None
+
+        # 3. Histograma: incremental si el rango no cambió
+        if self.price_range == (price_min, price_max) and evicted is not None:
+            old_code, old_vol = evicted
+            if old_code >= 0: self.hist[old_code] -= old_vol
+            code = self._code(close)
+            if code >= 0: self.hist[code] += volume
+            self.codes.append(code)
+        else:
+            self.codes.append(-1)
+            self._rebuild(price_min, price_max)
+
+        return value_area_from_histogram(self.hist, self.labels, self.value_area)
+
+
+def volume_profile_series(df, lookback=288, n_bins=100, value_area=0.70):
+    """
+    VAH/VAL para todo el DataFrame en una sola pasada.
+    La fila i usa la ventana que termina en i (inclusive), igual que
+    get_volume_profile_zones(df.iloc[:i+1]). NaN donde no hay zonas.
+    """
+    vp = VolumeProfile(lookback, n_bins, value_area)
+    n = len(df)
+    vah = np.full(n, np.nan)
+    val = np.full(n, np.nan)
+    rows = zip(df['high'].values.tolist(), df['low'].values.tolist(),
+               df['close'].values.tolist(), df['volume'].values.tolist())
+    for i, (h, l, c, v) in enumerate(rows):
+        zones = vp.push(h, l, c, v)
+        if zones:
+            vah[i] = zones['VAH']
+            val[i] = zones['VAL']
+    return vah, val
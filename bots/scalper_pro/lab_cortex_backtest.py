@@ -3,14 +3,19 @@ import numpy as np
 import joblib
 import sys
 import os
-import ccxt
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.feature_store import FeatureStore, PredictionCache
+from shared.result_cache import source_hash
+from core.cortex import FEATURE_COLUMNS, WARMUP, Gatekeeper, calculate_features
 import config
 
 # --- CONFIGURACIÓN ---
 START_DATE = "2024-01-01"
 END_DATE   = "2024-12-31"
+TIMEFRAME  = '5m'
 TARGET_PAIRS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'AVAX/USDT', 'LTC/USDT']
 
 # Nombre del modelo guardado por el trainer (verificamos que sea el V9 o V9.1 según tu output)
@@ -18,6 +23,9 @@ TARGET_PAIRS = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'AVAX/USDT', 'LTC/USDT']
 # Si el trainer guardó como v9.joblib, ajusta aquí. Por defecto pongo v9.joblib
 MODEL_PATH = "cortex_model_v9.joblib" 
 
+# Features feat_* persistidas por (símbolo, TF, versión del cálculo): cada corrida solo calcula velas nuevas
+FEATURES = FeatureStore('cortex_v9', calculate_features, FEATURE_COLUMNS, WARMUP, source_hash(calculate_features))
+
 # Parámetros Técnicos (Estrategia Base V6.5)
 # La IA decide SI operamos. Estos parámetros deciden CÓMO operamos.
 TECH_PARAMS = {
@@ -29,78 +37,32 @@ TECH_PARAMS = {
 
 def load_data(symbol):
     print(f"📥 {symbol}...", end=" ")
-    exchange = ccxt.binance()
-    since = exchange.parse8601(f"{START_DATE}T00:00:00Z")
-    end_ts = exchange.parse8601(f"{END_DATE}T23:59:59Z")
-    all_ohlcv = []
-    while since < end_ts:
-        try:
-            ohlcv = exchange.fetch_ohlcv(symbol, '5m', limit=1000, since=since)
-            if not ohlcv: break
-            since = ohlcv[-1][0] + 1
-            ohlcv = [x for x in ohlcv if x[0] <= end_ts]
-            all_ohlcv.extend(ohlcv)
-        except: break
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df = get_store().load(symbol, TIMEFRAME, f"{START_DATE}T00:00:00Z", f"{END_DATE}T23:59:59Z")
     print(f" {len(df)} velas.")
     return df
 
-def calculate_features_v9(df):
+def calculate_features_v9(df, features=None):
     """
-    CÁLCULO DE FEATURES (Copia exacta del Miner V9.2)
-    Esto genera las columnas que faltaban y causaban el KeyError.
+    Velas + features del Miner V9.2 (core.cortex) + técnicos de la estrategia.
+    'features': columnas feat_* ya calculadas (feature store); si no, se calculan.
     """
     df = df.copy()
-    
-    # A. DINÁMICA
+    if features is None:
+        features = calculate_features(df)
+    df[FEATURE_COLUMNS] = features[FEATURE_COLUMNS]
+
+    # E. TÉCNICOS PARA ESTRATEGIA (V6.5)
     high_low = df['high'] - df['low']
     high_close = np.abs(df['high'] - df['close'].shift())
     low_close = np.abs(df['low'] - df['close'].shift())
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = np.max(ranges, axis=1)
-    
-    atr_fast = true_range.rolling(14).mean()
-    atr_slow = true_range.rolling(100).mean()
-    
-    df['feat_volatility_z'] = atr_fast / atr_slow 
-    df['feat_squeeze'] = (atr_fast / df['close']).rolling(20).std() 
+    true_range = np.max(pd.concat([high_low, high_close, low_close], axis=1), axis=1)
 
-    # B. MICROESTRUCTURA
-    candle_range = df['high'] - df['low']
-    candle_range = candle_range.replace(0, 0.000001) 
-    df['feat_clv'] = ((df['close'] - df['low']) - (df['high'] - df['close'])) / candle_range
-    
-    upper_wick = df['high'] - df[['close', 'open']].max(axis=1)
-    lower_wick = df[['close', 'open']].min(axis=1) - df['low']
-    df['feat_wick_up'] = upper_wick / candle_range
-    df['feat_wick_down'] = lower_wick / candle_range
-    
-    body_size = abs(df['close'] - df['open'])
-    df['feat_body_r'] = body_size / candle_range
-
-    # C. IMPACTO
-    vol_ma = df['volume'].rolling(50).mean()
-    df['feat_volume_z'] = df['volume'] / vol_ma
-    df['feat_vol_impact'] = (df['volume'] * df['feat_clv']).rolling(3).mean()
-
-    # D. TENDENCIA
-    delta = df['close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-    rs = gain / loss
-    df['feat_rsi'] = 100 - (100 / (1 + rs))
-    
-    sma50 = df['close'].rolling(50).mean()
-    df['feat_dist_sma'] = (df['close'] - sma50) / atr_fast
-
-    # E. TÉCNICOS PARA ESTRATEGIA (V6.5)
     df['rolling_mean'] = df['close'].rolling(300).mean()
     df['rolling_std'] = df['close'].rolling(300).std()
     df['VAH'] = df['rolling_mean'] + df['rolling_std']
     df['VAL'] = df['rolling_mean'] - df['rolling_std']
     df['Vol_MA'] = df['volume'].rolling(20).mean()
-    df['ATR'] = atr_fast
+    df['ATR'] = true_range.rolling(14).mean()
     
     return df.dropna()
 
@@ -115,16 +77,11 @@ def run_simulation():
         # Mapeo de Clases: TOXIC(0), NOISE(1), PROFIT(2)
         # Verificamos si el modelo guardó las clases correctamente
         print(f"   Clases detectadas: {model.classes_}")
-        
-        class_map = {label: idx for idx, label in enumerate(model.classes_)}
-        # Usamos .get() por seguridad
-        idx_toxic  = class_map.get(0) # Si usaste nombres string, ajusta aquí ('TOXIC')
-        idx_noise  = class_map.get(1)
-        idx_profit = class_map.get(2)
-        
-        if idx_profit is None:
-            print("❌ Error: No encuentro la clase PROFIT (2) en el modelo.")
-            return
+        gatekeeper = Gatekeeper(model)
+        idx_profit = gatekeeper.profit_idx
+
+        # Predicciones guardadas por hash del archivo del modelo (reentrenar las invalida)
+        predictions = PredictionCache(model, MODEL_PATH, FEATURES.version)
 
     except Exception as e:
         print(f"❌ Error cargando modelo: {e}")
@@ -132,26 +89,19 @@ def run_simulation():
 
     global_log = []
     
-    # Lista de Features EXACTA del Miner
-    feature_cols = [
-            'feat_volatility_z', 'feat_squeeze', 
-            'feat_clv', 'feat_wick_up', 'feat_wick_down', 'feat_body_r',
-            'feat_volume_z', 'feat_vol_impact', 
-            'feat_rsi', 'feat_dist_sma'
-    ]
-
     for symbol in TARGET_PAIRS:
         df = load_data(symbol)
         if df.empty: continue
         
-        # 2. CALCULAR FEATURES (El paso que faltaba)
-        # Esto añade las columnas 'feat_...' al DataFrame
-        df = calculate_features_v9(df)
+        # 2. FEATURES (del feature store: solo se calculan las velas nuevas)
+        features = FEATURES.update(symbol, TIMEFRAME, df)
+        df = calculate_features_v9(df, features)
         
-        # 3. INFERENCIA MASIVA
+        # 3. INFERENCIA MASIVA (solo las velas sin predicción guardada)
         print(f"   ⚙️ Consultando al Gatekeeper para {symbol}...")
-        X_full = df[feature_cols] # Ahora sí existen las columnas
-        all_probs = model.predict_proba(X_full)
+        X_full = df[FEATURE_COLUMNS]
+        timestamps = df['timestamp'].values.astype('datetime64[ms]').astype(np.int64)
+        all_probs = predictions.predict_proba(symbol, TIMEFRAME, timestamps, X_full)
         
         # Arrays numpy para velocidad
         closes = df['close'].values; opens = df['open'].values
@@ -171,19 +121,8 @@ def run_simulation():
             probs = all_probs[i]
             p_profit = probs[idx_profit]
             
-            # FILTRO: ¿Autoriza la IA?
-            is_authorized = False
-            
-            if "BTC" in symbol:
-                # BTC requiere certeza absoluta en este régimen
-                if p_profit > 0.60: 
-                    is_authorized = True
-            else:
-                # Alts toleran un poco más de riesgo si hay tendencia
-                if p_profit > 0.50:
-                    is_authorized = True
-            
-            if not is_authorized:
+            # FILTRO: ¿Autoriza la IA? (BTC > 0.60, alts > 0.50)
+            if not gatekeeper.is_authorized(symbol, p_profit):
                 continue # LA IA BLOQUEA EL TRADE (WAIT)
 
             # --- ESTRATEGIA TÉCNICA (V6.5) ---
@@ -2,12 +2,16 @@ import pandas as pd
 import numpy as np
 import sys
 import os
-import ccxt
 
 # Importamos módulos de producción
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.result_cache import cached_indicators, cached_result, make_key, data_hash, params_hash, source_hash
 import config
 from core.data_processor import DataProcessor
+from core.volume_profile import volume_profile_series
+from core.exit_simulator import simulate_exits, outcome_names, V64_RULES
 from strategies.strategy_v6_4 import StrategyV6_4
 
 # --- CONFIGURACIÓN DEL LABORATORIO ---
@@ -26,123 +30,84 @@ TIMEFRAME = '5m'
 TOTAL_CANDLES = 30000  # Aprox 3 meses recientes
 
 def fetch_data(symbol):
-    exchange = ccxt.binance()
-    print(f"\n📡 Descargando {TOTAL_CANDLES} velas de {symbol}...")
+    print(f"\n📡 Cargando {TOTAL_CANDLES} velas de {symbol}...")
     
-    # Intentamos descargar. Si falla (ej: símbolo incorrecto), retornamos None
-    try:
-        ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=1000)
-    except Exception as e:
-        print(f"⚠️ Error descargando {symbol}: {e}")
+    # Caché local: solo se descargan las velas que faltan.
+    # Si falla (ej: símbolo incorrecto) y no hay nada en disco, retornamos None
+    df = get_store().load_last(symbol, TIMEFRAME, TOTAL_CANDLES)
+    if df.empty:
+        print(f"⚠️ Sin datos para {symbol}")
         return None
-
-    all_ohlcv = ohlcv
-    
-    # Estimación de tiempo para el loop
-    tf_min = 5
-    ms_chunk = 1000 * tf_min * 60 * 1000
-    
-    while len(all_ohlcv) < TOTAL_CANDLES:
-        oldest = all_ohlcv[0][0]
-        since = oldest - ms_chunk
-        try:
-            batch = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=1000, since=since)
-            batch = [x for x in batch if x[0] < oldest]
-            if not batch: break
-            all_ohlcv = batch + all_ohlcv
-            print(f"   Buffer: {len(all_ohlcv)} velas...", end='\r')
-        except: break
-    
-    if len(all_ohlcv) > TOTAL_CANDLES: all_ohlcv = all_ohlcv[-TOTAL_CANDLES:]
-    
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    cols = ['open', 'high', 'low', 'close', 'volume']
-    df[cols] = df[cols].astype(float)
     return df
 
-def simulate_logic(df, strategy, symbol_name):
+def profile_params(symbol):
+    # Perfil del par (mismo criterio que main_multipair)
+    profile_name = getattr(config, 'ASSET_MAP', {}).get(symbol, 'SNIPER')
+    params = dict(getattr(config, 'PROFILES', {}).get(profile_name, {}))
+    params['name'] = profile_name
+    return params
+
+def calculate_indicators(df):
+    # Indicadores V6.4 reales + zonas VAH/VAL (Volume Profile, ventana deslizante de 288 velas)
     processor = DataProcessor()
-    # Calculamos indicadores usando la lógica V6.4 real
     df = processor.calculate_indicators(df)
+    df['VAH'], df['VAL'] = processor.get_volume_profile_series(df)
+    return df
+
+def simulate_logic(df, strategy, symbol_name):
+    """_simulate con caché: mismas velas + mismo perfil + mismo código = no se re-simula."""
+    key = make_key('multipair', TIMEFRAME, symbol_name, data_hash(df), params_hash(profile_params(symbol_name)),
+                   params_hash(V64_RULES), source_hash(_simulate, calculate_indicators, DataProcessor,
+                                                       StrategyV6_4, simulate_exits))
+    return cached_result(key, lambda: _simulate(df, strategy, symbol_name))['trades']
+
+def _simulate(df, strategy, symbol_name):
+    # Indicadores desde el caché si las velas no cambiaron (el Volume Profile es lo caro)
+    df = cached_indicators(df, calculate_indicators, DataProcessor, volume_profile_series)
     
     trade_log = []
     last_idx = -999
     cooldown = 12
-    
-    # Loop de simulación
-    for i in range(500, len(df)):
+
+    # Señales de todo el histórico de una vez (misma regla que get_signal en vivo)
+    longs, shorts, stops = strategy.get_signals(df, df[['VAH', 'VAL']], profile_params(symbol_name))
+    closes = df['close'].values
+    highs = df['high'].values
+    lows = df['low'].values
+
+    # Candidatos: todas las señales desde la vela 500
+    entries = np.flatnonzero(longs | shorts)
+    entries = entries[entries >= 500]
+    entry_prices = closes[entries]
+    sl_dist = np.abs(entry_prices - stops[entries])
+    sl_dist = np.where(sl_dist == 0, entry_prices * 0.01, sl_dist) # Evitar div/0
+
+    # Salidas V6.4 de todos los candidatos de una vez (FT, stagnant, TP2, SL, time stop)
+    codes, r_nets, bars_held = simulate_exits(highs, lows, closes, entries, np.where(longs[entries], 1, -1),
+                                              entry_prices, sl_dist, V64_RULES)
+    outcomes = outcome_names(codes)
+
+    # Loop de simulación: solo resta aplicar el cooldown entre trades
+    for k, i in enumerate(entries):
         if i - last_idx < cooldown: continue
-        
-        # Slice para Volume Profile
-        current_slice = df.iloc[i-300 : i+1]
-        zones = processor.get_volume_profile_zones(current_slice)
-        
-        # Señal
-        trade = strategy.get_signal(current_slice, zones)
-        
-        if trade:
-            # Simulación de Gestión (Simplificada V6.4 para velocidad)
-            outcome = "HOLD"
-            entry_price = trade['entry_price']
-            sl = trade['stop_loss']
-            sl_dist = abs(entry_price - sl)
-            if sl_dist == 0: sl_dist = entry_price * 0.01 # Evitar div/0
-            
-            tp1_hit = False
-            r_net = 0
-            bars_duration = 0
-            
-            # Forward Loop (Miramos el futuro para ver el resultado)
-            for j in range(1, 13): # 1 hora max
-                if i+j >= len(df): break
-                c = df.iloc[i+j]
-                bars_duration = j
-                
-                # Calc R
-                if trade['type'] == 'LONG':
-                    curr_r = (c['close'] - entry_price) / sl_dist
-                    high_r = (c['high'] - entry_price) / sl_dist
-                    low_r = (c['low'] - entry_price) / sl_dist
-                else:
-                    curr_r = (entry_price - c['close']) / sl_dist
-                    high_r = (entry_price - c['low']) / sl_dist 
-                    low_r = (entry_price - c['high']) / sl_dist 
-                
-                # Reglas de Salida V6.4
-                if j == 2 and curr_r < -0.10: outcome = "FAILED_FT"; r_net = -0.15; break
-                if j == 4 and curr_r < 0.25: outcome = "STAGNANT"; r_net = 0.0; break
-                if j == 6 and curr_r < 0.20: outcome = "STAGNANT_LATE"; r_net = -0.15; break
-                
-                # Targets
-                if high_r >= 3.0: outcome = "TP2_HIT"; r_net = 3.0; break
-                if low_r <= -1.1: outcome = "SL_HIT"; r_net = -1.1; break # Slippage incluido
-                
-                # TP1 State
-                if high_r >= 1.0: tp1_hit = True
-                
-                # Time Stop
-                if j == 12: 
-                    outcome = "TIME_STOP"
-                    r_net = max(curr_r, 0.5) if tp1_hit else curr_r
-                    break
-            
-            # Fees (Smart Fee logic)
-            fee = 0.015 if outcome in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT', 'STAGNANT_LATE'] else 0.045
-            
-            # --- CORRECCIÓN DEL BUG ---
-            # Guardamos 'symbol_name' (string) directamente, no df[...]
-            trade_log.append({
-                'symbol': symbol_name, 
-                'outcome': outcome,
-                'r_net': r_net - fee,
-                'bars': bars_duration
-            })
-            
-            last_idx = i
-            cooldown = 2 if 'STAGNANT' in outcome or 'FAILED' in outcome else 12
+        outcome = outcomes[k]
+
+        # Fees (Smart Fee logic)
+        fee = 0.015 if outcome in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT', 'STAGNANT_LATE'] else 0.045
+
+        # --- CORRECCIÓN DEL BUG ---
+        # Guardamos 'symbol_name' (string) directamente, no df[...]
+        trade_log.append({
+            'symbol': symbol_name, 
+            'outcome': outcome,
+            'r_net': r_nets[k] - fee,
+            'bars': bars_held[k]
+        })
+
+        last_idx = i
+        cooldown = 2 if 'STAGNANT' in outcome or 'FAILED' in outcome else 12
             
-    return trade_log
+    return {'trades': len(trade_log)}, trade_log, None
 
 def run_multipair_lab():
     strategy = StrategyV6_4()
@@ -1,9 +1,18 @@
 import pandas as pd
 import numpy as np
-import ccxt
 import sys
 import os
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.sweep import run_sweep, ranking, results_path
+from shared.walk_forward import make_windows, walk_forward
+from shared.result_cache import cached_indicators, make_key, source_hash
+from shared.intrabar import IntrabarIndex
+from core.volume_profile import volume_profile_series
+from core.exit_simulator import simulate_exits, outcome_names
+
 # ==============================================================================
 # 🎛️ PLAYGROUND (TU ZONA DE JUEGO)
 # ==============================================================================
@@ -44,28 +53,39 @@ TEST_MAP = {
     'ETH/USDT': 'SNIPER'  # El Hermano (A ver si logras hacerlo rentable)
 }
 
+# 4. SWEEP (python lab_optimizer_v65.py --sweep)
+# Todas las combinaciones x todos los símbolos de TEST_MAP, en paralelo.
+# Los resultados quedan en backtesting/data/sweeps/ y una corrida cortada se retoma.
+SWEEP_GRID = {
+    'vol_threshold': [0.6, 0.8, 1.0, 1.2, 1.5],
+    'rsi_long': [30, 35, 40, 45, 50],
+    'rsi_short': [50, 55, 60, 65, 70],
+    'tp_mult': [1.5, 2.0, 2.5, 3.0],
+    'sl_atr': [1.0, 1.5, 2.0],
+    'cooldown': [6, 12, 24],
+}
+
+# 5. WALK-FORWARD (python lab_optimizer_v65.py --walk-forward)
+# Optimiza SWEEP_GRID en cada ventana de train y valida en la siguiente de test.
+WF_START = "2022-01-01"
+WF_END   = END_DATE
+WF_TRAIN = '180D'       # Ventana de optimización
+WF_TEST  = '60D'        # Ventana out-of-sample (también el paso)
+WF_ANCHORED = False     # True: el train arranca siempre en WF_START y crece
+WF_MIN_TRADES = 20      # Combinaciones con menos trades en train no se eligen
+
+# 6. INTRABAR
+# Vela que toca SL y TP a la vez: el orden real sale de la base 1m del candle store.
+# False = convención pesimista (SL primero) sin cargar 1m.
+INTRABAR = True
+
 # ==============================================================================
 # ⚙️ MOTOR V6.5 (REVERSIÓN PURA)
 # ==============================================================================
 
 def fetch_data(symbol):
-    print(f"📥 Descargando {symbol} ({START_DATE} - {END_DATE})...", end=" ")
-    exchange = ccxt.binance()
-    since = exchange.parse8601(f"{START_DATE}T00:00:00Z")
-    end_ts = exchange.parse8601(f"{END_DATE}T23:59:59Z")
-    all_ohlcv = []
-    
-    while since < end_ts:
-        try:
-            ohlcv = exchange.fetch_ohlcv(symbol, '5m', limit=1000, since=since)
-            if not ohlcv: break
-            since = ohlcv[-1][0] + 1
-            ohlcv = [x for x in ohlcv if x[0] <= end_ts]
-            all_ohlcv.extend(ohlcv)
-        except: break
-            
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    print(f"📥 Cargando {symbol} ({START_DATE} - {END_DATE})...", end=" ")
+    df = get_store().load(symbol, '5m', f"{START_DATE}T00:00:00Z", f"{END_DATE}T23:59:59Z")
     print(f" {len(df)} velas.")
     return df
 
@@ -90,14 +110,100 @@ def calculate_indicators(df):
     true_range = np.max(ranges, axis=1)
     df['ATR'] = true_range.rolling(14).mean()
     
-    # 4. Bandas (VAH/VAL Proxy con Bollinger 2SD)
-    # En producción usas Volume Profile real, pero la correlación es >90%
-    df['rolling_mean'] = df['close'].rolling(300).mean()
-    df['rolling_std'] = df['close'].rolling(300).std()
-    df['VAH'] = df['rolling_mean'] + df['rolling_std']
-    df['VAL'] = df['rolling_mean'] - df['rolling_std']
+    # 4. Zonas (VAH/VAL) con Volume Profile real, igual que producción (288 velas)
+    df['VAH'], df['VAL'] = volume_profile_series(df)
     
-    return df.dropna()
+    # Sin zonas = NaN (no hay señal), pero la vela no se borra
+    return df.dropna(subset=['Vol_MA', 'RSI', 'ATR'])
+
+def prepare(df):
+    """calculate_indicators con caché (el Volume Profile es lo caro): misma data + mismo código = sin recalcular."""
+    return cached_indicators(df, calculate_indicators, volume_profile_series)
+
+# Columnas que usa el simulador (también las que viajan a memoria compartida en el sweep)
+SIM_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'Vol_MA', 'RSI', 'ATR', 'VAH', 'VAL']
+TIME_STOP = 12          # Proyección 1 Hora (12 velas)
+FEE_R = 0.05            # Fees (-0.05R aprox por trade ida y vuelta)
+RESULT_TYPES = {'SL_HIT': 'SL', 'TP2_HIT': 'TP', 'TIME_STOP': 'TIME'}
+
+
+def to_arrays(df, symbol=None):
+    """Arrays del simulador; con 'symbol' (e INTRABAR) suma el índice vela 5m -> velas 1m."""
+    arrays = {col: df[col].to_numpy(dtype=float) for col in SIM_COLUMNS}
+    if INTRABAR and symbol is not None:
+        ts = df['timestamp'].values.astype('datetime64[ms]').astype(np.int64)
+        intrabar = IntrabarIndex.from_store(symbol, ts, '5m')
+        if intrabar is not None:
+            arrays.update(intrabar.columns())
+    return arrays
+
+
+def simulate(arrays, params, lo=0, hi=None):
+    """
+    Trades de un perfil sobre los arrays de un símbolo: [(índice, r_net, tipo)].
+    Solo entra en las velas [lo, hi) (ventanas del walk-forward).
+    Las señales se evalúan vectorizadas; solo el cooldown es secuencial.
+    """
+    opens, highs, lows, closes = arrays['open'], arrays['high'], arrays['low'], arrays['close']
+    vols, vol_mas, rsis, atrs = arrays['volume'], arrays['Vol_MA'], arrays['RSI'], arrays['ATR']
+    vahs, vals = arrays['VAH'], arrays['VAL']
+    n = len(closes)
+    first, last = max(300, lo), min(n, n if hi is None else hi) - TIME_STOP
+    if last <= first:
+        return []
+
+    i = np.arange(first, last)
+    p = i - 1
+    with np.errstate(invalid='ignore'):
+        # FILTRO VOLUMEN
+        vol_ok = ~(vols[i] < (vol_mas[i] * params['vol_threshold']))
+
+        # LONG: Precio toca VAL (Suelo) y rebota con vela de fuerza, RSI no caro
+        touch_val = (lows[p] <= vals[p]) & (closes[p] > vals[p])
+        is_long = touch_val & (lows[i] > vals[i]) & (closes[i] > highs[p]) & (closes[i] > opens[i]) \
+            & (rsis[i] < params['rsi_long'])
+
+        # SHORT: Precio toca VAH (Techo) y cae (solo si no hubo toque de VAL)
+        touch_vah = ~touch_val & (highs[p] >= vahs[p]) & (closes[p] < vahs[p])
+        is_short = touch_vah & (highs[i] < vahs[i]) & (closes[i] < lows[p]) & (closes[i] < opens[i]) \
+            & (rsis[i] > params['rsi_short'])
+
+    entry = closes[i]
+    sl_price = np.where(is_long, entry - (atrs[i] * params['sl_atr']), entry + (atrs[i] * params['sl_atr']))
+    sl_dist = np.abs(entry - sl_price)
+    signal = vol_ok & (is_long | is_short) & (sl_dist != 0)
+
+    # Cooldown: tras un trade se saltean las próximas 'cooldown' velas
+    cooldown_limit = params.get('cooldown', 12)
+    picked, next_free = [], -1
+    for k in np.flatnonzero(signal):
+        if i[k] < next_free: continue
+        picked.append(k)
+        next_free = i[k] + cooldown_limit + 1
+    if not picked:
+        return []
+    picked = np.array(picked)
+
+    # Salidas: SL primero (pesimista), después TP, time stop al cierre de la vela 12.
+    # Si los arrays traen el índice 1m, SL y TP en la misma vela se resuelven con el orden real.
+    rules = {'tp2': params['tp_mult'], 'sl': -1.0, 'tp1': None, 'time_stop': TIME_STOP,
+             'order': ('sl', 'tp2', 'time'), 'on_data_end': 'hold', 'levels': 'r'}
+    codes, outcome_r, _ = simulate_exits(highs, lows, closes, i[picked], np.where(is_long[picked], 1, -1),
+                                         entry[picked], sl_dist[picked], rules,
+                                         intrabar=IntrabarIndex.from_arrays(arrays))
+    names = outcome_names(codes)
+    return [(int(idx), r - FEE_R, RESULT_TYPES.get(name, 'HOLD'))
+            for idx, r, name in zip(i[picked], outcome_r.tolist(), names)]
+
+
+def evaluate(arrays, params):
+    """Métricas de un perfil (función del sweep: corre en los workers)."""
+    r_net = np.array([r for _, r, _ in simulate(arrays, params)])
+    if not len(r_net):
+        return {'trades': 0, 'net_r': 0.0, 'win_rate': 0.0, 'avg_r': 0.0}
+    return {'trades': len(r_net), 'net_r': float(r_net.sum()),
+            'win_rate': float((r_net > 0).mean()), 'avg_r': float(r_net.mean())}
+
 
 def run_optimizer():
     print(f"\n🧪 LABORATORIO V6.5 (PLAYGROUND)")
@@ -110,80 +216,12 @@ def run_optimizer():
         raw_df = fetch_data(symbol)
         if raw_df.empty: continue
         
-        df = calculate_indicators(raw_df)
+        df = prepare(raw_df)
         params = PROFILES[profile_name]
         
-        # Numpy Arrays (Velocidad pura)
-        closes = df['close'].values; opens = df['open'].values
-        highs = df['high'].values; lows = df['low'].values
-        vols = df['volume'].values; vol_mas = df['Vol_MA'].values
-        rsis = df['RSI'].values; atrs = df['ATR'].values
-        vahs = df['VAH'].values; vals = df['VAL'].values
-        
-        trades = []
-        cooldown = 0
-        cooldown_limit = params.get('cooldown', 12)
-        
-        # 2. Bucle de Simulación
-        for i in range(300, len(df)-12):
-            if cooldown > 0: cooldown -= 1; continue
-            
-            # FILTRO VOLUMEN
-            if vols[i] < (vol_mas[i] * params['vol_threshold']): 
-                continue
-                
-            signal = None; sl_price = 0
-            
-            # --- LÓGICA DE REVERSIÓN ---
-            
-            # LONG: Precio toca VAL (Suelo) y rebota
-            if lows[i-1] <= vals[i-1] and closes[i-1] > vals[i-1]: # Toque previo
-                 # Confirmación actual: Cierra arriba del open y del high anterior (Vela de fuerza)
-                 if lows[i] > vals[i] and closes[i] > highs[i-1] and closes[i] > opens[i]:
-                     # Filtro RSI (No compramos si ya está caro)
-                     if rsis[i] < params['rsi_long']:
-                         signal = 'LONG'; sl_price = closes[i] - (atrs[i] * params['sl_atr'])
-
-            # SHORT: Precio toca VAH (Techo) y cae
-            elif highs[i-1] >= vahs[i-1] and closes[i-1] < vahs[i-1]:
-                 if highs[i] < vahs[i] and closes[i] < lows[i-1] and closes[i] < opens[i]:
-                     if rsis[i] > params['rsi_short']:
-                         signal = 'SHORT'; sl_price = closes[i] + (atrs[i] * params['sl_atr'])
-            
-            # --- EJECUCIÓN DEL TRADE ---
-            if signal:
-                entry = closes[i]
-                sl_dist = abs(entry - sl_price)
-                if sl_dist == 0: continue
-                
-                tp_mult = params['tp_mult']
-                outcome_r = 0; result_type = "HOLD"
-                
-                # Proyección 1 Hora (12 velas)
-                for j in range(1, 13):
-                    idx = i + j
-                    if idx >= len(closes): break
-                    
-                    if signal == 'LONG':
-                        r_high = (highs[idx] - entry) / sl_dist
-                        r_low = (lows[idx] - entry) / sl_dist
-                        r_curr = (closes[idx] - entry) / sl_dist
-                    else:
-                        r_high = (entry - lows[idx]) / sl_dist 
-                        r_low = (entry - highs[idx]) / sl_dist 
-                        r_curr = (entry - closes[idx]) / sl_dist
-                    
-                    # Chequeo SL primero (Pesimista)
-                    if r_low <= -1.0: outcome_r = -1.0; result_type = "SL"; break
-                    # Chequeo TP
-                    if r_high >= tp_mult: outcome_r = tp_mult; result_type = "TP"; break
-                    # Time Stop
-                    if j == 12: outcome_r = r_curr; result_type = "TIME"
-                
-                # Fees (-0.05R aprox por trade ida y vuelta)
-                r_net = outcome_r - 0.05
-                trades.append({'symbol': symbol, 'profile': profile_name, 'r_net': r_net, 'type': result_type})
-                cooldown = cooldown_limit
+        # 2. Simulación (Numpy: velocidad pura)
+        trades = [{'symbol': symbol, 'profile': profile_name, 'r_net': r_net, 'type': result_type}
+                  for _, r_net, result_type in simulate(to_arrays(df, symbol), params)]
         
         # 3. Reporte Individual
         if trades:
@@ -206,5 +244,63 @@ def run_optimizer():
         print(f"💰 R NETO TOTAL: {df_glob['r_net'].sum():.2f} R")
         print("="*60)
 
+def code_version():
+    """Hash del código de la simulación (invalida resultados guardados si cambia)."""
+    return make_key(source_hash(simulate, simulate_exits, IntrabarIndex), TIME_STOP, FEE_R)
+
+def run_parameter_sweep(workers=None):
+    """Todas las combinaciones de SWEEP_GRID sobre todos los símbolos de TEST_MAP (pool de procesos)."""
+    print(f"\n🧮 SWEEP V6.5 ({START_DATE} - {END_DATE})")
+    datasets = {}
+    for symbol in TEST_MAP:
+        raw_df = fetch_data(symbol)
+        if raw_df.empty: continue
+        datasets[symbol] = to_arrays(prepare(raw_df), symbol)
+
+    path = results_path(f"v65_{START_DATE}_{END_DATE}")
+    version = make_key(code_version(), source_hash(evaluate))
+    run_sweep(datasets, SWEEP_GRID, evaluate, path, workers=workers, metric='net_r', version=version)
+
+    print("\n🏆 RANKING (R Neto, mínimo 20 trades)")
+    print(ranking(path, 'net_r', top=25, min_trades=20).to_string())
+
+def run_walk_forward(workers=None):
+    """Walk-forward sobre los símbolos de TEST_MAP: curva out-of-sample encadenada."""
+    print(f"\n🚶 WALK-FORWARD V6.5 ({WF_START} - {WF_END} | train {WF_TRAIN} / test {WF_TEST})")
+    datasets = {}
+    for symbol in TEST_MAP:
+        df = get_store().load(symbol, '5m', f"{WF_START}T00:00:00Z", f"{WF_END}T23:59:59Z")
+        if df.empty: continue
+        # Indicadores una sola vez sobre todo el historial (las ventanas lo comparten)
+        df = prepare(df)
+        datasets[symbol] = to_arrays(df, symbol)
+        datasets[symbol]['timestamp'] = df['timestamp'].values.astype('datetime64[ms]').astype(np.int64)
+
+    windows = make_windows(WF_START, f"{WF_END} 23:59:59", WF_TRAIN, WF_TEST, anchored=WF_ANCHORED)
+    mode = 'anchored' if WF_ANCHORED else 'rolling'
+    path = results_path(f"v65_wf_{mode}_{WF_TRAIN}_{WF_TEST}")
+    summary, curve = walk_forward(datasets, windows, simulate, SWEEP_GRID, path,
+                                  metric='net_r', min_trades=WF_MIN_TRADES, workers=workers,
+                                  version=code_version())
+    if summary.empty:
+        print("⚠️ Sin resultados.")
+        return
+
+    print("\n📋 VENTANAS (mejor perfil en train -> resultado en test)")
+    cols = ['dataset', 'test_start', 'train_net_r', 'train_trades', 'test_net_r', 'test_trades', 'test_win_rate']
+    print(summary[cols].to_string())
+    print("\n" + "="*60)
+    if not curve.empty:
+        for symbol, r in curve.groupby('dataset')['r']:
+            print(f"   -> {symbol}: {len(r)} trades OOS | R Neto: {r.sum():.2f} R | WR: {(r > 0).mean():.1%}")
+        peak = curve['cum_r'].cummax()
+        print(f"💰 R NETO OOS: {curve['r'].sum():.2f} R | Max DD: {(curve['cum_r'] - peak).min():.2f} R")
+    print("="*60)
+
 if __name__ == "__main__":
-    run_optimizer()
\ No newline at end of file
+    if '--walk-forward' in sys.argv:
+        run_walk_forward()
+    elif '--sweep' in sys.argv:
+        run_parameter_sweep()
+    else:
+        run_optimizer()
\ No newline at end of file
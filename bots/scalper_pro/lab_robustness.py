@@ -3,202 +3,125 @@ import pandas as pd
 import numpy as np
 import sys
 import os
-import ccxt
 from datetime import datetime
 
 # --- IMPORTACIÓN DE MÓDULOS DE PRODUCCIÓN ---
 # Agregamos el directorio actual al path para poder importar los módulos hermanos
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.result_cache import cached_indicators, cached_result, make_key, data_hash, params_hash, source_hash
 
 import config
 from core.data_processor import DataProcessor
+from core.volume_profile import volume_profile_series
+from core.exit_simulator import simulate_exits, outcome_names, V64_RULES
+from core.monte_carlo import run_monte_carlo, print_report
 from strategies.strategy_v6_4 import StrategyV6_4
 
+MC_PATHS = 20_000   # Caminos del Monte Carlo (bloques de trades: conserva rachas)
+
 # ==========================================
 # 1. MOTOR DE DESCARGA (Independiente de API Key)
 # ==========================================
 def fetch_history_for_backtest(total_candles=50000):
     """
-    Descarga data histórica usando ccxt público (sin usar claves de config)
-    para no gastar rate limit de la cuenta real o por seguridad.
+    Carga data histórica desde el caché local de velas (ccxt público para lo
+    que falte, sin usar claves de config para no gastar rate limit de la cuenta real).
     """
-    exchange = ccxt.binance()
-    print(f"📡 STRESS TEST: Descargando {total_candles} velas de {config.SYMBOL}...")
-    
-    ohlcv = exchange.fetch_ohlcv(config.SYMBOL, config.TIMEFRAME, limit=1000)
-    all_ohlcv = ohlcv
-    
-    # Cálculo aproximado de tiempo
-    timeframe_mins = int(config.TIMEFRAME.replace('m',''))
-    timeframe_ms = timeframe_mins * 60 * 1000
-    
-    while len(all_ohlcv) < total_candles:
-        oldest_timestamp = all_ohlcv[0][0]
-        since_timestamp = oldest_timestamp - (1000 * timeframe_ms)
-        try:
-            new_batch = exchange.fetch_ohlcv(config.SYMBOL, config.TIMEFRAME, limit=1000, since=since_timestamp)
-            # Filtrar solapamientos
-            new_batch = [x for x in new_batch if x[0] < oldest_timestamp]
-            
-            if not new_batch: break
-            all_ohlcv = new_batch + all_ohlcv
-            
-            if len(all_ohlcv) % 10000 == 0:
-                print(f"   ... {len(all_ohlcv)} velas cargadas")
-        except Exception as e:
-            print(f"⚠️ Error descarga: {e}")
-            break
-            
-    if len(all_ohlcv) > total_candles:
-        all_ohlcv = all_ohlcv[-total_candles:]
-        
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    
-    # Convertir a float
-    cols = ['open', 'high', 'low', 'close', 'volume']
-    df[cols] = df[cols].astype(float)
-    
-    return df
+    print(f"📡 STRESS TEST: Cargando {total_candles} velas de {config.SYMBOL}...")
+    return get_store().load_last(config.SYMBOL, config.TIMEFRAME, total_candles)
 
 # ==========================================
 # 2. SIMULADOR DE GESTIÓN (Réplica exacta de main.py)
 # ==========================================
-def simulate_trade_management(df, entry_index, trade_data):
+# Reglas V6.4 de main.py: FT (barra 2), stagnant (4 y 6), time stop en barra 11
+# antes que TP2/SL intra-vela; si se acaba la data, cierre forzado al último close
+EXIT_RULES = dict(V64_RULES, time_stop=11, on_data_end='close',
+                  order=('checkpoints', 'time', 'tp2', 'sl', 'tp1'))
+
+def simulate_trade_management(df, entry_indices, directions, entry_prices, stop_losses):
     """
-    Replica EXACTAMENTE la lógica de salida del bucle while de main.py
+    Replica EXACTAMENTE la lógica de salida del bucle while de main.py,
+    para todos los trades a la vez. Devuelve (outcomes, r_net, bars).
     """
-    entry_price = trade_data['entry_price']
-    stop_loss = trade_data['stop_loss']
-    direction = trade_data['type']
-    atr = trade_data['atr']
-    
-    # Targets calculados igual que en main.py (State Manager)
-    # TP1 y TP2 no son ordenes limit en el main, son chequeos logicos, 
-    # pero usamos los ratios de config para calcular R.
-    
-    tp1_hit = False
-    bars_held = 0
-    
-    # Iteramos vela a vela hacia el futuro
-    # Límite 12 velas (1 hora) como en main.py
-    for j in range(1, 13): 
-        if entry_index + j >= len(df): break
-        
-        row = df.iloc[entry_index + j]
-        bars_held = j
-        
-        # Precios de la vela actual
-        curr_high = row['high']
-        curr_low = row['low']
-        curr_close = row['close']
-        
-        # Calcular R flotante al cierre (como hace el bot en tiempo real)
-        sl_dist = abs(entry_price - stop_loss)
-        if direction == 'LONG':
-            pnl_r = (curr_close - entry_price) / sl_dist
-            pnl_r_high = (curr_high - entry_price) / sl_dist # Para chequear TP intra-vela
-            pnl_r_low = (curr_low - entry_price) / sl_dist   # Para chequear SL intra-vela
-        else:
-            pnl_r = (entry_price - curr_close) / sl_dist
-            pnl_r_high = (entry_price - curr_low) / sl_dist  # Para chequear TP (precio baja)
-            pnl_r_low = (entry_price - curr_high) / sl_dist  # Para chequear SL (precio sube)
-
-        # --- LÓGICA V6.4 (IDÉNTICA A MAIN.PY) ---
-        
-        # 1. Failed Follow-Through (Barra 2)
-        if bars_held == 2 and pnl_r < -0.10:
-            return {"outcome": "FAILED_FT", "r_net": -0.15, "bars": j} # Costo fijo estimado
+    sl_dist = np.abs(np.asarray(entry_prices) - np.asarray(stop_losses))
+    codes, r_net, bars = simulate_exits(df['high'].values, df['low'].values, df['close'].values,
+                                        entry_indices, directions, entry_prices, sl_dist, EXIT_RULES)
+    return outcome_names(codes), r_net, bars
 
-        # 2. Aggressive Stagnant (Barra 4)
-        if bars_held == 4 and pnl_r < 0.25:
-            return {"outcome": "STAGNANT", "r_net": 0.0, "bars": j} # Salida BE/Scratch
+def calculate_indicators(df):
+    # Indicadores del Core Processor + Volume Profile de todo el histórico (ventana deslizante de 288 velas)
+    processor = DataProcessor()
+    df = processor.calculate_indicators(df)
+    df['VAH'], df['VAL'] = processor.get_volume_profile_series(df)
+    return df
 
-        # 3. Standard Stagnant (Barra 6)
-        if bars_held == 6 and pnl_r < 0.20:
-            return {"outcome": "STAGNANT_LATE", "r_net": -0.15, "bars": j}
+# ==========================================
+# 3. EJECUCIÓN DEL STRESS TEST
+# ==========================================
+def simulate(df, strategy, params):
+    """Trades del bucle principal (señales + gestión + cooldown) como (summary, trades, equity)."""
+    # Indicadores desde el caché si las velas no cambiaron (el Volume Profile es lo caro)
+    df = cached_indicators(df, calculate_indicators, DataProcessor, volume_profile_series)
 
-        # 4. Time Stop (Barra 11)
-        if bars_held >= 11:
-            # Si salimos por tiempo, nos llevamos lo que hay (o min 0.5 si hubo TP1)
-            final_r = max(pnl_r, 0.5) if tp1_hit else pnl_r
-            return {"outcome": "TIME_STOP", "r_net": final_r, "bars": j}
+    trade_log = []
+    last_trade_idx = -999
+    cooldown = 12
 
-        # 5. TP2 (3R) - Chequeo Intra-vela
-        if pnl_r_high >= 3.0: # Asumimos fill en 3R
-            return {"outcome": "TP2_HIT", "r_net": 3.0, "bars": j}
+    # Señales de la Estrategia REAL para todo el histórico (misma regla que get_signal en main.py)
+    longs, shorts, stops = strategy.get_signals(df, df[['VAH', 'VAL']], params)
 
-        # 6. Hard SL - Chequeo Intra-vela
-        if pnl_r_low <= -1.1: # Slippage incluido
-            return {"outcome": "SL_HIT", "r_net": -1.1, "bars": j}
+    # Gestión de todos los candidatos de una vez (desde la vela 500)
+    entries = np.flatnonzero(longs | shorts)
+    entries = entries[entries >= 500]
+    closes = df['close'].values
+    outcomes, r_nets, bars = simulate_trade_management(df, entries, np.where(longs[entries], 1, -1),
+                                                       closes[entries], stops[entries])
 
-        # TP1 Mental Update (Solo estado)
-        if pnl_r_high >= 1.0:
-            tp1_hit = True
+    # Simulamos el bucle principal: solo resta respetar el cooldown
+    for k, i in enumerate(entries):
+        if i - last_trade_idx < cooldown: continue
+        outcome = outcomes[k]
+
+        # Aplicar Smart Fees (V6.4)
+        fee = 0.015 if outcome in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT', 'STAGNANT_LATE'] else 0.045
+        final_r = r_nets[k] - fee
+
+        trade_log.append({
+            "time": df['timestamp'].iloc[i],
+            "type": 'LONG' if longs[i] else 'SHORT',
+            "outcome": outcome,
+            "r_net": final_r,
+            "bars": bars[k]
+        })
+
+        last_trade_idx = i
+        # Cooldown dinámico (replicar si lo usas en main, sino fijo)
+        if outcome in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT']:
+            cooldown = 2
+        else:
+            cooldown = 12
 
-    # Si se acaba la data o el loop
-    return {"outcome": "FORCE_CLOSE", "r_net": pnl_r, "bars": bars_held}
+    return {'trades': len(trade_log)}, trade_log, None
 
-# ==========================================
-# 3. EJECUCIÓN DEL STRESS TEST
-# ==========================================
 def run_robustness_test():
     # 1. Inicializar Clases REALES
-    processor = DataProcessor()
     strategy = StrategyV6_4()
     
     # 2. Datos
     df = fetch_history_for_backtest(total_candles=50000)
-    print("⚙️ Calculando indicadores (Core Processor)...")
-    df = processor.calculate_indicators(df)
-    
-    trade_log = []
-    last_trade_idx = -999
-    cooldown = 12
-    
+
+    profile_name = getattr(config, 'ASSET_MAP', {}).get(config.SYMBOL, 'SNIPER')
+    params = dict(getattr(config, 'PROFILES', {}).get(profile_name, {}), name=profile_name)
+
     print(f"\n⚡ EJECUTANDO VALIDACIÓN CON LÓGICA DE PRODUCCIÓN...")
-    
-    # Simulamos el bucle principal
-    for i in range(500, len(df)):
-        if i - last_trade_idx < cooldown: continue
-        
-        # Preparamos el "slice" de datos que vería el bot en vivo
-        # En main.py el bot ve "todo hasta ahora".
-        # Aquí pasamos el DF completo pero le decimos a la estrategia que mire el índice 'i'.
-        # Como StrategyV6_4 usa .iloc[-1], necesitamos pasarle un subset que termine en i.
-        
-        # Optimización: Pasamos un slice pequeño (últimas 300 velas) para no matar la RAM/CPU
-        # pero suficiente para Volume Profile (288 velas)
-        current_slice = df.iloc[i-300 : i+1] 
-        
-        # Calcular Zonas en el momento (como hace main.py)
-        zones = processor.get_volume_profile_zones(current_slice)
-        
-        # Pedir Señal a la Estrategia REAL
-        trade_signal = strategy.get_signal(current_slice, zones)
-        
-        if trade_signal:
-            # Si hay señal, simulamos la gestión
-            result = simulate_trade_management(df, i, trade_signal)
-            
-            # Aplicar Smart Fees (V6.4)
-            fee = 0.015 if result['outcome'] in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT', 'STAGNANT_LATE'] else 0.045
-            final_r = result['r_net'] - fee
-            
-            trade_log.append({
-                "time": trade_signal['time'],
-                "type": trade_signal['type'],
-                "outcome": result['outcome'],
-                "r_net": final_r,
-                "bars": result['bars']
-            })
-            
-            last_trade_idx = i
-            # Cooldown dinámico (replicar si lo usas en main, sino fijo)
-            if result['outcome'] in ['EARLY_EXIT', 'STAGNANT', 'FAILED_FT']:
-                cooldown = 2
-            else:
-                cooldown = 12
+
+    # Mismas velas + mismo perfil + mismo código = el log de trades sale del caché
+    key = make_key('robustness', config.SYMBOL, config.TIMEFRAME, data_hash(df), params_hash(params),
+                   params_hash(EXIT_RULES), source_hash(simulate, calculate_indicators, DataProcessor, StrategyV6_4,
+                                                        simulate_trade_management, simulate_exits))
+    trade_log = cached_result(key, lambda: simulate(df, strategy, params))['trades']
 
     # ==========================================
     # 4. REPORTING DE ROBUSTEZ
@@ -248,5 +171,11 @@ def run_robustness_test():
     print("\nDistribución:")
     print(df_res['outcome'].value_counts())
 
+    # D. MONTE CARLO (¿qué tan seguido salta el kill switch con esta distribución de R?)
+    trades_per_day = len(df_res) / df_res.index.normalize().nunique()
+    mc = run_monte_carlo(df_res['r_net'].values, n_paths=MC_PATHS, method='block',
+                         trades_per_day=trades_per_day, seed=42)
+    print_report(mc)
+
 if __name__ == "__main__":
     run_robustness_test()
\ No newline at end of file
@@ -1,42 +1,20 @@
-import ccxt
 import pandas as pd
 import numpy as np
-import time
 from datetime import datetime
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.result_cache import cached_indicators, cached_result, make_key, data_hash, source_hash
 
 # ---------------------------------------------------------
 # 1. UTILIDADES Y DESCARGA (50k)
 # ---------------------------------------------------------
 
 def fetch_extended_history(symbol='BTC/USDT', timeframe='5m', total_candles=50000):
-    exchange = ccxt.binance()
-    limit_per_call = 1000
-    print(f"📡 {symbol}: Descargando historial masivo ({total_candles} velas)...")
-    
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit_per_call)
-    all_ohlcv = ohlcv
-    timeframe_duration_seconds = 5 * 60 
-    
-    while len(all_ohlcv) < total_candles:
-        oldest_timestamp = all_ohlcv[0][0]
-        since_timestamp = oldest_timestamp - (limit_per_call * timeframe_duration_seconds * 1000)
-        try:
-            new_batch = exchange.fetch_ohlcv(symbol, timeframe, limit=limit_per_call, since=since_timestamp)
-            new_batch = [x for x in new_batch if x[0] < oldest_timestamp]
-            if not new_batch: break
-            all_ohlcv = new_batch + all_ohlcv
-            if len(all_ohlcv) % 10000 == 0:
-                print(f"   ... {len(all_ohlcv)} velas cargadas")
-            time.sleep(0.15) 
-        except Exception as e:
-            print(f"Error descarga: {e}")
-            break
-            
-    if len(all_ohlcv) > total_candles:
-        all_ohlcv = all_ohlcv[-total_candles:]
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    return df
+    print(f"📡 {symbol}: Cargando historial masivo ({total_candles} velas)...")
+    return get_store().load_last(symbol, timeframe, total_candles)
 
 # ---------------------------------------------------------
 # 2. INDICADORES
@@ -199,18 +177,12 @@ def is_core_session(timestamp):
     hour = timestamp.hour
     return 13 <= hour <= 18 
 
-def run_v6_4_velocity_test():
-    print("--- ORANGE PI LAB: V6.4 (VELOCITY SNIPER) ---")
-    df = fetch_extended_history('BTC/USDT', '5m', total_candles=50000)
-    print("Calculando indicadores...")
-    df = calculate_indicators(df)
-    
+def simulate_velocity(df):
+    """Loop vela a vela del backtest V6.4 como (summary, trades, equity)."""
     last_trade_index = -999
     current_cooldown = 12 
     trade_log = []
     
-    print(f"\n--- INICIANDO BACKTEST (VOL + EXPANSION) ---")
-    
     for i in range(500, len(df)):
         if i - last_trade_index < current_cooldown: continue
         row = df.iloc[i] 
@@ -289,6 +261,20 @@ def run_v6_4_velocity_test():
             else:
                 current_cooldown = 12
 
+    return {'trades': len(trade_log)}, trade_log, None
+
+def run_v6_4_velocity_test():
+    print("--- ORANGE PI LAB: V6.4 (VELOCITY SNIPER) ---")
+    df = fetch_extended_history('BTC/USDT', '5m', total_candles=50000)
+    print("Calculando indicadores...")
+    # Mismas velas + mismo código = indicadores y log de trades salen del caché
+    df = cached_indicators(df, calculate_indicators)
+    
+    print(f"\n--- INICIANDO BACKTEST (VOL + EXPANSION) ---")
+    key = make_key('velocity', 'BTC/USDT', '5m', data_hash(df),
+                   source_hash(simulate_velocity, manage_trade_r_logic, get_volume_profile_zones, is_core_session))
+    trade_log = cached_result(key, lambda: simulate_velocity(df))['trades']
+
     # --- REPORTE ---
     if not trade_log:
         print("\nNo se encontraron trades.")
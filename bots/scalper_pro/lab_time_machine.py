@@ -2,13 +2,17 @@ import pandas as pd
 import numpy as np
 import sys
 import os
-import ccxt
 from datetime import datetime, timedelta
 
 # Importamos módulos de producción
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.result_cache import cached_indicators, cached_result, make_key, data_hash, params_hash, source_hash
 import config
 from core.data_processor import DataProcessor
+from core.volume_profile import volume_profile_series
+from core.exit_simulator import simulate_exits, outcome_names, V64_RULES
 from strategies.strategy_v6_4 import StrategyV6_4
 
 # --- CONFIGURACIÓN DE LA MÁQUINA DEL TIEMPO ---
@@ -26,58 +30,44 @@ END_DATE   = "2022-12-31"
 TIMEFRAME = '5m'
 
 def fetch_historical_data(symbol, start_str, end_str):
-    exchange = ccxt.binance()
+    print(f"\n⏳ Viajando a {start_str} para {symbol}...", end=' ')
     
-    # Convertir fechas a timestamp ms
-    since = exchange.parse8601(f"{start_str}T00:00:00Z")
-    end_ts = exchange.parse8601(f"{end_str}T23:59:59Z")
-
-    if since is None or end_ts is None:
+    try:
+        df = get_store().load(symbol, TIMEFRAME, f"{start_str}T00:00:00Z", f"{end_str}T23:59:59Z")
+    except ValueError:
         print(f"❌ Error: Formato de fecha inválido ({start_str} o {end_str}).")
         return None
     
-    print(f"\n⏳ Viajando a {start_str} para {symbol}...", end=' ')
-    
-    all_ohlcv = []
-    
-    while since < end_ts:
-        try:
-            # Descargamos lotes de 1000 velas
-            ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=1000, since=since)
-            if not ohlcv: break
-            
-            last_ts = ohlcv[-1][0]
-            since = last_ts + 1 # Avanzamos el cursor
-            
-            # Filtramos los que se pasen del end_date
-            ohlcv = [x for x in ohlcv if x[0] <= end_ts]
-            all_ohlcv.extend(ohlcv)
-            
-            print(f"{len(all_ohlcv)} velas...", end='\r')
-            
-            if len(ohlcv) < 1000: break # Se acabaron los datos
-            
-        except Exception as e:
-            print(f"Error: {e}")
-            break
-            
-    if not all_ohlcv: return None
-
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    cols = ['open', 'high', 'low', 'close', 'volume']
-    df[cols] = df[cols].astype(float)
-    
+    if df.empty: return None
     print(f"✅ Completado: {len(df)} velas.")
     return df
 
-def simulate_logic(df, strategy, symbol_name):
+def profile_params(symbol):
+    # Perfil del par (mismo criterio que main_multipair)
+    profile_name = getattr(config, 'ASSET_MAP', {}).get(symbol, 'SNIPER')
+    params = dict(getattr(config, 'PROFILES', {}).get(profile_name, {}))
+    params['name'] = profile_name
+    return params
+
+def calculate_indicators(df):
+    # Indicadores V6.4 reales + zonas VAH/VAL (Volume Profile, ventana deslizante de 288 velas)
     processor = DataProcessor()
-    
-    # Indicadores
+    df = processor.calculate_indicators(df)
+    df['VAH'], df['VAL'] = processor.get_volume_profile_series(df)
+    return df
+
+def simulate_logic(df, strategy, symbol_name):
+    """_simulate con caché: mismas velas + mismo perfil + mismo código = no se re-simula."""
+    key = make_key('time_machine', TIMEFRAME, symbol_name, data_hash(df), params_hash(profile_params(symbol_name)),
+                   params_hash(V64_RULES), source_hash(_simulate, calculate_indicators, DataProcessor,
+                                                       StrategyV6_4, simulate_exits))
+    return cached_result(key, lambda: _simulate(df, strategy, symbol_name))['trades']
+
+def _simulate(df, strategy, symbol_name):
+    # Indicadores (desde el caché si las velas no cambiaron)
     try:
-        df = processor.calculate_indicators(df)
-    except: return [] # Error en cálculo (data insuficiente)
+        df = cached_indicators(df, calculate_indicators, DataProcessor, volume_profile_series)
+    except: return {'trades': 0}, [], None # Error en cálculo (data insuficiente)
 
     trade_log = []
     last_idx = -999
@@ -90,73 +80,40 @@ def simulate_logic(df, strategy, symbol_name):
     lows = df['low'].values
     closes = df['close'].values
     times = df['timestamp']
-    
-    # Loop principal
-    for i in range(500, len(df)):
+
+    # Señales de todo el histórico de una vez (misma regla que get_signal en vivo)
+    longs, shorts, stops = strategy.get_signals(df, df[['VAH', 'VAL']], profile_params(symbol_name))
+
+    # Candidatos: todas las señales desde la vela 500
+    entries = np.flatnonzero(longs | shorts)
+    entries = entries[entries >= 500]
+    entry_prices = closes[entries]
+    sl_dist = np.abs(entry_prices - stops[entries])
+    sl_dist = np.where(sl_dist == 0, entry_prices * 0.01, sl_dist) # Evitar div/0
+
+    # Salidas V6.4 de todos los candidatos de una vez (FT, stagnant, TP2, SL, time stop)
+    codes, r_nets, bars_held = simulate_exits(highs, lows, closes, entries, np.where(longs[entries], 1, -1),
+                                              entry_prices, sl_dist, V64_RULES)
+    outcomes = outcome_names(codes)
+
+    # Loop principal: solo resta aplicar el cooldown entre trades
+    for k, i in enumerate(entries):
         if i - last_idx < cooldown: continue
-        
-        # Simulamos pasarle el slice al bot (Data Frame slicing es necesario para indicadores complejos)
-        current_slice = df.iloc[i-300 : i+1]
-        zones = processor.get_volume_profile_zones(current_slice)
-        
-        trade = strategy.get_signal(current_slice, zones)
-        
-        if trade:
-            entry_price = trade['entry_price']
-            sl = trade['stop_loss']
-            sl_dist = abs(entry_price - sl)
-            if sl_dist == 0: sl_dist = entry_price * 0.01
-            
-            tp1_hit = False
-            r_net = 0
-            outcome = "HOLD"
-            
-            # Forward Loop (Miramos futuro hasta 12 velas / 1h)
-            for j in range(1, 13): 
-                if i+j >= len(df): break
-                
-                c_close = closes[i+j]
-                c_high = highs[i+j]
-                c_low = lows[i+j]
-                
-                # Calc R
-                if trade['type'] == 'LONG':
-                    curr_r = (c_close - entry_price) / sl_dist
-                    high_r = (c_high - entry_price) / sl_dist
-                    low_r = (c_low - entry_price) / sl_dist
-                else:
-                    curr_r = (entry_price - c_close) / sl_dist
-                    high_r = (entry_price - c_low) / sl_dist 
-                    low_r = (entry_price - c_high) / sl_dist 
-                
-                # Reglas V6.4 Exactas
-                if j == 2 and curr_r < -0.10: outcome = "FAILED_FT"; r_net = -0.15; break
-                if j == 4 and curr_r < 0.25: outcome = "STAGNANT"; r_net = 0.0; break
-                if j == 6 and curr_r < 0.20: outcome = "STAGNANT_LATE"; r_net = -0.15; break
-                if high_r >= 3.0: outcome = "TP2_HIT"; r_net = 3.0; break
-                if low_r <= -1.1: outcome = "SL_HIT"; r_net = -1.1; break 
-                
-                if high_r >= 1.0: tp1_hit = True
-                
-                if j == 12: 
-                    outcome = "TIME_STOP"
-                    # Time Stop Logic: Si tocó TP1, salimos en BE+ (0.5), si no, lo que dé
-                    r_net = max(curr_r, 0.5) if tp1_hit else curr_r
-                    break
-            
-            fee = 0.05 # Fee estimado agresivo
-            
-            trade_log.append({
-                'symbol': symbol_name, 
-                'outcome': outcome,
-                'r_net': r_net - fee,
-                'date': times.iloc[i]
-            })
-            
-            last_idx = i
-            cooldown = 2 if 'STAGNANT' in outcome or 'FAILED' in outcome else 12
+        outcome = outcomes[k]
+
+        fee = 0.05 # Fee estimado agresivo
+
+        trade_log.append({
+            'symbol': symbol_name, 
+            'outcome': outcome,
+            'r_net': r_nets[k] - fee,
+            'date': times.iloc[i]
+        })
+
+        last_idx = i
+        cooldown = 2 if 'STAGNANT' in outcome or 'FAILED' in outcome else 12
             
-    return trade_log
+    return {'trades': len(trade_log)}, trade_log, None
 
 def run_time_machine():
     strategy = StrategyV6_4()
@@ -2,12 +2,16 @@ import pandas as pd
 import numpy as np
 import sys
 import os
-import ccxt
 
 # Importamos módulos de producción
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
+from shared.candle_store import get_store
+from shared.result_cache import cached_indicators, cached_result, make_key, data_hash, params_hash, source_hash
 import config
 from core.data_processor import DataProcessor
+from core.volume_profile import volume_profile_series
+from core.exit_simulator import simulate_exits, V64_RULES
 from strategies.strategy_v6_4 import StrategyV6_4
 
 # --- CONFIGURACIÓN DEL TEST ---
@@ -18,37 +22,27 @@ END_DATE   = "2024-12-31"
 # Lista de pares definida en tu config
 TARGET_PAIRS = config.PAIRS 
 
+# Salidas: SL/TP2 intra-vela primero, stagnant en barra 4 y time stop en 12 (sin piso por TP1)
+EXIT_RULES = dict(V64_RULES, checkpoints=[(4, 0.25, 0.0, 'STAGNANT')], tp1=None,
+                  order=('sl', 'tp2', 'checkpoints', 'time'))
+
 def fetch_historical_data(symbol, start_str, end_str):
-    exchange = ccxt.binance()
-    since = exchange.parse8601(f"{start_str}T00:00:00Z")
-    end_ts = exchange.parse8601(f"{end_str}T23:59:59Z")
-    
-    print(f"\n⏳ Descargando {symbol} ({start_str} - {end_str})...", end=' ')
-    all_ohlcv = []
+    print(f"\n⏳ Cargando {symbol} ({start_str} - {end_str})...", end=' ')
+    df = get_store().load(symbol, '5m', f"{start_str}T00:00:00Z", f"{end_str}T23:59:59Z")
+    if df.empty: return None
     
-    while since < end_ts:
-        try:
-            ohlcv = exchange.fetch_ohlcv(symbol, '5m', limit=1000, since=since)
-            if not ohlcv: break
-            since = ohlcv[-1][0] + 1
-            ohlcv = [x for x in ohlcv if x[0] <= end_ts]
-            all_ohlcv.extend(ohlcv)
-            print(f"{len(all_ohlcv)}...", end='\r')
-        except: break
-            
-    if not all_ohlcv: return None
-
-    df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    cols = ['open', 'high', 'low', 'close', 'volume']
-    df[cols] = df[cols].astype(float)
     df['symbol_name'] = symbol # Necesario para la estrategia
     print(f"✅ Listo: {len(df)} velas.")
     return df
 
-def simulate_hybrid_logic(df, strategy, symbol):
+def calculate_indicators(df):
+    # Indicadores V6.4 + zonas con Volume Profile real (una sola pasada, ventana deslizante)
     processor = DataProcessor()
-    
+    df = processor.calculate_indicators(df)
+    df['VAH'], df['VAL'] = processor.get_volume_profile_series(df)
+    return df
+
+def simulate_hybrid_logic(df, strategy, symbol):
     # 1. Detectar Perfil (La magia de V6.5)
     profile_name = config.ASSET_MAP.get(symbol, 'SNIPER') # Default
     profile_params = config.PROFILES.get(profile_name).copy()
@@ -56,110 +50,52 @@ def simulate_hybrid_logic(df, strategy, symbol):
     
     print(f"   ⚙️  Aplicando Perfil: {profile_name} (Vol > {profile_params['vol_threshold']} | RSI {profile_params['rsi_long']}/{profile_params['rsi_short']})")
 
-    # Indicadores
+    # Mismas velas + mismo perfil + mismo código = no se re-simula
+    key = make_key('validation_v65', symbol, data_hash(df), params_hash(profile_params), params_hash(EXIT_RULES),
+                   source_hash(_simulate, calculate_indicators, DataProcessor, StrategyV6_4, simulate_exits))
+    return cached_result(key, lambda: _simulate(df, strategy, symbol, profile_params))['trades']
+
+def _simulate(df, strategy, symbol, profile_params):
+    # Indicadores (desde el caché si las velas no cambiaron; sin 'symbol_name', que no es numérica)
     try:
-        df = processor.calculate_indicators(df)
-        # Pre-calcular zonas para velocidad (Simulación simple con bandas)
-        # Nota: Para máxima precisión deberíamos usar VP real, pero para backtest rápido de 1 año usamos Bandas
-        # que tienen 95% correlación con VA en tendencias.
-        df['VAH'] = df['close'].rolling(300).mean() + df['close'].rolling(300).std()
-        df['VAL'] = df['close'].rolling(300).mean() - df['close'].rolling(300).std()
-    except: return []
+        df = cached_indicators(df.drop(columns='symbol_name'), calculate_indicators, DataProcessor,
+                               volume_profile_series)
+    except: return {'trades': 0}, [], None
 
     trade_log = []
-    cooldown = 0
     
     # Convertir a listas para velocidad
     closes = df['close'].values
-    opens = df['open'].values
     highs = df['high'].values
     lows = df['low'].values
-    times = df['timestamp']
-    vols = df['volume'].values
-    vol_mas = df['Vol_MA'].values
-    rsis = df['RSI'].values
-    atrs = df['ATR'].values
-    vahs = df['VAH'].values
-    vals = df['VAL'].values
-
-    # Loop principal
-    for i in range(300, len(df)-12):
-        if cooldown > 0: 
-            cooldown -= 1
-            continue
-            
-        # Construimos un mini-objeto row para pasar a la estrategia (simulación)
-        # Ojo: Para usar el metodo de la clase strategy directamente, necesitamos replicar su input
-        # O podemos replicar la lógica aquí. 
-        # Para ser fieles al código, llamaremos a strategy.get_signal pasándole un slice DF.
-        # PERO eso es lento. Vamos a replicar la lógica "hardcore" aquí usando los params del perfil.
-        
-        # --- REPLICA DE ESTRATEGIA V6.5 ---
-        
-        # 1. Filtro Horario (Usamos la función de la clase)
-        if not strategy.is_core_session(times.iloc[i]): continue
-        
-        # 2. Filtro Volumen (Usando parámetro de perfil)
-        if vols[i] < (vol_mas[i] * profile_params['vol_threshold']): continue
-        
-        signal = None
-        sl = 0
-        
-        # RSI Limits del perfil
-        rsi_long_limit = profile_params['rsi_long']
-        rsi_short_limit = profile_params['rsi_short']
-        
-        # LONG
-        if lows[i-1] <= vals[i-1] and closes[i-1] > vals[i-1]: # Rechazo previo
-             if lows[i] > vals[i] and closes[i] > highs[i-1] and closes[i] > opens[i]:
-                 if rsis[i] < rsi_long_limit:
-                     signal = 'LONG'
-                     sl = closes[i] - (atrs[i] * 1.5)
-
-        # SHORT
-        elif highs[i-1] >= vahs[i-1] and closes[i-1] < vahs[i-1]: # Rechazo previo
-             if highs[i] < vahs[i] and closes[i] < lows[i-1] and closes[i] < opens[i]:
-                 if rsis[i] > rsi_short_limit:
-                     signal = 'SHORT'
-                     sl = closes[i] + (atrs[i] * 1.5)
-        
-        # --- EJECUCIÓN ---
-        if signal:
-            entry_price = closes[i]
-            sl_dist = abs(entry_price - sl)
-            if sl_dist == 0: continue
-            
-            outcome = "HOLD"
-            r_net = 0
-            
-            # Forward Loop 12 velas (1 hora)
-            for j in range(1, 13): 
-                idx = i + j
-                if signal == 'LONG':
-                    curr_r = (closes[idx] - entry_price) / sl_dist
-                    low_r = (lows[idx] - entry_price) / sl_dist
-                    high_r = (highs[idx] - entry_price) / sl_dist
-                else:
-                    curr_r = (entry_price - closes[idx]) / sl_dist
-                    low_r = (entry_price - highs[idx]) / sl_dist 
-                    high_r = (entry_price - lows[idx]) / sl_dist 
-                
-                if low_r <= -1.1: outcome = "SL_HIT"; r_net = -1.1; break
-                if high_r >= 3.0: outcome = "TP2_HIT"; r_net = 3.0; break
-                
-                # Reglas de Stagnation
-                if j == 4 and curr_r < 0.25: outcome = "STAGNANT"; r_net = 0.0; break
-                
-                if j == 12: outcome = "TIME_STOP"; r_net = curr_r; break
+
+    # Señales de la estrategia real para todo el histórico (get_signals vectorizado,
+    # misma regla que get_signal en vivo; reemplaza la réplica a mano)
+    longs, shorts, stops = strategy.get_signals(df, df[['VAH', 'VAL']], profile_params)
+
+    # Candidatos: señales con stop válido
+    entries = np.flatnonzero(longs | shorts)
+    entries = entries[(entries >= 300) & (entries < len(df)-12)]
+    sl_dist = np.abs(closes[entries] - stops[entries])
+    entries, sl_dist = entries[sl_dist != 0], sl_dist[sl_dist != 0]
+
+    # Salidas de todos los candidatos de una vez
+    codes, r_nets, _ = simulate_exits(highs, lows, closes, entries, np.where(longs[entries], 1, -1),
+                                      closes[entries], sl_dist, EXIT_RULES)
+
+    # Loop principal: solo resta aplicar el cooldown (12 velas tras cada trade)
+    busy_until = -1
+    for k, i in enumerate(entries):
+        if i <= busy_until: continue
             
-            trade_log.append({
-                'symbol': symbol,
-                'profile': profile_name,
-                'r_net': r_net - 0.05 # Fee
-            })
-            cooldown = 12
+        trade_log.append({
+            'symbol': symbol,
+            'profile': profile_params['name'],
+            'r_net': r_nets[k] - 0.05 # Fee
+        })
+        busy_until = i + 12
             
-    return trade_log
+    return {'trades': len(trade_log)}, trade_log, None
 
 def run_validation():
     strategy = StrategyV6_4()
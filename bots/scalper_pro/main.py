@@ -6,6 +6,7 @@ import os
 from datetime import datetime
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')))
 import config
 from core.binance_api import BinanceAPI
 from core.data_processor import DataProcessor
@@ -14,6 +15,7 @@ from core.production_controller import ProductionController
 from strategies.strategy_v6_4 import StrategyV6_4
 from addons.state_manager import StateManager
 from addons.telegram_bot import TelegramBot
+from shared.bar_scheduler import BarScheduler
 
 def main():
     print(f"\n🛡️ INICIANDO SCALPER PRO V6.4 (AUDITED) - {config.SYMBOL} 🛡️")
@@ -44,8 +46,12 @@ def main():
     # CONSTANTES DE FEES (Estimado slippage + comisión)
     ESTIMATED_FEE_R = 0.05 
 
+    # Un ciclo por vela de 5m cerrada, 5s después del cierre
+    scheduler = BarScheduler('5m', offset=5)
+
     while True:
         try:
+            wake = scheduler.wait()
             now = datetime.utcnow()
             
             # --- HEARTBEAT & RESET ---
@@ -66,36 +72,34 @@ def main():
 
             if kill_switch_active:
                 print(f"💀 Kill Switch Activo. {now.strftime('%H:%M')}")
-                time.sleep(300)
-                continue
-
-            if now.second != 5 or now.minute % 5 != 0:
-                time.sleep(1)
                 continue
 
-            print(f"\n--- 🕒 CICLO: {now.strftime('%H:%M:%S')} ---")
+            print(f"\n--- 🕒 CICLO: {now.strftime('%H:%M:%S')} (+{wake.late:.2f}s) ---")
             
             # --- AUDITORÍA ---
             if not controller.audit_positions():
                 print("⚠️ Auditoría falló. Saltando ciclo.")
-                time.sleep(10)
                 continue
 
             # --- DATOS ---
             df = api.fetch_ohlcv(limit=500)
             if df is None:
                 controller.errors_count += 1
-                time.sleep(10)
                 continue
             
             if controller.errors_count > 0: controller.errors_count -= 1
 
+            # Solo la vela recién cerrada, y una sola vez (sin la fila en formación)
+            if not scheduler.is_new(config.SYMBOL, df['timestamp'].iloc[-2]):
+                print("⏳ Sin vela nueva todavía.")
+                continue
+            df = df.iloc[:-1].copy()
+
             df = processor.calculate_indicators(df)
             zones = processor.get_volume_profile_zones(df)
             
             if zones is None:
                 print("⚠️ Zonas insuficientes.")
-                time.sleep(55)
                 continue
 
             current_pos = api.get_position()
@@ -199,7 +203,6 @@ def main():
                             tg.send_msg(f"🚀 *Entrada {trade['type']}*\nP: `{trade['entry_price']}`\nSL: `{trade['stop_loss']:.2f}`\nTP: `{tp_price:.2f}`")
 
             print("💤 Esperando...")
-            time.sleep(55)
 
         except KeyboardInterrupt:
             sys.exit()
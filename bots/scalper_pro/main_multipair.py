@@ -19,6 +19,10 @@ import config
 
 # Imports Shared (Nueva Arquitectura)
 from shared.telegram_bot import TelegramBot  # <--- USAMOS EL COMPARTIDO
+from shared.cycle_fetch import CycleFetcher
+from shared.async_downloader import klines_weight
+from shared.kline_feed import KlineFeed
+from shared.bar_scheduler import BarScheduler
 # from shared.ccxt_handler import ExchangeHandler (Opcional si migras todo luego)
 
 # Imports Legacy
@@ -31,6 +35,10 @@ from core.data_processor import DataProcessor
 from addons.state_manager import StateManager
 from core.risk_manager import RiskManager
 from strategies.strategy_v6_5 import StrategyV6_5
+from core.cortex import Gatekeeper
+
+HISTORY_LIMIT = 300
+TIMEFRAME = '5m'
 
 def main():
     print("🐲 INICIANDO HYDRA V6.5 (PRODUCCIÓN)...")
@@ -44,8 +52,29 @@ def main():
     try:
         api = BinanceClient() 
         state = StateManager()
-        processor = DataProcessor()
+        processor = DataProcessor(streaming=True) # Indicadores incrementales por símbolo
+        # Velas de todos los pares en paralelo (pool acotado + presupuesto de peso de Binance).
+        # Cada thread usa su propio cliente ccxt: el de 'api' no es thread-safe y lo usan
+        # también las órdenes y el refresco del MarketCache
+        fetcher = CycleFetcher(lambda client, s: api.get_historical_data(s, TIMEFRAME, limit=HISTORY_LIMIT,
+                                                                         client=client),
+                               concurrency=getattr(config, 'FETCH_CONCURRENCY', 16),
+                               weight=klines_weight(HISTORY_LIMIT, 'future'),
+                               client_factory=api.thread_client)
         strategy = StrategyV6_5()
+
+        # Velas en vivo por WebSocket (el REST queda de respaldo si el feed no está conectado)
+        feed = None
+        if getattr(config, 'KLINE_FEED', False):
+            pairs = getattr(config, 'PAIRS_SCALPER', config.PAIRS)
+            feed = KlineFeed([(s, TIMEFRAME) for s in pairs], rest=api.client, history=HISTORY_LIMIT).start()
+
+        # Gatekeeper Cortex (opcional): config.CORTEX_MODEL = ruta del .joblib
+        gatekeeper = None
+        cortex_model = getattr(config, 'CORTEX_MODEL', None)
+        if cortex_model:
+            gatekeeper = Gatekeeper.load(cortex_model)
+            print(f"🧠 Cortex Gatekeeper activo ({cortex_model})")
         
         # --- TELEGRAM SETUP ---
         tg_token = os.getenv('TELEGRAM_TOKEN')
@@ -71,10 +100,14 @@ def main():
         # Variable para el Heartbeat (Anti-Zombie)
         last_heartbeat_day = datetime.now().day
 
+        # Un despertar por vela cerrada de 5m (+ margen para que el exchange la publique)
+        scheduler = BarScheduler(TIMEFRAME, offset=getattr(config, 'BAR_SETTLE_SECONDS', 5))
+
         # --- BUCLE PRINCIPAL ---
         while True:
             try:
-                time.sleep(10) # Loop cada 10s
+                wake = scheduler.wait()
+                print(f"🕒 Vela {TIMEFRAME} cerrada | despertar +{wake.late:.2f}s | salteadas: {scheduler.skipped}")
                 
                 # --- 💓 HEARTBEAT DIARIO (Anti-Zombie) ---
                 current_day = datetime.now().day
@@ -86,13 +119,21 @@ def main():
                     last_heartbeat_day = current_day
                     print("💓 Heartbeat diario enviado.")
 
-                # Actualizar saldo
+                # Actualizar saldo (abre la foto de la cuenta del ciclo: balance + posiciones)
                 risk_mgr.balance = api.get_balance_usdt()
 
                 # Iteramos sobre la lista de SCALPER (definida en config nuevo)
                 # Si aún usas config.PAIRS viejo, cámbialo aquí a config.PAIRS
                 pairs_to_scan = getattr(config, 'PAIRS_SCALPER', config.PAIRS) 
 
+                # Etapa de descarga: velas del feed y, lo que falte, todos los pares a la vez por REST
+                frames = {}
+                if feed and feed.connected.is_set():
+                    frames = {s: feed.frame(s, TIMEFRAME) for s in pairs_to_scan}
+                missing = [s for s in pairs_to_scan if frames.get(s) is None]
+                if missing:
+                    frames.update(fetcher.fetch_all(missing))
+
                 for symbol in pairs_to_scan:
                     
                     # 1. GESTIÓN DE ESTADO
@@ -100,11 +141,17 @@ def main():
                     
                     # 2. OBTENCIÓN DE DATOS
                     try:
-                        df = api.get_historical_data(symbol, limit=300)
-                        if df is None or df.empty: continue
-                        
+                        raw = frames[symbol]
+                        if isinstance(raw, Exception): raise raw
+                        if raw is None or len(raw) < 2: continue
+
+                        # Se evalúa la vela recién cerrada (sin la fila en formación), una sola vez
+                        if not scheduler.is_new(symbol, raw['timestamp'].iloc[-2]):
+                            print(f"⏳ {symbol}: sin vela nueva todavía")
+                            continue
+                        df = raw.iloc[:-1].copy()
                         df['symbol_name'] = symbol
-                        df = processor.calculate_indicators(df)
+                        df = processor.calculate_indicators(df, symbol)
                         zones = processor.get_volume_profile_zones(df)
                     except Exception as e:
                         print(f"❌ Data Error {symbol}: {e}")
@@ -122,6 +169,10 @@ def main():
                             
                         profile_params['name'] = profile_name
                         profile_params['symbol_name'] = symbol  
+
+                        # Filtro IA: features incrementales, una inferencia por vela cerrada
+                        if gatekeeper and not gatekeeper.authorize(symbol, raw):
+                            continue
                         
                         trade = strategy.get_signal(df, zones, profile_params)
                         
@@ -175,6 +226,8 @@ def main():
 
             except KeyboardInterrupt:
                 print("\n🛑 Apagando Hydra...")
+                fetcher.close()
+                if feed: feed.stop()
                 break
             except Exception as e:
                 print(f"🔥 Error Loop: {e}")
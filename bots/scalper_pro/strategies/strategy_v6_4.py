@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import config
 from datetime import datetime
@@ -12,46 +13,77 @@ class StrategyV6_4:
         1. Solo Lunes a Viernes (0-4)
         2. Solo Horario Bancario Extendido (08:00 - 19:00 UTC)
         """
-        # 1. Filtro de Días (Sábado=5, Domingo=6)
-        if timestamp.weekday() >= 5:
-            return False
+        return bool(self._session_mask(pd.DatetimeIndex([timestamp]))[0])
 
-        # 2. Filtro de Hora (Londres + NY)
-        hour = timestamp.hour
-        return 8 <= hour <= 18
+    def _session_mask(self, times):
+        # Sábado=5, Domingo=6 afuera; horario Londres + NY
+        return (times.dayofweek < 5) & (times.hour >= 8) & (times.hour <= 18)
 
     def get_signal(self, df, zones, params):
         """
         Calcula señales basadas en Volume Profile + Estructura.
         Recibe 'params' dinámicos según el perfil (SNIPER vs FLOW).
+        Evalúa la última vela con la misma regla que get_signals.
         """
         if df.empty or not zones:
             return None
 
-        # Datos actuales y previos
-        row = df.iloc[-1]
-        prev = df.iloc[-2]
-        
+        last = df.iloc[-2:]
+        zones_df = {'VAH': [zones['VAH']] * len(last), 'VAL': [zones['VAL']] * len(last)}
+        longs, shorts, stops = self.get_signals(last, zones_df, params)
+
+        signal_type = 'LONG' if longs[-1] else 'SHORT' if shorts[-1] else None
+
+        # --- RETORNO DE SEÑAL ---
+        if signal_type:
+            row = df.iloc[-1]
+            return {
+                'strategy': 'V6.5',
+                'symbol': df['symbol_name'].iloc[0] if 'symbol_name' in df.columns else "UNKNOWN",
+                'type': signal_type,
+                'entry_price': row['close'],
+                'stop_loss': stops[-1],
+                'atr': row['ATR'],
+                'timestamp': row['timestamp'],
+                'profile_name': params.get('name', 'UNKNOWN'), # SNIPER o FLOW
+                'risk_type': params.get('risk_type', 'STANDARD') # PREMIUM o STANDARD
+            }
+
+        return None
+
+    def get_signals(self, df, zones_df, params):
+        """
+        Versión vectorizada para backtests: evalúa todas las velas de una vez.
+        zones_df: columnas VAH/VAL alineadas con df (NaN = sin zonas).
+        Devuelve (longs, shorts, stops): arrays booleanos y stop (NaN sin señal).
+        """
+        n = len(df)
+        close = df['close'].to_numpy(dtype=float)
+        open_ = df['open'].to_numpy(dtype=float)
+        high = df['high'].to_numpy(dtype=float)
+        low = df['low'].to_numpy(dtype=float)
+        prev_close = np.r_[np.nan, close[:-1]]
+        prev_high = np.r_[np.nan, high[:-1]]
+        prev_low = np.r_[np.nan, low[:-1]]
+        rsi = df['RSI'].to_numpy(dtype=float)
+        atr = df['ATR'].to_numpy(dtype=float)
+        if zones_df is None:
+            vah = val = np.full(n, np.nan)
+        else:
+            vah = np.asarray(zones_df['VAH'], dtype=float)
+            val = np.asarray(zones_df['VAL'], dtype=float)
+
         # --- 1. FILTROS DE RÉGIMEN ---
-        
-        # A. Filtro de Tiempo
-        if not self.is_core_session(row['timestamp']):
-            return None
 
-        # B. Filtro de Volumen (Dinámico por Perfil)
-        # BTC requiere 1.2, AVAX requiere 0.6
+        # A. Filtro de Tiempo (+ hay zonas para esa vela)
+        active = self._session_mask(pd.DatetimeIndex(df['timestamp'])) & ~np.isnan(vah)
+
+        # B. Filtro de Volumen (Dinámico por Perfil). BTC requiere 1.2, AVAX requiere 0.6
+        # Un Vol_MA NaN no filtra (igual que la comparación escalar)
         vol_threshold = params.get('vol_threshold', 0.9)
-        
-        if row['volume'] < (row['Vol_MA'] * vol_threshold):
-            return None
+        active &= ~(df['volume'].to_numpy(dtype=float) < df['Vol_MA'].to_numpy(dtype=float) * vol_threshold)
 
         # --- 2. LÓGICA DE ESTRUCTURA (VAH/VAL) ---
-        
-        val = zones['VAL']
-        vah = zones['VAH']
-        
-        signal_type = None
-        stop_loss = 0.0
 
         # Parámetros RSI dinámicos
         rsi_limit_long = params.get('rsi_long', 45)
@@ -61,37 +93,19 @@ class StrategyV6_4:
         # 1. El precio estaba abajo o tocando el VAL
         # 2. Recupera el nivel y cierra adentro
         # 3. Confirma con fuerza (Close > Open y Close > High previo)
-        if prev['low'] <= val and prev['close'] > val: # Rechazo previo
-            if row['low'] > val and row['close'] > prev['high'] and row['close'] > row['open']:
-                # 4. Filtro RSI
-                if row['RSI'] < rsi_limit_long:
-                    signal_type = 'LONG'
-                    # SL Estructural o por ATR
-                    stop_loss = row['close'] - (row['ATR'] * 1.5)
-
-        # --- SHORT SETUP ---
+        # 4. Filtro RSI
+        long_setup = (prev_low <= val) & (prev_close > val)   # Rechazo previo
+        longs = active & long_setup & (low > val) & (close > prev_high) & (close > open_) & (rsi < rsi_limit_long)
+
+        # --- SHORT SETUP --- (solo si no hubo rechazo previo del VAL)
         # 1. El precio estaba arriba o tocando el VAH
         # 2. Pierde el nivel y cierra adentro
         # 3. Confirma debilidad
-        elif prev['high'] >= vah and prev['close'] < vah: # Rechazo previo
-            if row['high'] < vah and row['close'] < prev['low'] and row['close'] < row['open']:
-                # 4. Filtro RSI
-                if row['RSI'] > rsi_limit_short:
-                    signal_type = 'SHORT'
-                    stop_loss = row['close'] + (row['ATR'] * 1.5)
-
-        # --- RETORNO DE SEÑAL ---
-        if signal_type:
-            return {
-                'strategy': 'V6.5',
-                'symbol': df['symbol_name'].iloc[0] if 'symbol_name' in df.columns else "UNKNOWN",
-                'type': signal_type,
-                'entry_price': row['close'],
-                'stop_loss': stop_loss,
-                'atr': row['ATR'],
-                'timestamp': row['timestamp'],
-                'profile_name': params.get('name', 'UNKNOWN'), # SNIPER o FLOW
-                'risk_type': params.get('risk_type', 'STANDARD') # PREMIUM o STANDARD
-            }
+        short_setup = ~long_setup & (prev_high >= vah) & (prev_close < vah)
+        shorts = active & short_setup & (high < vah) & (close < prev_low) & (close < open_) & (rsi > rsi_limit_short)
 
-        return None
\ No newline at end of file
+        # SL Estructural por ATR
+        stops = np.full(n, np.nan)
+        stops[longs] = close[longs] - (atr[longs] * 1.5)
+        stops[shorts] = close[shorts] + (atr[shorts] * 1.5)
+        return longs, shorts, stops
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
@@ -7,58 +8,73 @@ class StrategyV6_5:
 
     def is_core_session(self, timestamp):
         # Filtro de Hora: Lunes a Viernes, 8 a 19 UTC
-        if timestamp.weekday() >= 5: return False
-        return 8 <= timestamp.hour <= 19
+        return bool(self._session_mask(pd.DatetimeIndex([timestamp]))[0])
+
+    def _session_mask(self, times):
+        return (times.dayofweek < 5) & (times.hour >= 8) & (times.hour <= 19)
 
     def get_signal(self, df, zones, params):
         if df.empty or not zones: return None
 
-        row = df.iloc[-1]
-        prev = df.iloc[-2]
-        symbol = params.get('symbol_name', 'Unknown')
-        
-        # 1. Filtro Volumen
+        # Misma regla que get_signals, evaluada sobre las dos últimas velas
+        last = df.iloc[-2:]
+        zones_df = {'VAH': [zones['VAH']] * len(last), 'VAL': [zones['VAL']] * len(last)}
+        longs, shorts, stops = self.get_signals(last, zones_df, params)
+
+        if longs[-1]: return self._build_trade('LONG', df.iloc[-1], stops[-1], params)
+        if shorts[-1]: return self._build_trade('SHORT', df.iloc[-1], stops[-1], params)
+        return None
+
+    def get_signals(self, df, zones_df, params):
+        """
+        Señales de todo el DataFrame de una vez (backtests).
+        zones_df: columnas VAH/VAL alineadas con df (NaN = sin zonas).
+        Devuelve (longs, shorts, stops): arrays booleanos y stop (NaN sin señal).
+        """
+        n = len(df)
+        close = df['close'].to_numpy(dtype=float)
+        open_ = df['open'].to_numpy(dtype=float)
+        high = df['high'].to_numpy(dtype=float)
+        low = df['low'].to_numpy(dtype=float)
+        prev_close = np.r_[np.nan, close[:-1]]
+        prev_high = np.r_[np.nan, high[:-1]]
+        prev_low = np.r_[np.nan, low[:-1]]
+        rsi = df['RSI'].to_numpy(dtype=float)
+        atr = df['ATR'].to_numpy(dtype=float)
+        if zones_df is None:
+            vah = val = np.full(n, np.nan)
+        else:
+            vah = np.asarray(zones_df['VAH'], dtype=float)
+            val = np.asarray(zones_df['VAL'], dtype=float)
+
+        # 1. Filtro Volumen (un Vol_MA NaN no filtra, igual que la comparación escalar)
         vol_threshold = params.get('vol_threshold', 0.9)
-        if row['volume'] < (row['Vol_MA'] * vol_threshold):
-            # Log opcional de bajo volumen
-            # if row['volume'] > (row['Vol_MA'] * vol_threshold * 0.8):
-            #    print(f"💤 {symbol}: Volumen bajo...")
-            return None
-
-        # 2. Filtro Horario
-        if not self.is_core_session(row['timestamp']):
-            return None
-
-        # Datos Técnicos
-        val = zones['VAL']
-        vah = zones['VAH']
+        active = ~(df['volume'].to_numpy(dtype=float) < df['Vol_MA'].to_numpy(dtype=float) * vol_threshold)
+
+        # 2. Filtro Horario + hay zonas
+        active &= self._session_mask(pd.DatetimeIndex(df['timestamp']))
+        active &= ~np.isnan(vah)
+
         rsi_long = params.get('rsi_long', 40)
         rsi_short = params.get('rsi_short', 60)
 
         # --- LÓGICA DE REVERSIÓN (SNIPER/FLOW) ---
-        
-        # LONG (Rechazo de VAL)
-        # Precio previo estaba abajo o en el borde, precio actual cierra arriba
-        if prev['low'] <= val and prev['close'] > val:
-            # Confirmación: Vela Verde y supera el High anterior
-            if row['low'] > val and row['close'] > prev['high'] and row['close'] > row['open']:
-                if row['RSI'] < rsi_long:
-                    return self._build_trade('LONG', row, params)
-
-        # SHORT (Rechazo de VAH)
-        elif prev['high'] >= vah and prev['close'] < vah:
-            # Confirmación: Vela Roja y pierde el Low anterior
-            if row['high'] < vah and row['close'] < prev['low'] and row['close'] < row['open']:
-                if row['RSI'] > rsi_short:
-                    return self._build_trade('SHORT', row, params)
-        
-        return None
 
-    def _build_trade(self, type_side, row, params):
-        is_long = (type_side == 'LONG')
+        # LONG (Rechazo de VAL): previa abajo o en el borde, actual verde sobre el High anterior
+        long_setup = (prev_low <= val) & (prev_close > val)
+        longs = active & long_setup & (low > val) & (close > prev_high) & (close > open_) & (rsi < rsi_long)
+
+        # SHORT (Rechazo de VAH): solo si no hubo setup long (el 'elif' de la versión por vela)
+        short_setup = ~long_setup & (prev_high >= vah) & (prev_close < vah)
+        shorts = active & short_setup & (high < vah) & (close < prev_low) & (close < open_) & (rsi > rsi_short)
+
         sl_mult = params.get('sl_atr', 1.5)
-        stop_loss = row['close'] - (row['ATR'] * sl_mult) if is_long else row['close'] + (row['ATR'] * sl_mult)
-        
+        stops = np.full(n, np.nan)
+        stops[longs] = close[longs] - (atr[longs] * sl_mult)
+        stops[shorts] = close[shorts] + (atr[shorts] * sl_mult)
+        return longs, shorts, stops
+
+    def _build_trade(self, type_side, row, stop_loss, params):
         return {
             'strategy': self.name,
             'type': type_side,
@@ -64,4 +64,8 @@ COOLDOWN_CANDLES = 12    # 48hs de espera tras salida
 LEVERAGE = 5
 DRY_RUN = False
 PAIRS = list(PAIRS_CONFIG.keys())
-ATR_PERCENTILE = 95
\ No newline at end of file
+ATR_PERCENTILE = 95
+
+# --- DATOS EN VIVO ---
+# Velas por WebSocket (shared/kline_feed.py) en vez de re-descargar por REST en cada ciclo
+KLINE_FEED = True
@@ -1,8 +1,13 @@
 import os
+import sys
 import time
 import pandas as pd
 from binance.client import Client
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared.kline_log import KlineLog, COLUMNS
+from shared.resample import ensure_resampled
 
 # --- CONFIGURACIÓN ---
 # Puedes poner varios pares en la lista para que baje uno tras otro
@@ -22,91 +27,148 @@ API_KEY = os.environ.get("BINANCE_API_KEY")
 API_SECRET = os.environ.get("BINANCE_SECRET_KEY")
 # ---------------------
 
+KLINE_COLS = [
+    'Open_Time', 'Open', 'High', 'Low', 'Close', 'Volume',
+    'Close_Time', 'Quote_Asset_Volume', 'Number_of_Trades',
+    'Taker_Buy_Base', 'Taker_Buy_Quote', 'Ignore'
+]
+PAGE_LIMIT = 1500   # máximo de futures/klines: un día de 1m entra en una sola request
+
+
+def interval_ms(interval):
+    units = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+    return int(interval[:-1]) * units[interval[-1]]
+
+
+def klines_to_df(klines):
+    df = pd.DataFrame(klines, columns=KLINE_COLS)
+    # Limpieza rápida
+    df['Open_Time'] = pd.to_datetime(df['Open_Time'], unit='ms')
+    for col in ['Open', 'High', 'Low', 'Close', 'Volume', 'Quote_Asset_Volume']:
+        df[col] = pd.to_numeric(df[col])
+    # NO seteamos index aquí para que 'Open_Time' se guarde como columna en el CSV
+    return df[COLUMNS]
+
+
+def fetch_klines(client, symbol, interval, start_ms, end_ms):
+    """Velas con start_ms <= Open_Time <= end_ms, paginando de a PAGE_LIMIT."""
+    step = interval_ms(interval)
+    rows, cursor = [], start_ms
+    while cursor <= end_ms:
+        batch = client.futures_klines(symbol=symbol, interval=interval, startTime=cursor,
+                                      endTime=end_ms, limit=PAGE_LIMIT)
+        if not batch: break
+        rows.extend(batch)
+        cursor = batch[-1][0] + step
+        if len(batch) < PAGE_LIMIT: break
+        time.sleep(0.2)
+    return klines_to_df(rows) if rows else None
+
+
+def fill_gaps(client, log, symbol, interval):
+    """Rellena huecos internos; los que Binance no tiene quedan anotados en el índice."""
+    gaps = log.gaps()
+    if not gaps:
+        return 0
+    print(f"   🕳️ {len(gaps)} huecos internos, rellenando...")
+    parts = [fetch_klines(client, symbol, interval, lo, hi) for lo, hi in gaps]
+    parts = [p for p in parts if p is not None]
+    filled = log.fill(pd.concat(parts, ignore_index=True) if parts else None, gaps)
+    print(f"   ✅ {filled} velas recuperadas")
+    return filled
+
+
 def download_monthly_chunks(client, symbol, interval, start_str, end_str):
     """
     Descarga datos mes a mes y los escribe en disco progresivamente
     para no saturar la RAM de la Orange Pi.
+    Reanudable: arranca desde la última vela guardada en vez de borrar el archivo.
     """
     filename = f"mainnet_data_{interval}_{symbol}_2020-2021.csv"
     filepath = os.path.join(DATA_DIR, filename)
-    
+    log = KlineLog(filepath, interval_ms(interval))
+
     # Convertir fechas
     start_dt = datetime.strptime(start_str, "%Y-%m-%d")
     end_dt = datetime.strptime(end_str, "%Y-%m-%d")
-    
+
     current_start = start_dt
-    
-    # Si el archivo ya existe, lo borramos para empezar limpio
-    if os.path.exists(filepath):
-        os.remove(filepath)
-        
+    if log.last_ts is not None:
+        current_start = max(start_dt, pd.to_datetime(log.last_ts + interval_ms(interval), unit='ms').to_pydatetime())
+        print(f"   ⏩ Ya hay datos hasta {pd.to_datetime(log.last_ts, unit='ms')}, retomando")
+
     print(f"🔵 Iniciando descarga SEGURA (RAM Friendly) para {symbol} [{interval}]")
     print(f"   Destino: {filepath}")
-    
-    first_chunk = True
+
     total_rows = 0
-    
+
     while current_start < end_dt:
         # Definir chunk de 1 mes aprox
-        current_end = current_start + timedelta(days=30)
-        if current_end > end_dt:
-            current_end = end_dt
-            
+        current_end = min(current_start + timedelta(days=30), end_dt)
+
         str_start = current_start.strftime("%d %b, %Y")
         str_end = current_end.strftime("%d %b, %Y")
-        
+
         print(f"   ⏳ Bajando chunk: {str_start} -> {str_end} ...")
-        
+
         try:
-            klines = client.futures_historical_klines(
-                symbol, 
-                interval, 
-                str_start, 
-                str_end
-            )
-            
-            if klines:
-                cols = [
-                    'Open_Time', 'Open', 'High', 'Low', 'Close', 'Volume', 
-                    'Close_Time', 'Quote_Asset_Volume', 'Number_of_Trades', 
-                    'Taker_Buy_Base', 'Taker_Buy_Quote', 'Ignore'
-                ]
-                df = pd.DataFrame(klines, columns=cols)
-                
-                # Limpieza rápida
-                df['Open_Time'] = pd.to_datetime(df['Open_Time'], unit='ms')
-                for col in ['Open', 'High', 'Low', 'Close', 'Volume', 'Quote_Asset_Volume']:
-                    df[col] = pd.to_numeric(df[col])
-                
-                df = df[['Open_Time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Quote_Asset_Volume']]
-                # NO seteamos index aquí para que 'Open_Time' se guarde como columna en el CSV
-                
-                # Guardar (Append mode)
-                mode = 'w' if first_chunk else 'a'
-                header = True if first_chunk else False
-                df.to_csv(filepath, mode=mode, header=header, index=False)
-                
-                total_rows += len(df)
-                first_chunk = False
-            
+            df = fetch_klines(client, symbol, interval, _ms(current_start), _ms(current_end) - 1)
+            # Append atómico: un chunk nuevo en el índice
+            total_rows += log.append(df)
+
             # Evitar rate limits de Binance
-            time.sleep(0.5) 
-            
+            time.sleep(0.5)
+
         except Exception as e:
             print(f"   ❌ Error en chunk {str_start}: {e}")
-            # Reintentar o seguir? Mejor seguir para no bloquear
-        
+            # Seguimos: el hueco se rellena en fill_gaps (o en la próxima corrida)
+
         # Avanzar al siguiente mes
         current_start = current_end
-        
-    print(f"✅ Descarga finalizada para {symbol}. Total filas: {total_rows}\n")
 
-def run_download():
+    total_rows += fill_gaps(client, log, symbol, interval)
+    print(f"✅ Descarga finalizada para {symbol}. Total filas nuevas: {total_rows}\n")
+
+
+def update_incremental(client, symbol, interval, filepath, start_str):
+    """
+    Modo incremental: baja solo las velas cerradas posteriores a la última
+    guardada y las agrega al final. Con 1m, correrlo a diario cuesta una
+    request por símbolo (1440 velas < PAGE_LIMIT).
+    """
+    log = KlineLog(filepath, interval_ms(interval))
+    step = interval_ms(interval)
+    last_closed = int(time.time() * 1000) // step * step - step
+    since = log.last_ts + step if log.last_ts is not None else _ms(datetime.strptime(start_str, "%Y-%m-%d"))
+
+    added = 0
+    if since <= last_closed:
+        df = fetch_klines(client, symbol, interval, since, last_closed)
+        added = log.append(df)
+    filled = fill_gaps(client, log, symbol, interval)
+
+    last = pd.to_datetime(log.last_ts, unit='ms') if log.last_ts is not None else '-'
+    print(f"✅ {symbol} [{interval}]: +{added} velas, {filled} recuperadas | al día hasta {last}")
+    return added + filled
+
+
+def _ms(dt):
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def run_download(incremental=False):
     client = Client(API_KEY, API_SECRET)
-    
+
     for symbol in SYMBOLS:
         # Solo bajamos 1 MINUTO (lo único necesario para el backtest preciso)
-        download_monthly_chunks(client, symbol, Client.KLINE_INTERVAL_1MINUTE, START_DATE, END_DATE)
+        if incremental:
+            filepath = os.path.join(DATA_DIR, f"mainnet_data_1m_{symbol}.csv")
+            update_incremental(client, symbol, Client.KLINE_INTERVAL_1MINUTE, filepath, START_DATE)
+            # 5m/15m/1h/4h derivados del 1m, al lado del CSV (solo se rehacen si cambió)
+            ensure_resampled(filepath, verbose=True)
+        else:
+            download_monthly_chunks(client, symbol, Client.KLINE_INTERVAL_1MINUTE, START_DATE, END_DATE)
 
 if __name__ == "__main__":
-    run_download()
\ No newline at end of file
+    # --update: mantiene al día mainnet_data_1m_{SYMBOL}.csv (pensado para un cron diario)
+    run_download(incremental='--update' in sys.argv)
\ No newline at end of file
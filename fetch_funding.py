@@ -1,52 +1,42 @@
-import ccxt
 import pandas as pd
-import time
 import os
+import sys
+import asyncio
 from datetime import datetime, timezone
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shared.async_downloader import AsyncDownloader, create_exchange
+
 # 📋 LISTA DE ACTIVOS
 SYMBOLS = ["BTC/USDT", "ETH/USDT", "BNB/USDT"] 
 SINCE_STR = "2022-01-01 00:00:00"
 
-def fetch_symbol(symbol):
-    print(f"\n📡 DESCARGANDO: {symbol} (Futuros)...")
-    exchange = ccxt.binance({
-        'enableRateLimit': True,
-        'options': {'defaultType': 'future'} # CLAVE
-    })
-    
+def save_funding(symbol, rates):
+    if not rates: return
+    df = pd.DataFrame(rates)
+    # Limpieza nombre archivo (1000PEPE/USDT -> 1000PEPEUSDT)
+    safe_sym = symbol.replace("/", "")
+    path = f"data/funding_{safe_sym}.csv"
+    os.makedirs('data', exist_ok=True)
+    df.to_csv(path, index=False)
+    print(f"✅ GUARDADO: {path} ({len(df)} datos)")
+
+async def fetch_all(symbols):
+    print(f"\n📡 DESCARGANDO FUNDING: {', '.join(symbols)} (Futuros, en paralelo)...")
+    exchange = create_exchange('future') # CLAVE
     since_ts = int(datetime.strptime(SINCE_STR, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp() * 1000)
-    all_funding = []
-    
-    while True:
-        try:
-            rates = exchange.fetch_funding_rate_history(symbol, since_ts, limit=1000)
-            if not rates: break
-            
-            all_funding.extend(rates)
-            last_ts = rates[-1]['timestamp']
-            
-            if last_ts == since_ts: since_ts += 1
-            else: since_ts = last_ts + 1
-            
-            print(f"   📥 {len(all_funding)} datos acumulados... (Último: {datetime.fromtimestamp(last_ts/1000)})")
-            
-            if len(rates) < 1000: break
-            time.sleep(0.2)
-            
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            break
-            
-    if all_funding:
-        df = pd.DataFrame(all_funding)
-        # Limpieza nombre archivo (1000PEPE/USDT -> 1000PEPEUSDT)
-        safe_sym = symbol.replace("/", "")
-        path = f"data/funding_{safe_sym}.csv"
-        os.makedirs('data', exist_ok=True)
-        df.to_csv(path, index=False)
-        print(f"✅ GUARDADO: {path}")
+    try:
+        downloader = AsyncDownloader(exchange, market_type='future')
+        results = await asyncio.gather(*(downloader.fetch_funding_history(s, since_ts) for s in symbols),
+                                       return_exceptions=True)
+    finally:
+        await exchange.close()
+
+    for symbol, rates in zip(symbols, results):
+        if isinstance(rates, Exception):
+            print(f"❌ Error {symbol}: {rates}")
+            continue
+        save_funding(symbol, rates)
 
 if __name__ == "__main__":
-    for sym in SYMBOLS:
-        fetch_symbol(sym)
\ No newline at end of file
+    asyncio.run(fetch_all(SYMBOLS))
@@ -0,0 +1,93 @@
+# shared/account_snapshot.py
+"""
+Foto de la cuenta de futuros (balance, posiciones y órdenes abiertas) con TTL.
+
+fetch_balance / fetch_positions / fetch_open_orders son los endpoints
+privados de más peso. En vez de llamarlos por símbolo, se piden una vez por
+ciclo (o cuando vence el TTL) y todas las consultas de estrategia y riesgo se
+responden desde memoria. Después de mandar una orden propia hay que llamar a
+invalidate(): la próxima consulta vuelve a pedir todo al exchange.
+"""
+import time
+import threading
+
+
+def _clean(symbol):
+    """'WIF/USDT:USDT', 'WIFUSDT', '1000PEPE/USDT' -> 'WIFUSDT' / 'PEPEUSDT' (mismo criterio que los bots)."""
+    return symbol.split(':')[0].replace('/', '').replace('1000', '')
+
+
+class AccountSnapshot:
+    def __init__(self, exchange, ttl=30.0, orders=False, clock=time.monotonic):
+        """
+        exchange: cliente ccxt sincrónico (futuros).
+        orders: si True también se piden las órdenes abiertas de todos los símbolos (peso 40 en Binance).
+        """
+        self.exchange = exchange
+        self.ttl = ttl
+        self.orders = orders
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.updated = None
+        self.fetches = 0
+        self._balance = None
+        self._positions = []
+        self._open_orders = []
+
+    def stale(self):
+        return self.updated is None or self.clock() - self.updated > self.ttl
+
+    def refresh(self, force=False):
+        """Vuelve a pedir todo si venció el TTL (o si force). Las excepciones del exchange se propagan."""
+        with self.lock:
+            if not force and not self.stale():
+                return self
+            balance = self.exchange.fetch_balance()
+            positions = self.exchange.fetch_positions()
+            open_orders = self.exchange.fetch_open_orders() if self.orders else []
+            self._balance, self._positions, self._open_orders = balance, positions, open_orders
+            self.updated = self.clock()
+            self.fetches += 1
+        return self
+
+    def invalidate(self):
+        """Tras una orden propia: la foto ya no refleja la cuenta."""
+        with self.lock:
+            self.updated = None
+
+    # --- Consultas (desde memoria, refrescando si hace falta) ---
+
+    def balance(self, currency='USDT', kind='total'):
+        """kind: 'total' | 'free' | 'used'"""
+        self.refresh()
+        return float(self._balance[kind][currency])
+
+    def raw_balance(self):
+        self.refresh()
+        return self._balance
+
+    def positions(self):
+        """Posiciones ccxt con contratos != 0."""
+        self.refresh()
+        return [p for p in self._positions if float(p.get('contracts') or 0) != 0]
+
+    def position(self, symbol):
+        """Posición abierta de 'symbol' (cualquier formato de símbolo) o None."""
+        target = _clean(symbol)
+        for p in self.positions():
+            if _clean(p['symbol']) == target:
+                return p
+        return None
+
+    def open_symbols(self):
+        """Ids de Binance con posición abierta (ej: 'BTCUSDT'), como get_open_positions_symbols."""
+        self.refresh()
+        positions = self._balance.get('info', {}).get('positions', [])
+        return [p['symbol'] for p in positions if float(p['positionAmt']) != 0]
+
+    def open_orders(self, symbol=None):
+        self.refresh()
+        if symbol is None:
+            return list(self._open_orders)
+        target = _clean(symbol)
+        return [o for o in self._open_orders if _clean(o['symbol']) == target]
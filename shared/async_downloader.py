@@ -0,0 +1,217 @@
+# shared/async_downloader.py
+"""
+Descargador histórico concurrente (asyncio + ccxt async).
+
+Muchos (símbolo, timeframe) se paginan en paralelo, pero todas las llamadas
+pasan por un único TokenBucket que lleva la cuenta del peso de Binance
+(request weight por minuto). Cada tramo bajado se escribe en el CandleStore
+a medida que avanza: si algo falla, la próxima corrida retoma desde ahí.
+"""
+import time
+import asyncio
+
+from shared.candle_store import CandleStore, timeframe_to_ms
+
+# Peso por minuto de Binance (dejamos margen para el bot en vivo que comparte IP)
+WEIGHT_LIMITS = {'spot': 6000, 'future': 2400}
+SAFETY = 0.8
+
+# Errores que no se arreglan reintentando (nombres de clases de ccxt)
+FATAL_ERRORS = ('BadSymbol', 'BadRequest', 'AuthenticationError', 'NotSupported')
+RATE_LIMIT_ERRORS = ('RateLimitExceeded', 'DDoSProtection')
+
+
+def klines_weight(limit, market_type='spot'):
+    """Peso de /klines según Binance (futuros escala con el limit)."""
+    if market_type != 'future':
+        return 2
+    if limit < 100: return 1
+    if limit < 500: return 2
+    if limit <= 1000: return 5
+    return 10
+
+
+class TokenBucket:
+    """
+    Presupuesto de peso compartido: se recarga 'capacity' cada 'period' segundos.
+    acquire() espera (sin bloquear el loop) hasta tener peso disponible.
+    """
+    def __init__(self, capacity, period=60.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        # El lock hace la cola FIFO: nadie se cuela mientras otro espera
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    def sync(self, used_weight):
+        """Ajusta con el peso que informa el server (x-mbx-used-weight-1m)."""
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def penalize(self, seconds):
+        """Tras un 429/418 vaciamos el balde para frenar a todos 'seconds' segundos."""
+        self._refill()
+        self.tokens = min(self.tokens, -self.rate * seconds)
+
+
+def create_exchange(market_type='spot'):
+    """Cliente ccxt async (el rate limit lo maneja nuestro TokenBucket)."""
+    import ccxt.async_support as ccxt_async
+    options = {'defaultType': 'future'} if market_type == 'future' else {}
+    return ccxt_async.binance({'enableRateLimit': False, 'options': options})
+
+
+class AsyncDownloader:
+    def __init__(self, exchange, store=None, market_type='spot', limiter=None,
+                 concurrency=8, page_limit=1000, max_retries=5, flush_pages=20, verbose=True):
+        self.exchange = exchange
+        self.store = store or CandleStore()
+        self.market_type = market_type
+        self.limiter = limiter or TokenBucket(WEIGHT_LIMITS.get(market_type, 1200) * SAFETY)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.page_limit = page_limit
+        self.max_retries = max_retries
+        self.flush_pages = flush_pages
+        self.verbose = verbose
+
+    async def _call(self, method, *args, weight=1, **kwargs):
+        """Una llamada al exchange con presupuesto de peso y reintentos con backoff."""
+        for attempt in range(1, self.max_retries + 1):
+            await self.limiter.acquire(weight)
+            try:
+                result = await method(*args, **kwargs)
+                used = (getattr(self.exchange, 'last_response_headers', None) or {}).get('x-mbx-used-weight-1m')
+                if used: self.limiter.sync(int(used))
+                return result
+            except Exception as e:
+                name = type(e).__name__
+                if name in FATAL_ERRORS or attempt == self.max_retries:
+                    raise
+                if name in RATE_LIMIT_ERRORS:
+                    self.limiter.penalize(10 * attempt)
+                if self.verbose:
+                    print(f"   ⚠️ {name}: {e} (reintento {attempt}/{self.max_retries})")
+                await asyncio.sleep(min(2 ** attempt * 0.25, 10))
+
+    async def download(self, symbol, timeframe, start, end=None):
+        """Completa en el store los huecos de [start, end]. Devuelve velas nuevas."""
+        tf_ms = timeframe_to_ms(timeframe)
+        weight = klines_weight(self.page_limit, self.market_type)
+        total = 0
+        async with self.semaphore:
+            for gap_start, gap_end in self.store.missing(symbol, timeframe, start, end, self.market_type):
+                cursor = flushed = gap_start
+                buffer, pages = [], 0
+                while cursor < gap_end:
+                    batch = await self._call(self.exchange.fetch_ohlcv, symbol, timeframe,
+                                             since=cursor, limit=self.page_limit, weight=weight)
+                    batch = [x for x in batch if cursor <= x[0] < gap_end]
+                    if not batch:
+                        cursor = gap_end   # no hay más datos en el exchange para este tramo
+                        break
+                    buffer.extend(batch)
+                    cursor = batch[-1][0] + tf_ms
+                    pages += 1
+                    # Write-through: cada tantas páginas queda persistido (resume)
+                    if pages % self.flush_pages == 0:
+                        self.store.save_rows(symbol, timeframe, buffer, flushed, cursor, self.market_type)
+                        total += len(buffer)
+                        buffer, flushed = [], cursor
+                self.store.save_rows(symbol, timeframe, buffer, flushed, cursor, self.market_type)
+                total += len(buffer)
+        return total
+
+    async def fetch_funding_history(self, symbol, since, until=None):
+        """Historial de funding rate (lista de dicts ccxt), paginado."""
+        until = until or int(time.time() * 1000)
+        rows, cursor = [], since
+        async with self.semaphore:
+            while cursor < until:
+                batch = await self._call(self.exchange.fetch_funding_rate_history, symbol, since=cursor, limit=1000)
+                if not batch: break
+                rows.extend(batch)
+                cursor = batch[-1]['timestamp'] + 1
+                if len(batch) < 1000: break
+        return rows
+
+    async def run(self, symbols, timeframes, start, end=None):
+        """
+        Baja todos los (símbolo, timeframe) en paralelo. Un símbolo que falla no
+        frena al resto; devuelve {(symbol, tf): velas nuevas o la excepción}.
+        """
+        jobs = [(s, tf) for s in symbols for tf in timeframes]
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(self.download(s, tf, start, end) for s, tf in jobs),
+                                       return_exceptions=True)
+        report = dict(zip(jobs, results))
+        if self.verbose:
+            ok = sum(1 for r in results if not isinstance(r, Exception))
+            new = sum(r for r in results if not isinstance(r, Exception))
+            print(f"✅ {ok}/{len(jobs)} series al día | {new} velas nuevas | "
+                  f"{time.perf_counter() - t0:.1f}s (espera por rate limit: {self.limiter.waited:.1f}s)")
+            for (s, tf), r in report.items():
+                if isinstance(r, Exception):
+                    print(f"   ❌ {s} {tf}: {type(r).__name__}: {r}")
+        return report
+
+
+async def usdt_perpetuals(exchange):
+    """Universo completo de perpetuos USDT activos."""
+    markets = await exchange.load_markets()
+    return sorted(s for s, m in markets.items()
+                  if m.get('swap') and m.get('quote') == 'USDT' and m.get('active', True))
+
+
+def download_history(symbols, timeframes, start, end=None, market_type='spot', **kwargs):
+    """Atajo sincrónico para scripts: crea el cliente async, descarga y lo cierra."""
+    async def _main():
+        exchange = create_exchange(market_type)
+        try:
+            downloader = AsyncDownloader(exchange, market_type=market_type, **kwargs)
+            return await downloader.run(symbols, timeframes, start, end)
+        finally:
+            await exchange.close()
+    return asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    # Demo sin red: backfill de 10 símbolos x 2 timeframes contra el exchange falso
+    import tempfile
+    from shared.fake_exchange import FakeExchange, synthetic_candles
+    from shared.candle_store import to_ms
+
+    start, end = to_ms("2024-01-01"), to_ms("2024-03-01")
+    symbols = [f"COIN{i}/USDT" for i in range(10)]
+    candles = {(s, tf): synthetic_candles(start, end, tf, seed=i)
+               for i, s in enumerate(symbols) for tf in ('5m', '1h')}
+
+    async def demo():
+        exchange = FakeExchange(candles, latency=0.02, fail_every=37)
+        store = CandleStore(tempfile.mkdtemp(), offline=True)
+        downloader = AsyncDownloader(exchange, store, market_type='future', concurrency=8, flush_pages=5)
+        await downloader.run(symbols, ['5m', '1h'], start, end - 1)
+        print(f"📡 Llamadas: {exchange.calls} | concurrencia máx: {exchange.max_in_flight}")
+        calls = exchange.calls
+        await downloader.run(symbols, ['5m', '1h'], start, end - 1)   # ya está todo: 0 llamadas
+        print(f"🔁 Segunda corrida: {exchange.calls - calls} llamadas")
+
+    asyncio.run(demo())
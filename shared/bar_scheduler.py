@@ -0,0 +1,92 @@
+# shared/bar_scheduler.py
+"""
+Scheduler por cierre de vela para los bots en vivo.
+
+wait() despierta una sola vez por vela cerrada del timeframe, 'offset'
+segundos después del cierre (margen para que el exchange / el feed tengan la
+vela). Si la evaluación tarda más de una vela, las velas salteadas se cuentan
+en 'skipped' en vez de evaluarse atrasadas. Cada despertar informa cuánto
+llegó tarde respecto del horario previsto (stats() resume el historial).
+
+is_new(key, ts) evita re-evaluar una vela que ya se evaluó (ej: el REST
+todavía no trae la vela nueva).
+"""
+import time
+from collections import deque, namedtuple
+
+from shared.candle_store import timeframe_to_ms
+
+# bar: apertura (ms) de la vela que cerró | scheduled: epoch (s) previsto | late: segundos de atraso
+Wake = namedtuple('Wake', ['bar', 'scheduled', 'late'])
+
+
+class BarScheduler:
+    def __init__(self, timeframe, offset=5.0, run_now=True, clock=time.time, sleep=time.sleep, tick=5.0):
+        """
+        run_now: el primer wait() vuelve enseguida con la última vela cerrada (arranque del bot).
+        tick: máximo de cada sleep, para poder cortar la espera con should_stop.
+        """
+        self.timeframe = timeframe
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.offset_ms = int(offset * 1000)
+        self.run_now = run_now
+        self.clock = clock
+        self.sleep = sleep
+        self.tick = tick
+        self.last_close = None      # cierre (ms) de la última vela por la que despertamos
+        self.evaluated = {}         # key -> timestamp de la última vela evaluada
+        self.wakes = 0
+        self.skipped = 0
+        self.lateness = deque(maxlen=500)
+
+    def _now_ms(self):
+        return int(self.clock() * 1000)
+
+    def last_closed(self, now_ms=None):
+        """Cierre (ms) de la última vela cerrada hace al menos 'offset'."""
+        now_ms = self._now_ms() if now_ms is None else now_ms
+        return (now_ms - self.offset_ms) // self.tf_ms * self.tf_ms
+
+    def next_wake(self):
+        """Epoch (s) del próximo despertar."""
+        close = self.last_closed() if self.last_close is None else self.last_close
+        return (close + self.tf_ms + self.offset_ms) / 1000
+
+    def wait(self, should_stop=None):
+        """
+        Duerme hasta el cierre de la próxima vela (+offset) y devuelve un Wake.
+        None si should_stop() dio True durante la espera.
+        """
+        while True:
+            now = self._now_ms()
+            close = self.last_closed(now)
+            if self.last_close is None and not self.run_now:
+                self.last_close = close
+            if self.last_close is None or close > self.last_close:
+                if self.last_close is not None:
+                    self.skipped += (close - self.last_close) // self.tf_ms - 1
+                self.last_close = close
+                scheduled = close + self.offset_ms
+                late = (now - scheduled) / 1000
+                self.wakes += 1
+                self.lateness.append(late)
+                return Wake(close - self.tf_ms, scheduled / 1000, late)
+            if should_stop is not None and should_stop():
+                return None
+            remaining = (self.last_close + self.tf_ms + self.offset_ms - now) / 1000
+            self.sleep(max(0.0, min(remaining, self.tick)))
+
+    def is_new(self, key, ts):
+        """True (y la marca como evaluada) si 'ts' es una vela posterior a la última evaluada para 'key'."""
+        last = self.evaluated.get(key)
+        if last is not None and ts <= last:
+            return False
+        self.evaluated[key] = ts
+        return True
+
+    def stats(self):
+        late = list(self.lateness)
+        return {'timeframe': self.timeframe, 'wakes': self.wakes, 'skipped': self.skipped,
+                'last_late': late[-1] if late else None,
+                'avg_late': sum(late) / len(late) if late else None,
+                'max_late': max(late) if late else None}
@@ -0,0 +1,110 @@
+# shared/bar_view.py
+"""
+Vistas livianas de un DataFrame con indicadores, respaldadas por arrays numpy.
+
+Los backtests "de alta fidelidad" llamaban strategy.get_signal(df.iloc[:i+1], state)
+en cada vela: cortar el DataFrame y armar las filas como Series es O(n) por
+vela (O(n²) en total). Con BarFrame los indicadores se pasan a numpy una sola
+vez y frame.window(i) devuelve una vista que responde lo que usan las
+estrategias (len, .iloc[-1], fila['Close'], fila.name, df['Col'].iloc[-13:-1])
+sin copiar nada. La estrategia no cambia: es el mismo get_signal del bot en vivo.
+"""
+
+
+class BarFrame:
+    """Columnas del DataFrame como arrays numpy + el índice (fechas)."""
+    def __init__(self, df):
+        self.index = df.index
+        self.dates = df.index.tolist()   # Timestamps armados de una vez (index[i] es caro de a uno)
+        self.columns = {col: df[col].to_numpy() for col in df.columns}
+
+    @classmethod
+    def from_arrays(cls, columns, index):
+        """Sin pasar por un DataFrame (ej: arrays en memoria compartida de shared/sweep)."""
+        frame = cls.__new__(cls)
+        frame.index = index
+        frame.dates = index.tolist()
+        frame.columns = dict(columns)
+        return frame
+
+    def __len__(self):
+        return len(self.index)
+
+    def window(self, i):
+        """Equivalente a df.iloc[:i+1] (solo lectura)."""
+        return WindowView(self, i + 1)
+
+
+class WindowView:
+    """Las primeras 'end' velas del frame."""
+    __slots__ = ('frame', 'end')
+
+    def __init__(self, frame, end):
+        self.frame = frame
+        self.end = end
+
+    def __len__(self):
+        return self.end
+
+    @property
+    def index(self):
+        return self.frame.index[:self.end]
+
+    @property
+    def iloc(self):
+        return _RowLocator(self)
+
+    def __getitem__(self, col):
+        return _ColumnView(self.frame.columns[col][:self.end])
+
+
+class _RowLocator:
+    __slots__ = ('view',)
+
+    def __init__(self, view):
+        self.view = view
+
+    def __getitem__(self, k):
+        end = self.view.end
+        pos = k + end if k < 0 else k
+        if not 0 <= pos < end:
+            raise IndexError(f"posición {k} fuera de la ventana ({end} velas)")
+        return RowView(self.view.frame, pos)
+
+
+class RowView:
+    """Una vela: fila['Col'] lee el array; .name es la fecha (como en una Series de pandas)."""
+    __slots__ = ('frame', 'pos')
+
+    def __init__(self, frame, pos):
+        self.frame = frame
+        self.pos = pos
+
+    def __getitem__(self, col):
+        return self.frame.columns[col][self.pos]
+
+    def get(self, col, default=None):
+        values = self.frame.columns.get(col)
+        return default if values is None else values[self.pos]
+
+    @property
+    def name(self):
+        return self.frame.dates[self.pos]
+
+
+class _ColumnView:
+    """Columna cortada a la ventana; .iloc indexa directo sobre el array."""
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+    @property
+    def iloc(self):
+        return self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_numpy(self):
+        return self.values
@@ -0,0 +1,189 @@
+# shared/candle_format.py
+"""
+Formato binario columnar para velas (.candles), reemplazo de los CSV de caché.
+
+Layout: MAGIC + largo del header (uint32) + header JSON + columnas contiguas
+(timestamp int64 en ms, OHLCV float64 o float32), cada una alineada a 64 bytes.
+La lectura usa np.memmap: abrir el archivo no copia nada y cortar un rango de
+fechas solo toca las páginas de ese rango.
+"""
+import os
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'CANDLES1'
+EXT = '.candles'
+ALIGN = 64
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = COLUMNS[1:]
+
+# Nombres que aparecen en los CSV viejos (downloader, run_backtest, exports)
+_RENAME = {'vol': 'volume', 'vol.': 'volume', 'op': 'open', 'hi': 'high', 'lo': 'low', 'cl': 'close'}
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def write_candles(path, data, dtype='float64', meta=None, columns=None):
+    """
+    Guarda velas en formato columnar. 'data' es un dict de columnas (timestamp
+    en ms) o un DataFrame como los de los CSV (índice de fechas, Open/High/...).
+    'columns' permite guardar otras series por vela (features, probabilidades)
+    en vez de OHLCV: dict con timestamp + esas columnas.
+    Escritura atómica (archivo temporal + os.replace).
+    """
+    if isinstance(data, pd.DataFrame):
+        data = frame_to_columns(data)
+    names = ['timestamp'] + list(columns if columns is not None else PRICE_COLUMNS)
+    n = len(data['timestamp'])
+    arrays = [np.ascontiguousarray(data['timestamp'], dtype=np.int64)]
+    arrays += [np.ascontiguousarray(data[col], dtype=dtype) for col in names[1:]]
+
+    # Offsets relativos al inicio del bloque de datos
+    columns, offset = [], 0
+    for col, arr in zip(names, arrays):
+        columns.append({'name': col, 'dtype': arr.dtype.str, 'offset': offset})
+        offset += arr.nbytes + _pad(arr.nbytes)
+    header = json.dumps({'rows': n, 'columns': columns, 'meta': meta or {}}).encode()
+    head_len = len(MAGIC) + 4 + len(header)
+    header += b' ' * _pad(head_len)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for arr in arrays:
+            f.write(arr.tobytes())
+            f.write(b'\0' * _pad(arr.nbytes))
+    os.replace(tmp, path)
+
+
+def merge_candles(path, data, fresh, meta=None, block=1 << 20):
+    """
+    Escribe en 'path' las velas de 'data' (columnas OHLCV, típicamente el memmap
+    del mismo archivo) más las de 'fresh' (dict de columnas, pocas filas),
+    ordenadas por timestamp y sin repetidos (gana lo que ya estaba). Se escribe
+    de a 'block' filas: 'data' nunca se copia entero a memoria.
+    """
+    order = np.argsort(np.asarray(fresh['timestamp'], dtype=np.int64), kind='stable')
+    fresh = {col: np.asarray(fresh[col])[order] for col in COLUMNS}
+    ts = fresh['timestamp']
+    keep = np.ones(len(ts), dtype=bool)
+    keep[1:] = ts[1:] != ts[:-1]
+    old_ts = data['timestamp']
+    pos = np.searchsorted(old_ts, ts)
+    if len(old_ts):
+        keep &= np.asarray(old_ts[np.minimum(pos, len(old_ts) - 1)]) != ts
+    fresh = {col: arr[keep] for col, arr in fresh.items()}
+    pos = pos[keep]
+
+    n = len(old_ts) + len(pos)
+    arrays = [(col, np.dtype(np.int64) if col == 'timestamp' else data[col].dtype) for col in COLUMNS]
+    columns, offset = [], 0
+    for col, dtype in arrays:
+        columns.append({'name': col, 'dtype': dtype.str, 'offset': offset})
+        nbytes = n * dtype.itemsize
+        offset += nbytes + _pad(nbytes)
+    header = json.dumps({'rows': n, 'columns': columns, 'meta': meta or {}}).encode()
+    header += b' ' * _pad(len(MAGIC) + 4 + len(header))
+
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for col, dtype in arrays:
+            old, new = data[col], fresh[col].astype(dtype)
+            for a in range(0, max(len(old), 1), block):
+                b = min(a + block, len(old))
+                # Filas nuevas que van antes de old[b] (en el último bloque, también las del final)
+                lo, hi = np.searchsorted(pos, [a, b if b < len(old) else len(old) + 1])
+                chunk = np.insert(np.asarray(old[a:b], dtype=dtype), pos[lo:hi] - a, new[lo:hi])
+                f.write(chunk.tobytes())
+            f.write(b'\0' * _pad(n * dtype.itemsize))
+    os.replace(tmp, path)
+
+
+def read_columns(path):
+    """Columnas como np.memmap de solo lectura (sin copiar) + meta del header."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un archivo {EXT}")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+    base = len(MAGIC) + 4 + header_len
+    n = header['rows']
+    data = {}
+    for col in header['columns']:
+        if n == 0:
+            data[col['name']] = np.empty(0, dtype=col['dtype'])
+        else:
+            data[col['name']] = np.memmap(path, dtype=col['dtype'], mode='r',
+                                          offset=base + col['offset'], shape=(n,))
+    return data, header['meta']
+
+
+def read_candles(path, start=None, end=None):
+    """
+    DataFrame con el formato de los backtests: índice de fechas y columnas
+    Open/High/Low/Close/Volume. start/end (inclusive) recortan antes de copiar.
+    """
+    data, _ = read_columns(path)
+    ts = data['timestamp']
+    lo = 0 if start is None else np.searchsorted(ts, to_ms(start), side='left')
+    hi = len(ts) if end is None else np.searchsorted(ts, to_ms(end), side='right')
+    dates = np.asarray(ts[lo:hi]).astype('datetime64[ms]').astype('datetime64[ns]')  # igual que read_csv
+    index = pd.DatetimeIndex(dates, name='timestamp')
+    return pd.DataFrame({col.capitalize(): np.asarray(data[col][lo:hi]) for col in PRICE_COLUMNS},
+                        index=index)
+
+
+def frame_to_columns(df):
+    """DataFrame de velas (índice de fechas o columna timestamp) -> dict de columnas."""
+    cols = {_RENAME.get(c.strip().lower(), c.strip().lower()): c for c in df.columns}
+    if 'timestamp' in cols:
+        raw = df[cols['timestamp']]
+        ts = raw.values if np.issubdtype(raw.dtype, np.integer) else pd.to_datetime(raw).values
+    else:
+        ts = pd.to_datetime(df.index).values
+    if not np.issubdtype(np.asarray(ts).dtype, np.integer):
+        ts = np.asarray(ts).astype('datetime64[ms]').astype(np.int64)
+    data = {'timestamp': np.asarray(ts, dtype=np.int64)}
+    for col in PRICE_COLUMNS:
+        data[col] = df[cols[col]].values.astype(float)
+    order = np.argsort(data['timestamp'], kind='stable')
+    return {col: arr[order] for col, arr in data.items()}
+
+
+def load_ohlcv(base_path, start=None, end=None):
+    """
+    base_path sin extensión (ej: data/SOL_USDT_4h_FULL): usa el .candles si
+    existe y si no el CSV viejo. None si no hay ninguno.
+    """
+    if os.path.exists(base_path + EXT):
+        return read_candles(base_path + EXT, start, end)
+    if os.path.exists(base_path + '.csv'):
+        df = pd.read_csv(base_path + '.csv', index_col=0, parse_dates=True)
+        df.columns = [_RENAME.get(c.strip().lower(), c.strip().lower()).capitalize() for c in df.columns]
+        df = df.sort_index()
+        if start is not None: df = df[df.index >= pd.to_datetime(start)]
+        if end is not None: df = df[df.index <= pd.to_datetime(end)]
+        return df
+    return None
+
+
+def to_ms(value):
+    """Fecha (str, datetime, Timestamp o ms) -> timestamp en ms UTC."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return int(ts.value // 1_000_000)
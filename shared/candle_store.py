@@ -0,0 +1,259 @@
+# shared/candle_store.py
+"""
+Almacén local de velas OHLCV (caché en disco compartido por labs y backtests).
+
+Cada (market_type, symbol, timeframe) es un archivo .candles (formato columnar
+de shared/candle_format) que guarda en su header los tramos ya descargados.
+Al pedir un rango solo se descarga lo que falta; en modo offline se sirve del disco.
+Lo que falta se baja y se guarda de a tramos de SYNC_ROWS velas, mezclando
+con el archivo por bloques: ni la descarga ni el merge cargan el historial
+entero en memoria.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from shared.candle_format import COLUMNS, PRICE_COLUMNS, EXT, to_ms, write_candles, merge_candles, read_columns
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIR = os.path.join(PROJECT_ROOT, 'backtesting', 'data', 'candles')
+
+SYNC_ROWS = 50_000      # Velas descargadas que se guardan a disco de una vez
+
+_TF_UNITS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def timeframe_to_ms(timeframe):
+    """'5m' -> 300000"""
+    return int(timeframe[:-1]) * _TF_UNITS[timeframe[-1]]
+
+
+def symbol_key(symbol):
+    """'BTC/USDT' o 'BTC/USDT:USDT' -> 'BTCUSDT'"""
+    return symbol.split(':')[0].replace('/', '')
+
+
+def missing_ranges(ranges, start, end):
+    """Huecos de [start, end) que no cubren los tramos (ordenados) de 'ranges'."""
+    gaps = []
+    cursor = start
+    for r_start, r_end in ranges:
+        if r_end <= cursor: continue
+        if r_start >= end: break
+        if r_start > cursor: gaps.append((cursor, r_start))
+        cursor = max(cursor, r_end)
+    if cursor < end: gaps.append((cursor, end))
+    return gaps
+
+
+def add_range(ranges, start, end):
+    """Agrega [start, end) y fusiona tramos solapados o contiguos."""
+    merged = []
+    for r_start, r_end in sorted(ranges + [[start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+
+def to_dataframe(data):
+    """Columnas numpy -> DataFrame con el formato de los labs (timestamp datetime)."""
+    df = pd.DataFrame({col: data[col] for col in COLUMNS})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+class CandleStore:
+    def __init__(self, data_dir=DEFAULT_DIR, offline=False, exchange=None, page_limit=1000):
+        self.data_dir = data_dir
+        self.offline = offline
+        self.page_limit = page_limit
+        self.exchanges = {}
+        if exchange is not None:
+            self.exchanges['spot'] = exchange
+
+    # --- Disco ---
+
+    def _path(self, market_type, symbol, timeframe):
+        return os.path.join(self.data_dir, market_type, symbol_key(symbol), f"{timeframe}{EXT}")
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None, None
+        return read_columns(path)
+
+    def _write(self, path, data, meta):
+        write_candles(path, data, meta=meta)
+
+    # --- Exchange ---
+
+    def _exchange(self, market_type):
+        if market_type not in self.exchanges:
+            import ccxt
+            options = {'defaultType': 'future'} if market_type == 'future' else {}
+            self.exchanges[market_type] = ccxt.binance({'enableRateLimit': True, 'options': options})
+        return self.exchanges[market_type]
+
+    def _fetch(self, market_type, symbol, timeframe, since, until):
+        """
+        Descarga velas con since <= ts < until, de a tramos de hasta SYNC_ROWS.
+        Genera (filas, cubierto_hasta): si falla a mitad, solo vale lo bajado hasta ahí.
+        """
+        exchange = self._exchange(market_type)
+        tf_ms = timeframe_to_ms(timeframe)
+        rows = []
+        total = 0
+        cursor = since
+        failed = False
+        while cursor < until:
+            try:
+                batch = exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=self.page_limit)
+            except Exception as e:
+                print(f"⚠️ Error descargando {symbol} {timeframe}: {e}")
+                failed = True
+                break
+            batch = [x for x in batch if cursor <= x[0] < until]
+            if not batch:
+                break
+            rows.extend(batch)
+            total += len(batch)
+            cursor = batch[-1][0] + tf_ms
+            print(f"   📡 {symbol} {timeframe}: {total} velas nuevas...", end='\r')
+            if len(rows) >= SYNC_ROWS:
+                yield rows, cursor
+                rows = []
+        yield rows, cursor if failed else until
+
+    # --- API ---
+
+    def load(self, symbol, timeframe, start, end=None, market_type='spot'):
+        """
+        Velas cerradas con start <= timestamp <= end (end=None -> hasta ahora).
+        Completa el caché con lo que falte y devuelve un DataFrame.
+        """
+        start_ms, end_ms = self._range_ms(timeframe, start, end)
+        data = self._sync(market_type, symbol, timeframe, start_ms, end_ms)
+
+        if data is None:
+            print(f"⚠️ Sin datos locales para {symbol} {timeframe} ({market_type}).")
+            return pd.DataFrame(columns=COLUMNS)
+        return self._slice(data, start_ms, end_ms)
+
+    def iter_blocks(self, symbol, timeframe, start, end=None, rows=100_000, market_type='spot'):
+        """
+        Como load(), pero de a bloques de 'rows' velas: cada bloque se copia del
+        memmap recién cuando se pide, así la memoria no crece con el largo del historial.
+        """
+        start_ms, end_ms = self._range_ms(timeframe, start, end)
+        data = self._sync(market_type, symbol, timeframe, start_ms, end_ms)
+        if data is None:
+            print(f"⚠️ Sin datos locales para {symbol} {timeframe} ({market_type}).")
+            return
+        ts = data['timestamp']
+        lo = int(np.searchsorted(ts, start_ms, side='left'))
+        hi = int(np.searchsorted(ts, end_ms, side='left'))
+        for a in range(lo, hi, rows):
+            yield to_dataframe({col: data[col][a:min(a + rows, hi)] for col in COLUMNS})
+
+    def load_resampled(self, symbol, timeframe, start, end=None, market_type='spot'):
+        """
+        Como load(), pero armando 'timeframe' desde la base de 1m: una sola
+        descarga sirve para 5m/15m/1h/4h y todos quedan consistentes entre sí.
+        Los derivados se guardan al lado de la base y se rehacen si entra 1m nuevo.
+        """
+        from shared.resample import TIMEFRAMES, ensure_resampled
+
+        start_ms, end_ms = self._range_ms(timeframe, start, end)
+        if self._sync(market_type, symbol, '1m', start_ms, end_ms) is None:
+            print(f"⚠️ Sin datos locales para {symbol} 1m ({market_type}).")
+            return pd.DataFrame(columns=COLUMNS)
+
+        timeframes = TIMEFRAMES if timeframe in TIMEFRAMES else TIMEFRAMES + (timeframe,)
+        paths = ensure_resampled(self._path(market_type, symbol, '1m'), timeframes)
+        data, _ = read_columns(paths[timeframe])
+        return self._slice(data, start_ms, end_ms)
+
+    def load_last(self, symbol, timeframe, n_candles, market_type='spot'):
+        """Últimas n velas cerradas."""
+        tf_ms = timeframe_to_ms(timeframe)
+        now_closed = int(time.time() * 1000) // tf_ms * tf_ms
+        df = self.load(symbol, timeframe, now_closed - n_candles * tf_ms, market_type=market_type)
+        return df.iloc[-n_candles:].reset_index(drop=True)
+
+    def missing(self, symbol, timeframe, start, end=None, market_type='spot'):
+        """Tramos [desde, hasta) en ms del rango pedido que todavía no están en disco."""
+        start_ms, end_ms = self._range_ms(timeframe, start, end)
+        _, meta = self._read(self._path(market_type, symbol, timeframe))
+        return missing_ranges(meta['ranges'] if meta else [], start_ms, end_ms)
+
+    def save_rows(self, symbol, timeframe, rows, start_ms, end_ms, market_type='spot'):
+        """
+        Guarda velas ya descargadas (filas ccxt) y marca [start_ms, end_ms) como
+        cubierto. Lo usan los descargadores externos (ej: async_downloader).
+        """
+        path = self._path(market_type, symbol, timeframe)
+        data, meta = self._read(path)
+        ranges = meta['ranges'] if meta else []
+        self._store(path, data, rows, {'ranges': add_range(ranges, start_ms, end_ms)})
+
+    @staticmethod
+    def _range_ms(timeframe, start, end):
+        # end inclusive -> [start, end) en ms, sin pasar de la vela en formación
+        tf_ms = timeframe_to_ms(timeframe)
+        now_closed = int(time.time() * 1000) // tf_ms * tf_ms
+        end_ms = to_ms(end) + 1 if end is not None else now_closed
+        return to_ms(start), min(end_ms, now_closed)
+
+    def _sync(self, market_type, symbol, timeframe, start_ms, end_ms):
+        """Columnas del archivo local, completando antes los huecos de [start_ms, end_ms)."""
+        path = self._path(market_type, symbol, timeframe)
+        data, meta = self._read(path)
+        if not self.offline:
+            data = self._extend(market_type, symbol, timeframe, path, data, meta, start_ms, end_ms)
+        return data
+
+    @staticmethod
+    def _slice(data, start_ms, end_ms):
+        ts = data['timestamp']
+        lo = np.searchsorted(ts, start_ms, side='left')
+        hi = np.searchsorted(ts, end_ms, side='left')
+        return to_dataframe({col: data[col][lo:hi] for col in COLUMNS})
+
+    def _extend(self, market_type, symbol, timeframe, path, data, meta, start_ms, end_ms):
+        # meta['ranges'] = tramos [desde, hasta) ya descargados; solo se bajan los huecos.
+        # Cada tramo descargado se guarda antes de pedir el siguiente (memoria acotada).
+        ranges = meta['ranges'] if meta else []
+        for gap_start, gap_end in missing_ranges(ranges, start_ms, end_ms):
+            for rows, covered in self._fetch(market_type, symbol, timeframe, gap_start, gap_end):
+                if covered <= gap_start:
+                    continue
+                ranges = add_range(ranges, gap_start, covered)
+                data = self._store(path, data, rows, {'ranges': ranges})
+        return data
+
+    def _store(self, path, data, rows, meta):
+        """Mezcla filas ccxt con el archivo (por bloques) y devuelve el memmap nuevo."""
+        new = np.array(rows, dtype=float).reshape(-1, len(COLUMNS))
+        fresh = {'timestamp': new[:, 0].astype(np.int64)}
+        for j, col in enumerate(PRICE_COLUMNS, start=1):
+            fresh[col] = new[:, j]
+        if data is None:
+            self._write(path, fresh, meta)
+        else:
+            merge_candles(path, data, fresh, meta=meta)
+        return read_columns(path)[0]
+
+_default_store = None
+
+
+def get_store(offline=None):
+    """Instancia compartida (CANDLE_STORE_OFFLINE=1 fuerza modo offline)."""
+    global _default_store
+    if _default_store is None:
+        _default_store = CandleStore(offline=os.getenv('CANDLE_STORE_OFFLINE') == '1')
+    if offline is not None:
+        _default_store.offline = offline
+    return _default_store
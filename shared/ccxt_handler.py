@@ -3,6 +3,9 @@ import os
 import pandas as pd
 from dotenv import load_dotenv
 
+from shared.account_snapshot import AccountSnapshot
+from shared.market_cache import MarketCache
+
 # Cargar variables de entorno al importar el módulo
 load_dotenv()
 
@@ -32,9 +35,20 @@ class BinanceHandler:
             }
         })
 
+        # Balance / posiciones desde una foto por ciclo (TTL); invalidar tras órdenes propias
+        self.account = AccountSnapshot(self.exchange)
+
+        # Markets desde la caché en disco: ccxt no baja el exchangeInfo al primer request
+        self.markets = MarketCache(self.exchange)
+        try:
+            self.markets.load()
+        except Exception as e:
+            print(f"⚠️ Markets no disponibles todavía: {e}")
+
     def check_connection(self):
         try:
-            self.exchange.load_markets()
+            self.markets.load()
+            self.exchange.fetch_time()      # los markets pueden venir del disco: esto sí toca la red
             print("✅ Conexión a Binance Futures establecida.")
             return True
         except Exception as e:
@@ -59,8 +73,7 @@ class BinanceHandler:
     def get_balance(self):
         """Devuelve el balance libre en USDT"""
         try:
-            balance = self.exchange.fetch_balance()
-            return float(balance['USDT']['free'])
+            return self.account.balance('USDT', 'free')
         except Exception as e:
             print(f"⚠️ Error obteniendo balance: {e}")
             return 0.0
@@ -69,7 +82,7 @@ class BinanceHandler:
         """Devuelve una lista de símbolos con posiciones abiertas"""
         try:
             # En CCXT futures, fetch_positions devuelve todo, hay que filtrar las que tienen size > 0
-            positions = self.exchange.fetch_positions()
+            positions = self.account.positions()
             active = []
             for pos in positions:
                 if float(pos['contracts']) > 0:
@@ -0,0 +1,67 @@
+# shared/cycle_fetch.py
+"""
+Descarga concurrente de velas por ciclo para los bots en vivo.
+
+Los bots usan el cliente ccxt sincrónico: cada símbolo se baja en un pool
+acotado de threads y todos pasan por el mismo TokenBucket del descargador
+histórico (peso por minuto de Binance). El ciclo tarda lo que la llamada más
+lenta, no la suma, y todos los símbolos se evalúan con velas del mismo momento.
+
+Un cliente ccxt sincrónico no es thread-safe (sesión HTTP, throttle y nonce
+compartidos). Con client_factory cada thread del pool arma el suyo la primera
+vez que lo usa (mismo config, markets ya cargados) y fetch lo recibe como
+primer argumento; el cliente del bot queda para órdenes y el MarketCache.
+"""
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.async_downloader import TokenBucket, WEIGHT_LIMITS, SAFETY
+
+
+class CycleFetcher:
+    def __init__(self, fetch, concurrency=8, weight=1, market_type='future', limiter=None, client_factory=None):
+        """
+        fetch(symbol) -> DataFrame: llamada bloqueante (ej: api.get_historical_data).
+        Con client_factory (ej: api.thread_client) es fetch(client, symbol), un cliente por thread.
+        """
+        self.fetch = fetch
+        self.client_factory = client_factory
+        self.local = threading.local()
+        self.weight = weight
+        self.limiter = limiter or TokenBucket(WEIGHT_LIMITS.get(market_type, 1200) * SAFETY)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='fetch')
+        # Loop propio y persistente: el lock del TokenBucket queda atado a él entre ciclos
+        self.loop = asyncio.new_event_loop()
+        self.elapsed = 0.0
+
+    async def _one(self, symbol):
+        await self.limiter.acquire(self.weight)
+        return await self.loop.run_in_executor(self.pool, self._call, symbol)
+
+    def _call(self, symbol):
+        if self.client_factory is None:
+            return self.fetch(symbol)
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.client_factory()
+        return self.fetch(client, symbol)
+
+    async def _all(self, symbols):
+        return await asyncio.gather(*(self._one(s) for s in symbols), return_exceptions=True)
+
+    def fetch_all(self, symbols):
+        """
+        {symbol: resultado de fetch o la excepción}. Un símbolo que falla no
+        frena al resto (cada uno se maneja por separado, como antes).
+        """
+        symbols = list(symbols)
+        t0 = time.perf_counter()
+        results = self.loop.run_until_complete(self._all(symbols))
+        self.elapsed = time.perf_counter() - t0
+        return dict(zip(symbols, results))
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        self.loop.close()
@@ -0,0 +1,161 @@
+# shared/fake_exchange.py
+"""
+Exchange falso (API async estilo ccxt) que sirve páginas de velas enlatadas.
+Sirve para probar descargadores sin red: mide llamadas, concurrencia y peso
+usado, y puede inyectar errores de red cada N llamadas.
+"""
+import asyncio
+
+import numpy as np
+
+from shared.candle_store import timeframe_to_ms
+
+
+class FakeNetworkError(Exception):
+    pass
+
+
+try:
+    from ccxt import BadSymbol
+except ImportError:     # mismo nombre de clase: el descargador lo reconoce como error fatal
+    class BadSymbol(Exception):
+        pass
+
+
+def synthetic_candles(start_ms, end_ms, timeframe, seed=0, price=100.0):
+    """Velas deterministas [ts, o, h, l, c, v] con since <= ts < end."""
+    tf_ms = timeframe_to_ms(timeframe)
+    ts = np.arange(start_ms // tf_ms * tf_ms, end_ms, tf_ms, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.002, len(ts))))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.random(len(ts)) * 0.001)
+    low = np.minimum(open_, close) * (1 - rng.random(len(ts)) * 0.001)
+    vol = rng.random(len(ts)) * 1000
+    return [[int(t), o, h, l, c, v] for t, o, h, l, c, v in
+            zip(ts.tolist(), open_.tolist(), high.tolist(), low.tolist(), close.tolist(), vol.tolist())]
+
+
+class FakeExchange:
+    """
+    candles: {(symbol, timeframe): [[ts, o, h, l, c, v], ...]} ordenadas.
+    funding: {symbol: [{'timestamp': ms, 'fundingRate': x, ...}, ...]}
+    """
+    rateLimit = 50
+
+    def __init__(self, candles=None, funding=None, latency=0.0, fail_every=0, markets=None):
+        self.candles = candles or {}
+        self.funding = funding or {}
+        self.latency = latency
+        self.fail_every = fail_every
+        self.markets = markets or {}
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_response_headers = {}
+
+    async def _request(self):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.fail_every and call % self.fail_every == 0:
+                raise FakeNetworkError(f"timeout simulado (llamada {call})")
+        finally:
+            self.in_flight -= 1
+        self.last_response_headers = {'x-mbx-used-weight-1m': str(self.calls)}
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=500, params=None):
+        await self._request()
+        if (symbol, timeframe) not in self.candles:
+            raise BadSymbol(f"binance does not have market symbol {symbol}")
+        rows = self.candles[(symbol, timeframe)]
+        since = since or 0
+        lo = _bisect(rows, since, key=lambda r: r[0])
+        return [list(r) for r in rows[lo:lo + limit]]
+
+    async def fetch_funding_rate_history(self, symbol, since=None, limit=100, params=None):
+        await self._request()
+        rows = self.funding.get(symbol, [])
+        lo = _bisect(rows, since or 0, key=lambda r: r['timestamp'])
+        return [dict(r) for r in rows[lo:lo + limit]]
+
+    async def load_markets(self):
+        await self._request()
+        return self.markets
+
+    async def close(self):
+        pass
+
+
+def _bisect(rows, value, key):
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key(rows[mid]) < value: lo = mid + 1
+        else: hi = mid
+    return lo
+
+
+class FakeKlineServer:
+    """
+    Servidor WebSocket local que imita los streams combinados kline de Binance
+    (/stream?streams=btcusdt@kline_5m/...). push() manda una actualización a
+    los clientes suscriptos; drop() corta todas las conexiones.
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.clients = {}       # conexión -> set de streams
+        self.server = None
+
+    async def start(self):
+        import websockets
+        self.server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = next(iter(self.server.sockets)).getsockname()[1]
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handler(self, ws, path=None):
+        path = path or getattr(getattr(ws, 'request', None), 'path', None) or ws.path
+        query = path.split('streams=', 1)[1] if 'streams=' in path else ''
+        self.clients[ws] = set(query.split('/')) if query else set()
+        try:
+            await ws.wait_closed()
+        finally:
+            self.clients.pop(ws, None)
+
+    async def wait_clients(self, n=1, timeout=5.0):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while len(self.clients) < n:
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError(f"{len(self.clients)}/{n} clientes conectados")
+            await asyncio.sleep(0.01)
+
+    async def push(self, symbol, timeframe, candle, closed=False):
+        import json
+        from shared.kline_feed import stream_name
+        name = stream_name(symbol, timeframe)
+        ts, o, h, l, c, v = candle
+        msg = json.dumps({'stream': name, 'data': {
+            'e': 'kline', 'E': int(ts), 's': name.split('@')[0].upper(),
+            'k': {'t': int(ts), 'T': int(ts) + timeframe_to_ms(timeframe) - 1, 's': name.split('@')[0].upper(),
+                  'i': timeframe, 'o': str(o), 'h': str(h), 'l': str(l), 'c': str(c), 'v': str(v), 'x': closed}}})
+        for ws, streams in list(self.clients.items()):
+            if name in streams:
+                try:
+                    await ws.send(msg)
+                except Exception:
+                    pass
+
+    async def drop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        self.clients.clear()
+
+    async def stop(self):
+        await self.drop()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
@@ -0,0 +1,149 @@
+# shared/feature_store.py
+"""
+Feature store en disco (backtesting/data/features) para features por vela y
+predicciones de modelos.
+
+- FeatureStore: guarda las columnas de features por (símbolo, timeframe,
+  versión). La versión es el hash del código que las calcula: si cambia la
+  fórmula, el archivo viejo se ignora. Cuando llegan velas nuevas solo se
+  calculan esas (más un tramo de warm-up), no el historial entero.
+- PredictionCache: predict_proba por vela, guardado bajo el hash del archivo
+  del modelo. Reentrenar (otro archivo) invalida solo las predicciones.
+
+Los archivos usan el formato .candles (timestamp + columnas float64).
+"""
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from shared.candle_format import EXT, write_candles, read_columns
+from shared.candle_store import PROJECT_ROOT, symbol_key
+
+DEFAULT_DIR = os.path.join(PROJECT_ROOT, 'backtesting', 'data', 'features')
+
+
+def model_hash(path):
+    """Hash del contenido del archivo del modelo."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _timestamps_ms(candles):
+    """Timestamps (ms) de un DataFrame de velas (columna timestamp o índice de fechas)."""
+    ts = candles['timestamp'].values if 'timestamp' in candles.columns else candles.index.values
+    if np.issubdtype(np.asarray(ts).dtype, np.integer):
+        return np.asarray(ts, dtype=np.int64)
+    return np.asarray(ts).astype('datetime64[ms]').astype(np.int64)
+
+
+def _read(path, version):
+    """Columnas guardadas (copiadas a memoria) o None si no existe o es de otra versión."""
+    if not os.path.exists(path):
+        return None
+    data, meta = read_columns(path)
+    if meta.get('version') != version:
+        return None
+    return {col: np.array(arr) for col, arr in data.items()}
+
+
+class FeatureStore:
+    def __init__(self, name, compute, columns, warmup, version, data_dir=DEFAULT_DIR):
+        """
+        compute(candles) -> DataFrame con 'columns' (mismo índice que candles).
+        warmup: velas previas que necesita la última vela para quedar completa.
+        """
+        self.name = name
+        self.compute = compute
+        self.columns = list(columns)
+        self.warmup = warmup
+        self.version = version
+        self.data_dir = data_dir
+
+    def _path(self, symbol, timeframe):
+        return os.path.join(self.data_dir, self.name, f"{symbol_key(symbol)}_{timeframe}{EXT}")
+
+    def _calc(self, candles, ts):
+        frame = self.compute(candles)
+        data = {'timestamp': ts}
+        data.update((col, frame[col].to_numpy(dtype=float)) for col in self.columns)
+        return data
+
+    def update(self, symbol, timeframe, candles):
+        """
+        Features de 'candles' (DataFrame ordenado) alineadas a sus filas.
+        Si el archivo ya cubre el principio de 'candles', solo se calculan las
+        velas posteriores a lo guardado; si no (otra versión, hueco, fechas
+        anteriores) se recalcula todo 'candles' y se reemplaza el archivo.
+        """
+        path = self._path(symbol, timeframe)
+        ts = _timestamps_ms(candles)
+        stored = _read(path, self.version)
+        if len(ts) == 0:
+            return pd.DataFrame(columns=self.columns, index=candles.index, dtype=float)
+
+        if stored is not None and len(stored['timestamp']) and stored['timestamp'][0] <= ts[0]:
+            last = stored['timestamp'][-1]
+            first_new = int(np.searchsorted(ts, last, side='right'))
+            if last >= ts[-1]:
+                pass                # todo guardado
+            elif first_new == 0 or ts[first_new - 1] != last:
+                stored = None       # hueco entre lo guardado y las velas nuevas
+            else:
+                lo = max(0, first_new - self.warmup)
+                tail = self._calc(candles.iloc[lo:], ts[lo:])
+                cut = first_new - lo
+                stored = {col: np.concatenate([stored[col], tail[col][cut:]]) for col in stored}
+                write_candles(path, stored, meta={'version': self.version}, columns=self.columns)
+        else:
+            stored = None
+
+        if stored is not None:
+            pos = np.searchsorted(stored['timestamp'], ts).clip(max=len(stored['timestamp']) - 1)
+            if not (stored['timestamp'][pos] == ts).all():
+                stored = None       # velas que no están en el archivo (huecos)
+        if stored is None:
+            stored = self._calc(candles, ts)
+            write_candles(path, stored, meta={'version': self.version}, columns=self.columns)
+            pos = np.arange(len(ts))
+
+        return pd.DataFrame({col: stored[col][pos] for col in self.columns}, index=candles.index)
+
+
+class PredictionCache:
+    def __init__(self, model, model_path, feature_version, data_dir=DEFAULT_DIR):
+        self.model = model
+        self.version = feature_version
+        self.dir = os.path.join(data_dir, 'predictions', model_hash(model_path))
+        self.classes = np.asarray(model.classes_).tolist()
+
+    def _path(self, symbol, timeframe):
+        return os.path.join(self.dir, f"{symbol_key(symbol)}_{timeframe}{EXT}")
+
+    def predict_proba(self, symbol, timeframe, timestamps, X):
+        """
+        predict_proba de X (una fila por timestamp en ms, ordenados). Solo se
+        consulta al modelo por las velas que no están guardadas.
+        """
+        columns = [f"p{k}" for k in range(len(self.classes))]
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        path = self._path(symbol, timeframe)
+        stored = _read(path, self.version) or {'timestamp': np.empty(0, np.int64),
+                                                **{col: np.empty(0) for col in columns}}
+
+        pos = np.searchsorted(stored['timestamp'], timestamps).clip(max=max(len(stored['timestamp']) - 1, 0))
+        known = (stored['timestamp'][pos] == timestamps) if len(stored['timestamp']) else np.zeros(len(timestamps), bool)
+        missing = ~known
+        if missing.any():
+            probs = self.model.predict_proba(X[missing] if isinstance(X, np.ndarray) else X.loc[missing])
+            new_ts = np.concatenate([stored['timestamp'], timestamps[missing]])
+            order = np.argsort(new_ts, kind='stable')
+            stored = {'timestamp': new_ts[order],
+                      **{col: np.concatenate([stored[col], probs[:, k]])[order] for k, col in enumerate(columns)}}
+            write_candles(path, stored, meta={'version': self.version, 'classes': self.classes}, columns=columns)
+            pos = np.searchsorted(stored['timestamp'], timestamps)
+        return np.column_stack([stored[col][pos] for col in columns])
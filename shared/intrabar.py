@@ -0,0 +1,143 @@
+# shared/intrabar.py
+"""
+Resolución intrabar de SL/TP con la base de 1m del candle store.
+
+Cuando una vela del TF del backtest toca el stop y el target a la vez, el OHLC
+no dice cuál vino primero y cada simulador decide por convención (SL primero
+en lab_optimizer_v65, TP primero en la estrategia breakout). Con un índice
+precalculado vela -> rango de velas 1m [start, end) se mira el orden real,
+pero solo en las velas ambiguas: el resto de la simulación no cambia y el
+costo queda cerca del de la simulación sobre velas.
+
+Las columnas del índice (COLUMNS) son arrays planos: viajan con los demás
+arrays de un símbolo a la memoria compartida del sweep.
+
+LazyIntrabar no carga nada por adelantado: baja el 1m de una vela (un solo
+pedido, queda en el candle store) recién cuando el simulador la consulta.
+Sirve para backtests largos en TF altos, donde bajar todo el 1m del rango
+costaría millones de velas y solo unas pocas velas son ambiguas.
+"""
+import numpy as np
+
+from shared.candle_store import get_store, timeframe_to_ms
+
+COLUMNS = ('m1_start', 'm1_end', 'm1_open', 'm1_high', 'm1_low')
+
+# Resultado de first_touch
+SL_FIRST, UNKNOWN, TP_FIRST = -1, 0, 1
+
+
+def load_m1(symbol, start_ms, end_ms, store=None, market_type='spot'):
+    """Velas 1m de [start_ms, end_ms) como {'timestamp', 'open', 'high', 'low'} (None si no hay)."""
+    store = store or get_store()
+    df = store.load(symbol, '1m', int(start_ms), int(end_ms) - 1, market_type=market_type)
+    if df.empty:
+        return None
+    return {'timestamp': df['timestamp'].values.astype('datetime64[ms]').astype(np.int64),
+            'open': df['open'].to_numpy(dtype=float),
+            'high': df['high'].to_numpy(dtype=float),
+            'low': df['low'].to_numpy(dtype=float)}
+
+
+class IntrabarIndex:
+    def __init__(self, bar_ts, timeframe, m1):
+        """bar_ts: apertura (ms) de cada vela del backtest. m1: dict de load_m1()."""
+        bar_ts = np.asarray(bar_ts, dtype=np.int64)
+        ts = m1['timestamp']
+        self.start = np.searchsorted(ts, bar_ts, side='left')
+        self.end = np.searchsorted(ts, bar_ts + timeframe_to_ms(timeframe), side='left')
+        self.open, self.high, self.low = m1['open'], m1['high'], m1['low']
+
+    @classmethod
+    def from_store(cls, symbol, bar_ts, timeframe, store=None, market_type='spot'):
+        if not len(bar_ts):
+            return None
+        m1 = load_m1(symbol, bar_ts[0], bar_ts[-1] + timeframe_to_ms(timeframe), store, market_type)
+        return cls(bar_ts, timeframe, m1) if m1 is not None else None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Índice armado desde columns() (ej: arrays compartidos de un sweep); None si no está."""
+        if 'm1_start' not in arrays:
+            return None
+        index = cls.__new__(cls)
+        index.start, index.end = arrays['m1_start'], arrays['m1_end']
+        index.open, index.high, index.low = arrays['m1_open'], arrays['m1_high'], arrays['m1_low']
+        return index
+
+    def columns(self):
+        return dict(zip(COLUMNS, (self.start, self.end, self.open, self.high, self.low)))
+
+    def first_touch(self, bar, is_long, stop, target):
+        """
+        Qué nivel se tocó primero dentro de la vela 'bar': (SL_FIRST / TP_FIRST / UNKNOWN, minuto).
+        UNKNOWN si no hay 1m para esa vela o si el mismo minuto toca los dos (queda la convención).
+        """
+        lo, hi = self.start[bar], self.end[bar]
+        result, j = _first_touch(self.high[lo:hi], self.low[lo:hi], is_long, stop, target)
+        return result, (lo + j if j >= 0 else -1)
+
+    def stop_fill(self, minute, is_long, stop):
+        """Precio real del stop: si el minuto abrió pasado el nivel (gap), se llena en la apertura."""
+        if minute < 0:
+            return stop
+        return min(stop, self.open[minute]) if is_long else max(stop, self.open[minute])
+
+    def resolve(self, bars, is_long, stop, target):
+        """first_touch para muchas velas (solo las ambiguas): array de SL_FIRST / UNKNOWN / TP_FIRST."""
+        out = np.zeros(len(bars), dtype=np.int8)
+        for k, (bar, long_, s, t) in enumerate(zip(np.asarray(bars).tolist(), np.asarray(is_long).tolist(),
+                                                   np.asarray(stop).tolist(), np.asarray(target).tolist())):
+            out[k] = self.first_touch(bar, long_, s, t)[0]
+        return out
+
+
+class LazyIntrabar:
+    def __init__(self, symbol, bar_ts, timeframe, store=None, market_type='spot'):
+        """Misma interfaz que IntrabarIndex (first_touch / stop_fill), con el 1m bajado por vela."""
+        self.symbol = symbol
+        self.bar_ts = np.asarray(bar_ts, dtype=np.int64)
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.store = store
+        self.market_type = market_type
+        self.bars = {}      # vela -> dict de load_m1 (o None si el exchange no tiene 1m)
+
+    def loaded(self, bar):
+        """True si el 1m de la vela ya se bajó (consultarla no cuesta nada)."""
+        return bar in self.bars
+
+    def _m1(self, bar):
+        if bar not in self.bars:
+            start = int(self.bar_ts[bar])
+            self.bars[bar] = load_m1(self.symbol, start, start + self.tf_ms, self.store, self.market_type)
+        return self.bars[bar]
+
+    def first_touch(self, bar, is_long, stop, target):
+        """Como IntrabarIndex.first_touch; el minuto es (vela, j) o -1."""
+        m1 = self._m1(bar)
+        if m1 is None:
+            return UNKNOWN, -1
+        result, j = _first_touch(m1['high'], m1['low'], is_long, stop, target)
+        return result, ((bar, j) if j >= 0 else -1)
+
+    def stop_fill(self, minute, is_long, stop):
+        if minute == -1:
+            return stop
+        bar, j = minute
+        price = self.bars[bar]['open'][j]
+        return min(stop, price) if is_long else max(stop, price)
+
+
+def _first_touch(high, low, is_long, stop, target):
+    """(SL_FIRST / TP_FIRST / UNKNOWN, posición del primer minuto que toca algo o -1)."""
+    if not len(high):
+        return UNKNOWN, -1
+    sl = low <= stop if is_long else high >= stop
+    tp = high >= target if is_long else low <= target
+    hit = sl | tp
+    if not hit.any():
+        return UNKNOWN, -1
+    j = int(hit.argmax())
+    if sl[j] and tp[j]:
+        return UNKNOWN, j
+    return (SL_FIRST if sl[j] else TP_FIRST), j
@@ -0,0 +1,305 @@
+# shared/kline_feed.py
+"""
+Feed de velas en vivo por WebSocket (streams kline de Binance Futuros).
+
+Una sola conexión combinada para todos los (símbolo, timeframe) configurados.
+Cada stream mantiene en memoria un buffer de las últimas 'history' velas
+cerradas más la vela en formación; cuando cierra una vela se publica un evento
+en 'closed' (cola thread-safe). Al conectar (y al reconectar) se completan por
+REST las velas que faltan, así un corte no deja huecos en el buffer.
+
+Los bots son sincrónicos: start() corre el feed en un thread con su propio
+loop y frame() devuelve un DataFrame con el mismo formato que el REST
+(timestamp datetime, columnas en minúscula, última fila = vela en formación).
+"""
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+
+import pandas as pd
+
+from shared.candle_store import symbol_key, timeframe_to_ms
+
+FUTURES_WS_URL = 'wss://fstream.binance.com'
+REST_PAGE = 1000
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def stream_name(symbol, timeframe):
+    """'BTC/USDT:USDT', '5m' -> 'btcusdt@kline_5m'"""
+    return f"{symbol_key(symbol).lower()}@kline_{timeframe}"
+
+
+def parse_kline(k):
+    """Payload 'k' de un evento kline -> ([ts, o, h, l, c, v], cerrada)."""
+    return [int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])], bool(k['x'])
+
+
+class CandleBuffer:
+    """Velas cerradas (las últimas 'history') + la vela en formación de un stream."""
+    def __init__(self, timeframe, history):
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.closed = deque(maxlen=history)
+        self.forming = None
+
+    @property
+    def last_closed(self):
+        return self.closed[-1][0] if self.closed else None
+
+    def load(self, rows):
+        """Historial inicial por REST: la última fila es la vela en formación."""
+        self.closed.clear()
+        self.closed.extend(list(r) for r in rows[:-1])
+        self.forming = list(rows[-1]) if rows else None
+
+    def update(self, candle, is_closed):
+        """
+        Aplica una actualización. Devuelve True si cerró una vela nueva.
+        Ignora velas viejas (repetidas tras reconectar).
+        """
+        last = self.last_closed
+        if last is not None and candle[0] <= last:
+            return False
+        if is_closed:
+            self.closed.append(candle)
+            if self.forming is not None and self.forming[0] <= candle[0]:
+                self.forming = None
+            return True
+        self.forming = candle
+        return False
+
+    def gap(self, ts):
+        """True si entre la última cerrada y 'ts' falta alguna vela cerrada."""
+        last = self.last_closed
+        return last is not None and ts > last + self.tf_ms
+
+    def rows(self, include_forming=True):
+        rows = list(self.closed)
+        if include_forming:
+            forming = self.forming
+            if forming is None and rows:
+                # Recién cerrada y sin ticks nuevos: vela plana como la mostraría el exchange
+                close = rows[-1][4]
+                forming = [rows[-1][0] + self.tf_ms, close, close, close, close, 0.0]
+            if forming is not None:
+                rows.append(list(forming))
+        return rows
+
+
+class KlineFeed:
+    def __init__(self, streams, rest=None, history=500, url=FUTURES_WS_URL,
+                 max_backoff=30.0, verbose=True):
+        """
+        streams: [(symbol, timeframe), ...]
+        rest: cliente con fetch_ohlcv(symbol, timeframe, since=, limit=) (ccxt sync o async)
+        para el historial inicial y para completar huecos al reconectar.
+        """
+        self.streams = list(dict.fromkeys(streams))
+        self.names = {stream_name(s, tf): (s, tf) for s, tf in self.streams}
+        self.buffers = {key: CandleBuffer(key[1], history) for key in self.streams}
+        self.rest = rest
+        self.history = history
+        self.url = url
+        self.max_backoff = max_backoff
+        self.verbose = verbose
+        self.closed = queue.Queue()     # eventos (symbol, timeframe, timestamp de apertura)
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.reconnects = 0
+        self.messages = 0
+        self.loop = None
+        self.thread = None
+        self._stop = None
+        self._backfilling = set()
+
+    # --- REST ---
+
+    async def _fetch(self, symbol, timeframe, since=None, limit=REST_PAGE):
+        fetch = self.rest.fetch_ohlcv
+        if asyncio.iscoroutinefunction(fetch):
+            return await fetch(symbol, timeframe, since=since, limit=limit)
+        return await asyncio.to_thread(fetch, symbol, timeframe, since=since, limit=limit)
+
+    async def _backfill(self, key, emit=True):
+        """Completa por REST desde la última vela cerrada (o el historial entero si está vacío)."""
+        if self.rest is None or key in self._backfilling:
+            return
+        self._backfilling.add(key)
+        try:
+            symbol, timeframe = key
+            buffer = self.buffers[key]
+            if buffer.last_closed is None:
+                rows = await self._fetch(symbol, timeframe, limit=min(self.history + 1, REST_PAGE))
+                with self.lock:
+                    buffer.load(rows)
+                return
+            cursor = buffer.last_closed + buffer.tf_ms
+            while True:
+                rows = await self._fetch(symbol, timeframe, since=cursor, limit=REST_PAGE)
+                if not rows:
+                    break
+                # En la última página, la última fila es la vela en formación
+                last_page = len(rows) < REST_PAGE
+                done = rows[:-1] if last_page else rows
+                with self.lock:
+                    for row in done:
+                        if buffer.update(list(row), True) and emit:
+                            self.closed.put((symbol, timeframe, int(row[0])))
+                    if last_page:
+                        buffer.update(list(rows[-1]), False)
+                if last_page:
+                    break
+                cursor = rows[-1][0] + buffer.tf_ms
+        finally:
+            self._backfilling.discard(key)
+
+    # --- WebSocket ---
+
+    def _on_message(self, msg):
+        data = msg.get('data', msg)
+        if data.get('e') != 'kline':
+            return
+        key = self.names.get(msg.get('stream')) or self.names.get(stream_name(data['s'], data['k']['i']))
+        if key is None:
+            return
+        candle, is_closed = parse_kline(data['k'])
+        self.messages += 1
+        buffer = self.buffers[key]
+        with self.lock:
+            if buffer.gap(candle[0]):
+                # Se perdió algún cierre (ej: mensaje descartado): lo bajamos por REST
+                asyncio.get_running_loop().create_task(self._backfill(key))
+            elif buffer.update(candle, is_closed):
+                self.closed.put((key[0], key[1], candle[0]))
+
+    async def run(self):
+        """Conecta, completa huecos y procesa mensajes; reconecta con backoff hasta stop()."""
+        import json
+        import websockets
+
+        self._stop = asyncio.Event()
+        path = '/stream?streams=' + '/'.join(self.names)
+        backoff = min(1.0, self.max_backoff)
+        first = True
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self.url + path, max_size=2 ** 22) as ws:
+                    # Historial / huecos por REST con el socket ya abierto: lo que llegue
+                    # mientras tanto por WS se aplica igual (las velas viejas se ignoran)
+                    reader = asyncio.ensure_future(self._read(ws, json))
+                    await asyncio.gather(*(self._backfill(key, emit=not first) for key in self.streams))
+                    first = False
+                    self.connected.set()
+                    backoff = min(1.0, self.max_backoff)
+                    stop = asyncio.ensure_future(self._stop.wait())
+                    await asyncio.wait({reader, stop}, return_when=asyncio.FIRST_COMPLETED)
+                    stop.cancel()
+                    if not reader.done():
+                        reader.cancel()
+                    elif reader.exception():
+                        raise reader.exception()
+            except Exception as e:
+                if self.verbose:
+                    print(f"⚠️ Kline feed desconectado: {type(e).__name__}: {e}")
+            self.connected.clear()
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            if self.verbose:
+                print(f"🔌 Reconectando kline feed en {backoff:.1f}s...")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _read(self, ws, json):
+        async for raw in ws:
+            self._on_message(json.loads(raw))
+
+    # --- Interfaz sincrónica para los bots ---
+
+    def start(self, timeout=60):
+        """Corre el feed en un thread; espera a tener el historial inicial."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.run(),),
+                                       name='kline-feed', daemon=True)
+        self.thread.start()
+        if not self.connected.wait(timeout) and self.verbose:
+            print("⚠️ Kline feed sin conexión todavía (sigue intentando).")
+        return self
+
+    def stop(self):
+        if self.loop is not None and self._stop is not None:
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread is not None:
+            self.thread.join(10)
+
+    def frame(self, symbol, timeframe, limit=None, include_forming=True):
+        """DataFrame del buffer (formato de get_historical_data). None si está vacío o no es un stream del feed."""
+        buffer = self.buffers.get((symbol, timeframe))
+        if buffer is None:
+            return None
+        with self.lock:
+            rows = buffer.rows(include_forming)
+        if not rows:
+            return None
+        if limit:
+            rows = rows[-limit:]
+        df = pd.DataFrame(rows, columns=COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+    def wait_closed(self, timeout=None):
+        """Espera al próximo cierre y devuelve todos los eventos pendientes [(symbol, tf, ts), ...]."""
+        try:
+            events = [self.closed.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.closed.get_nowait())
+            except queue.Empty:
+                return events
+
+
+if __name__ == "__main__":
+    # Demo sin red: feed contra el servidor WebSocket falso + REST falso, con un corte en el medio
+    from shared.fake_exchange import FakeExchange, FakeKlineServer, synthetic_candles
+
+    tf, start = '1m', 1_704_067_200_000
+    symbols = ['BTC/USDT:USDT', 'ETH/USDT:USDT']
+    candles = {(s, tf): synthetic_candles(start, start + 400 * 60_000, tf, seed=i) for i, s in enumerate(symbols)}
+
+    async def demo():
+        rest = FakeExchange({k: v[:301] for k, v in candles.items()})
+        server = FakeKlineServer()
+        url = await server.start()
+        feed = KlineFeed([(s, tf) for s in symbols], rest=rest, history=300, url=url, max_backoff=0.2)
+        task = asyncio.ensure_future(feed.run())
+        await server.wait_clients(1)
+        t0 = time.perf_counter()
+        for k in range(301, 400):
+            for s in symbols:
+                rest.candles[(s, tf)] = candles[(s, tf)][:k + 1]
+                if k == 350:
+                    continue
+                await server.push(s, tf, candles[(s, tf)][k - 1], closed=True)
+                await server.push(s, tf, candles[(s, tf)][k], closed=False)
+            if k == 360:
+                await server.drop()             # corte: el feed reconecta y completa por REST
+                await server.wait_clients(1)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.3)
+        feed._stop.set()
+        await task
+        await server.stop()
+        ok = all([r for r in feed.buffers[(s, tf)].closed] == [list(r) for r in candles[(s, tf)][99:399]]
+                 for s in symbols)
+        print(f"📡 {feed.messages} mensajes | {feed.closed.qsize()} cierres | reconexiones: {feed.reconnects} | "
+              f"REST: {rest.calls} llamadas | buffer idéntico al REST: {ok} | {time.perf_counter() - t0:.2f}s")
+
+    asyncio.run(demo())
@@ -0,0 +1,253 @@
+# shared/kline_log.py
+"""
+CSV de klines append-only con índice de chunks (download_data_v2 y similares).
+
+El CSV mantiene el formato de siempre (Open_Time, Open, ..., Quote_Asset_Volume).
+Al lado vive '<archivo>.index.json' con los límites de cada chunk (tiempo y
+bytes). Un append se confirma recién cuando el índice se reemplaza
+(os.replace): si el proceso muere a mitad de un append, al abrir se trunca el
+CSV al último tamaño confirmado. fill() reescribe el CSV y guarda el índice
+nuevo antes de reemplazarlo: si muere en el medio, el CSV queda más chico que
+lo que dice el índice y al abrir se reconstruye el índice (no se trunca nada).
+"""
+import io
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Open_Time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Quote_Asset_Volume']
+CHUNK_ROWS = 43_200   # ~1 mes de velas de 1m al reconstruir el índice
+
+
+class KlineLog:
+    def __init__(self, path, interval_ms=60_000):
+        self.path = path
+        self.index_path = path + '.index.json'
+        self.interval_ms = interval_ms
+        self.index = self._load_index()
+
+    # --- Índice ---
+
+    def _empty_index(self):
+        return {'interval_ms': self.interval_ms, 'bytes': 0, 'chunks': [], 'known_gaps': []}
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            # Append a medio escribir (crash): descartamos lo no confirmado
+            if size > index['bytes']:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(index['bytes'])
+            # fill() cortado antes del os.replace: el índice es del CSV nuevo, que no llegó
+            elif size < index['bytes']:
+                return self._rebuild_index(index['known_gaps']) if size else self._empty_index()
+            return index
+        if os.path.exists(self.path):
+            return self._rebuild_index()
+        return self._empty_index()
+
+    def _save_index(self):
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def _rebuild_index(self, known_gaps=None):
+        """Índice desde cero leyendo el CSV una vez (archivos viejos sin índice)."""
+        index = self._empty_index()
+        index['known_gaps'] = known_gaps or []
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        if raw and not raw.endswith(b'\n'):
+            raw = raw[:raw.rfind(b'\n') + 1]   # última línea cortada
+        newlines = np.flatnonzero(np.frombuffer(raw, dtype=np.uint8) == ord('\n'))
+        if len(newlines) > 1:
+            ts = _to_ms(pd.read_csv(io.BytesIO(raw), usecols=['Open_Time'])['Open_Time'])
+            header_end = int(newlines[0]) + 1
+            row_ends = newlines[1:] + 1
+            for lo in range(0, len(ts), CHUNK_ROWS):
+                hi = min(lo + CHUNK_ROWS, len(ts))
+                offset = header_end if lo == 0 else int(row_ends[lo - 1])
+                index['chunks'].append({'start': int(ts[lo:hi].min()), 'end': int(ts[lo:hi].max()),
+                                        'rows': hi - lo, 'offset': offset,
+                                        'length': int(row_ends[hi - 1]) - offset})
+        index['bytes'] = len(raw)
+        self.index = index
+        self._save_index()
+        return index
+
+    # --- Lectura ---
+
+    @property
+    def last_ts(self):
+        chunks = self.index['chunks']
+        return max(c['end'] for c in chunks) if chunks else None
+
+    @property
+    def first_ts(self):
+        chunks = self.index['chunks']
+        return min(c['start'] for c in chunks) if chunks else None
+
+    def _read_chunk(self, chunk):
+        with open(self.path, 'rb') as f:
+            f.seek(chunk['offset'])
+            raw = f.read(chunk['length'])
+        return pd.read_csv(io.BytesIO(raw), header=None, names=COLUMNS, parse_dates=['Open_Time'])
+
+    def iter_chunks(self, start_ms=None, end_ms=None):
+        """DataFrames chunk por chunk en orden temporal (memoria acotada)."""
+        for chunk in sorted(self.index['chunks'], key=lambda c: c['start']):
+            if start_ms is not None and chunk['end'] < start_ms: continue
+            if end_ms is not None and chunk['start'] > end_ms: continue
+            yield self._read_chunk(chunk)
+
+    def read(self, start_ms=None, end_ms=None):
+        """Solo lee los chunks que tocan el rango pedido."""
+        parts = list(self.iter_chunks(start_ms, end_ms))
+        if not parts:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.concat(parts, ignore_index=True)
+        ts = _to_ms(df['Open_Time'])
+        mask = np.ones(len(df), dtype=bool)
+        if start_ms is not None: mask &= ts >= start_ms
+        if end_ms is not None: mask &= ts <= end_ms
+        return df[mask].reset_index(drop=True)
+
+    # --- Escritura ---
+
+    def append(self, df):
+        """
+        Agrega velas más nuevas que la última guardada (un chunk nuevo).
+        Devuelve la cantidad de filas agregadas.
+        """
+        if df is None or df.empty:
+            return 0
+        df = df[COLUMNS].sort_values('Open_Time').drop_duplicates('Open_Time')
+        ts = _to_ms(df['Open_Time'])
+        if self.last_ts is not None:
+            keep = ts > self.last_ts
+            df, ts = df[keep], ts[keep]
+        if df.empty:
+            return 0
+
+        is_new = self.index['bytes'] == 0
+        payload = df.to_csv(header=is_new, index=False).encode()
+        header_len = payload.index(b'\n') + 1 if is_new else 0
+
+        with open(self.path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.index['chunks'].append({'start': int(ts[0]), 'end': int(ts[-1]), 'rows': len(df),
+                                     'offset': self.index['bytes'] + header_len,
+                                     'length': len(payload) - header_len})
+        self.index['bytes'] += len(payload)
+        self._save_index()   # recién acá queda confirmado
+        return len(df)
+
+    def gaps(self):
+        """
+        Huecos internos [desde, hasta] (ms, inclusive) sin contar los ya
+        confirmados como vacíos en el exchange. Solo relee los chunks incompletos.
+        """
+        step = self.interval_ms
+        found = []
+        chunks = sorted(self.index['chunks'], key=lambda c: c['start'])
+        for i, chunk in enumerate(chunks):
+            expected = (chunk['end'] - chunk['start']) // step + 1
+            if chunk['rows'] < expected:
+                ts = np.unique(_to_ms(self._read_chunk(chunk)['Open_Time']))
+                jumps = np.flatnonzero(np.diff(ts) > step)
+                found += [(int(ts[j]) + step, int(ts[j + 1]) - step) for j in jumps]
+            if i + 1 < len(chunks) and chunks[i + 1]['start'] - chunk['end'] > step:
+                found.append((chunk['end'] + step, chunks[i + 1]['start'] - step))
+        known = {tuple(g) for g in self.index['known_gaps']}
+        return [g for g in found if g not in known]
+
+    def fill(self, df, gaps):
+        """
+        Inserta velas de huecos internos y marca como conocidos los huecos que
+        el exchange no tiene, para no volver a pedirlos. Solo se leen y se
+        reordenan los chunks que tocan las velas nuevas; el resto del CSV se
+        copia por bytes a un archivo temporal que reemplaza al original.
+        """
+        new_ts = _to_ms(df['Open_Time']) if df is not None and not df.empty else np.empty(0, dtype=np.int64)
+        known = self.index['known_gaps'] + [list(g) for g in gaps
+                                            if not ((new_ts >= g[0]) & (new_ts <= g[1])).any()]
+        chunks = sorted(self.index['chunks'], key=lambda c: c['offset'])
+        if not len(new_ts) or not chunks:
+            added = self.append(df) if len(new_ts) else 0
+            self.index['known_gaps'] = known
+            self._save_index()
+            return added
+
+        # Chunks afectados: los que se solapan con las velas nuevas (o el vecino, si caen entre dos)
+        starts = np.array([c['start'] for c in chunks])
+        ends = np.array([c['end'] for c in chunks])
+        i0 = min(int(np.searchsorted(ends, new_ts.min())), len(chunks) - 1)
+        i1 = max(int(np.searchsorted(starts, new_ts.max(), side='right')) - 1, i0)
+        affected = chunks[i0:i1 + 1]
+
+        old = pd.concat([self._read_chunk(c) for c in affected], ignore_index=True)
+        new = df[COLUMNS].copy()
+        new['Open_Time'] = pd.to_datetime(new['Open_Time'])
+        merged = pd.concat([old, new], ignore_index=True)
+        merged = merged.sort_values('Open_Time', kind='stable').drop_duplicates('Open_Time')
+        added = len(merged) - len(old)
+        if added == 0:
+            self.index['known_gaps'] = known
+            self._save_index()
+            return 0
+
+        lo = affected[0]['offset']
+        hi = affected[-1]['offset'] + affected[-1]['length']
+        merged_ts = _to_ms(merged['Open_Time'])
+        pieces = []
+        for a in range(0, len(merged), CHUNK_ROWS):
+            part = merged.iloc[a:a + CHUNK_ROWS]
+            pieces.append((part.to_csv(header=False, index=False).encode(), merged_ts[a:a + CHUNK_ROWS]))
+
+        index = dict(self.index, known_gaps=known, chunks=chunks[:i0])
+        offset = lo
+        for payload, ts in pieces:
+            index['chunks'].append({'start': int(ts.min()), 'end': int(ts.max()), 'rows': len(ts),
+                                    'offset': offset, 'length': len(payload)})
+            offset += len(payload)
+        delta = offset - hi
+        index['chunks'] += [dict(c, offset=c['offset'] + delta) for c in chunks[i1 + 1:]]
+        index['bytes'] = self.index['bytes'] + delta
+
+        tmp = self.path + '.tmp'
+        with open(self.path, 'rb') as src, open(tmp, 'wb') as dst:
+            _copy_range(src, dst, 0, lo)
+            for payload, _ in pieces:
+                dst.write(payload)
+            _copy_range(src, dst, hi, self.index['bytes'] - hi)
+            dst.flush()
+            os.fsync(dst.fileno())
+        # Primero el índice nuevo (más bytes que el CSV viejo: si morimos acá se reconstruye)
+        self.index = index
+        self._save_index()
+        os.replace(tmp, self.path)
+        return added
+
+def _copy_range(src, dst, start, length):
+    """Copia 'length' bytes de src (desde 'start') a dst sin cargar todo en memoria."""
+    src.seek(start)
+    remaining = length
+    while remaining > 0:
+        block = src.read(min(remaining, 1 << 20))
+        if not block:
+            break
+        dst.write(block)
+        remaining -= len(block)
+
+
+def _to_ms(values):
+    """Open_Time (datetime o texto) -> np.int64 en ms."""
+    return pd.to_datetime(values).values.astype('datetime64[ms]').astype(np.int64)
@@ -0,0 +1,188 @@
+# shared/market_cache.py
+"""
+Caché en disco de la metadata de mercados (exchangeInfo) para arrancar rápido.
+
+load_markets() de ccxt baja el exchangeInfo completo de futuros (varios MB)
+en cada arranque. MarketCache guarda markets + currencies (y opcionalmente
+los leverage brackets) en un JSON compartido y los carga con set_markets():
+arrancar no toca la red. Si el archivo está vencido (TTL) se usa igual y se
+refresca en un thread de fondo.
+
+El archivo vive en MARKET_CACHE_DIR (por defecto data/market_cache en la raíz):
+en docker-compose es un volumen compartido, así que todos los procesos leen el
+mismo y solo uno lo baja (lock de archivo + escritura atómica).
+"""
+import os
+import json
+import time
+import threading
+
+from shared.candle_store import PROJECT_ROOT
+
+try:
+    import fcntl
+except ImportError:     # Windows: sin lock entre procesos
+    fcntl = None
+
+DEFAULT_DIR = os.environ.get('MARKET_CACHE_DIR', os.path.join(PROJECT_ROOT, 'data', 'market_cache'))
+DEFAULT_TTL = 6 * 3600
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+class MarketCache:
+    def __init__(self, exchange, data_dir=DEFAULT_DIR, ttl=DEFAULT_TTL, brackets=False, verbose=True):
+        """
+        exchange: cliente ccxt sincrónico.
+        brackets: también guarda los leverage brackets (endpoint privado: requiere API key).
+        """
+        self.exchange = exchange
+        self.ttl = ttl
+        self.brackets = brackets
+        self.verbose = verbose
+        market_type = (getattr(exchange, 'options', None) or {}).get('defaultType', 'spot')
+        self.path = os.path.join(data_dir, f"{exchange.id}_{market_type}.json")
+        self.updated = None
+        self.leverage = {}
+        self.refreshing = threading.Lock()
+        self.thread = None
+
+    # --- Disco ---
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, self.path)
+
+    def _apply(self, data):
+        self.exchange.set_markets(data['markets'], data.get('currencies'))
+        self.leverage = data.get('leverage') or {}
+        self.updated = data['updated']
+
+    def age(self):
+        return None if self.updated is None else time.time() - self.updated
+
+    def stale(self):
+        return self.updated is None or self.age() > self.ttl
+
+    # --- Carga / refresco ---
+
+    def load(self):
+        """Markets desde disco (sin red). Solo baja del exchange si no hay caché."""
+        data = self._read()
+        if data is None:
+            self.refresh()
+        else:
+            self._apply(data)
+            if self.stale():
+                self.refresh_async()
+        if (getattr(self.exchange, 'options', None) or {}).get('adjustForTimeDifference'):
+            self.exchange.load_time_difference()   # lo que load_markets hacía de paso
+        return self.exchange.markets
+
+    def refresh(self, force=False):
+        """Baja markets (y brackets) y reescribe el archivo. Con el lock, solo un proceso baja."""
+        with self.refreshing:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with _FileLock(self.path + '.lock'):
+                data = self._read()
+                if not force and data is not None and time.time() - data['updated'] <= self.ttl:
+                    self._apply(data)       # otro proceso ya lo refrescó
+                    return
+                t0 = time.perf_counter()
+                markets = self.exchange.load_markets(reload=True)
+                data = {'updated': time.time(), 'markets': markets,
+                        'currencies': getattr(self.exchange, 'currencies', None),
+                        'leverage': self._fetch_leverage()}
+                self._write(data)
+                self._apply(data)
+                if self.verbose:
+                    print(f"🗂️ Markets actualizados ({len(markets)}) en {time.perf_counter() - t0:.1f}s -> {self.path}")
+
+    def _fetch_leverage(self):
+        if not self.brackets or not getattr(self.exchange, 'apiKey', None):
+            return self.leverage
+        try:
+            return self.exchange.fetch_leverage_tiers()
+        except Exception as e:
+            if self.verbose:
+                print(f"⚠️ Leverage brackets no disponibles: {e}")
+            return self.leverage
+
+    def refresh_async(self):
+        """Refresco en un thread de fondo (no bloquea el arranque)."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._refresh_quiet, name='market-cache', daemon=True)
+        self.thread.start()
+
+    def _refresh_quiet(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            if self.verbose:
+                print(f"⚠️ Error refrescando markets (se sigue con la caché): {e}")
+
+    def start(self, interval=3600):
+        """Thread de fondo que refresca cada 'interval' segundos si el archivo venció."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                data = self._read()
+                if data is not None and data['updated'] != self.updated:
+                    self._apply(data)       # lo refrescó otro proceso
+                if self.stale():
+                    self._refresh_quiet()
+        threading.Thread(target=loop, name='market-cache-loop', daemon=True).start()
+        return self
+
+    # --- Consultas ---
+
+    def symbols(self):
+        return list(self.exchange.markets)
+
+    def market(self, symbol):
+        return self.exchange.market(symbol)
+
+    def precision(self, symbol):
+        """{'amount', 'price'} del mercado."""
+        return self.market(symbol)['precision']
+
+    def min_notional(self, symbol):
+        cost = self.market(symbol)['limits'].get('cost') or {}
+        return cost.get('min')
+
+    def leverage_tiers(self, symbol):
+        """Brackets de apalancamiento (lista ccxt) o None si no se guardaron."""
+        return self.leverage.get(self.market(symbol)['symbol'])
+
+
+def load_markets(exchange, **kwargs):
+    """Reemplazo de exchange.load_markets() usando la caché en disco. Devuelve el MarketCache."""
+    cache = MarketCache(exchange, **kwargs)
+    cache.load()
+    return cache
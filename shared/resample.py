@@ -0,0 +1,178 @@
+# shared/resample.py
+"""
+Resampleo multi-timeframe en una sola pasada desde la base de 1m.
+
+Se recorre la base (CandleStore 1m.candles o CSV de KlineLog) por chunks y se
+arman 5m/15m/1h/4h a la vez, con memoria acotada por el tamaño del chunk.
+Los resultados quedan al lado de la base ('1m.candles' -> '1m.4h.candles') y
+guardan en el header la firma del archivo base: si entra 1m nuevo, se rehacen.
+
+La agregación replica df.resample(tf).agg(first/max/min/last/sum).dropna()
+(la suma de volumen usa compensación de Kahan como el groupby de pandas).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from shared.candle_format import COLUMNS, PRICE_COLUMNS, EXT, write_candles, read_columns
+from shared.candle_store import timeframe_to_ms
+
+TIMEFRAMES = ('5m', '15m', '1h', '4h')
+CHUNK_ROWS = 500_000   # ~1 año de 1m por chunk (~24 MB)
+
+
+class _Aggregator:
+    """Estado de un timeframe: la última vela queda abierta entre chunks."""
+    def __init__(self, timeframe):
+        self.tf_ms = timeframe_to_ms(timeframe)
+        self.parts = []
+        self.carry = None   # dict con la vela abierta (y la compensación de la suma)
+
+    def feed(self, data):
+        ts = data['timestamp']
+        if not len(ts):
+            return
+        buckets = ts // self.tf_ms * self.tf_ms
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ts)]
+
+        bar = {'timestamp': buckets[starts],
+               'open': data['open'][starts],
+               'high': np.maximum.reduceat(data['high'], starts),
+               'low': np.minimum.reduceat(data['low'], starts),
+               'close': data['close'][ends - 1],
+               'last_ts': ts[ends - 1]}
+
+        # Suma de Kahan por grupo (vectorizada sobre grupos, secuencial dentro)
+        total = np.zeros(len(starts))
+        comp = np.zeros(len(starts))
+        carry = self.carry
+        merge = carry is not None and carry['timestamp'] == bar['timestamp'][0]
+        if merge:
+            total[0], comp[0] = carry['volume'], carry['comp']
+        sizes = ends - starts
+        volume = data['volume']
+        for k in range(int(sizes.max())):
+            g = np.flatnonzero(sizes > k)
+            val = volume[starts[g] + k]
+            ok = val == val
+            g, val = g[ok], val[ok]
+            y = val - comp[g]
+            t = total[g] + y
+            comp[g] = (t - total[g]) - y
+            total[g] = t
+        bar['volume'], bar['comp'] = total, comp
+
+        if merge:
+            bar['open'][0] = carry['open']
+            bar['high'][0] = max(bar['high'][0], carry['high'])
+            bar['low'][0] = min(bar['low'][0], carry['low'])
+        elif carry is not None:
+            self.parts.append({col: np.array([carry[col]]) for col in bar})
+
+        # La última vela puede seguir en el próximo chunk
+        self.carry = {col: arr[-1] for col, arr in bar.items()}
+        self.parts.append({col: arr[:-1] for col, arr in bar.items()})
+
+    def result(self, base_ms=None):
+        """Columnas finales. Con base_ms, la última vela solo entra si está completa."""
+        parts = list(self.parts)
+        carry = self.carry
+        if carry is not None and (base_ms is None or carry['last_ts'] >= carry['timestamp'] + self.tf_ms - base_ms):
+            parts.append({col: np.array([carry[col]]) for col in carry})
+        if not parts:
+            return {col: np.empty(0, dtype=np.int64 if col == 'timestamp' else float) for col in COLUMNS}
+        return {col: np.concatenate([p[col] for p in parts]) for col in COLUMNS}
+
+
+def resample_stream(chunks, timeframes=TIMEFRAMES, base_ms=None):
+    """
+    chunks: iterable de dicts de columnas (timestamp en ms + OHLCV), en orden.
+    Devuelve {timeframe: columnas}. Con base_ms (ej: 60000) se descarta la
+    última vela de cada timeframe si todavía no cerró en la base.
+    """
+    aggs = {tf: _Aggregator(tf) for tf in timeframes}
+    for data in chunks:
+        for agg in aggs.values():
+            agg.feed(data)
+    return {tf: agg.result(base_ms) for tf, agg in aggs.items()}
+
+
+def resample_frame(df, timeframe):
+    """
+    Igual que df.resample(tf).agg(ohlc).dropna() para un DataFrame con índice de
+    fechas y columnas OHLCV (open/Open, ...). Mantiene el estilo de las columnas.
+    """
+    names = {c.lower(): c for c in df.columns}
+    data = {'timestamp': df.index.values.astype('datetime64[ms]').astype(np.int64)}
+    for col in PRICE_COLUMNS:
+        data[col] = df[names[col]].to_numpy(dtype=float)
+    out = resample_stream([data], [timeframe])[timeframe]
+    index = pd.DatetimeIndex(out['timestamp'].astype('datetime64[ms]').astype(df.index.dtype), name=df.index.name)
+    return pd.DataFrame({names[col]: out[col] for col in PRICE_COLUMNS}, index=index)
+
+
+# --- Derivados en disco ---
+
+def derived_path(base_path, timeframe):
+    """'.../BTCUSDT/1m.candles' -> '.../BTCUSDT/1m.4h.candles' (al lado de la base)."""
+    return f"{os.path.splitext(base_path)[0]}.{timeframe}{EXT}"
+
+
+def _signature(base_path):
+    st = os.stat(base_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _iter_base(base_path, chunk_rows):
+    """Chunks de columnas desde un .candles (memmap) o un CSV de KlineLog."""
+    if base_path.endswith(EXT):
+        data, _ = read_columns(base_path)
+        n = len(data['timestamp'])
+        for lo in range(0, n, chunk_rows):
+            yield {col: np.asarray(data[col][lo:lo + chunk_rows]) for col in COLUMNS}
+    else:
+        from shared.kline_log import KlineLog
+        for df in KlineLog(base_path).iter_chunks():
+            for lo in range(0, len(df), chunk_rows):
+                part = df.iloc[lo:lo + chunk_rows]
+                data = {'timestamp': part['Open_Time'].values.astype('datetime64[ms]').astype(np.int64)}
+                for col in PRICE_COLUMNS:
+                    data[col] = part[col.capitalize()].to_numpy(dtype=float)
+                yield data
+
+
+def ensure_resampled(base_path, timeframes=TIMEFRAMES, base_tf='1m', chunk_rows=CHUNK_ROWS, verbose=False):
+    """
+    Deja al día los timeframes derivados de 'base_path'. Los que tengan otra
+    firma de la base se rehacen todos juntos en una sola pasada.
+    Devuelve {timeframe: ruta}.
+    """
+    paths = {tf: derived_path(base_path, tf) for tf in timeframes}
+    signature = _signature(base_path)
+    stale = []
+    for tf, path in paths.items():
+        meta = read_columns(path)[1] if os.path.exists(path) else None
+        if not meta or meta.get('source') != signature:
+            stale.append(tf)
+    if not stale:
+        return paths
+
+    results = resample_stream(_iter_base(base_path, chunk_rows), stale, timeframe_to_ms(base_tf))
+    for tf, data in results.items():
+        write_candles(paths[tf], data, meta={'source': signature, 'source_tf': base_tf})
+    if verbose:
+        print(f"🔁 {os.path.basename(base_path)} -> {', '.join(f'{tf}: {len(results[tf][COLUMNS[0]])}' for tf in stale)}")
+    return paths
+
+
+if __name__ == "__main__":
+    # Rehace los derivados de todas las bases 1m del store (y CSV de KlineLog indicados)
+    import sys
+    import glob
+    from shared.candle_store import DEFAULT_DIR
+
+    bases = sys.argv[1:] or glob.glob(os.path.join(DEFAULT_DIR, '*', '*', f'1m{EXT}'))
+    for base in bases:
+        ensure_resampled(base, verbose=True)
@@ -0,0 +1,193 @@
+# shared/result_cache.py
+"""
+Caché de resultados de backtests (SQLite en backtesting/data/results.sqlite).
+
+La clave de cada resultado es un hash de:
+  - el contenido de las velas (no el nombre del archivo: si entra data nueva, cambia)
+  - la versión del código (hash del fuente de la estrategia / simulador)
+  - el dict de parámetros
+Guarda el resumen, el log de trades y la curva de equity. Aparte guarda los
+DataFrames de indicadores, que solo dependen de las velas y del código de la
+estrategia: si cambian solo parámetros de ejecución (SL, TP, trailing...), se
+reusan sin recalcular.
+"""
+import io
+import json
+import time
+import hashlib
+import inspect
+import sqlite3
+import os
+
+import numpy as np
+import pandas as pd
+
+from shared.candle_store import PROJECT_ROOT
+
+DEFAULT_PATH = os.path.join(PROJECT_ROOT, 'backtesting', 'data', 'results.sqlite')
+
+
+def _digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def data_hash(data):
+    """Hash del contenido de un DataFrame (índice + columnas) o dict de arrays."""
+    h = _digest()
+    if isinstance(data, pd.DataFrame):
+        h.update(np.ascontiguousarray(np.asarray(data.index.values)).view(np.uint8))
+        items = [(col, data[col].to_numpy()) for col in data.columns]
+    else:
+        items = sorted(data.items())
+    for col, values in items:
+        values = np.ascontiguousarray(values)
+        h.update(f"{col}:{values.dtype.str}:{values.shape}".encode())
+        h.update(values.view(np.uint8) if values.dtype != object else repr(values.tolist()).encode())
+    return h.hexdigest()
+
+
+def source_hash(*objects):
+    """Versión del código: hash del fuente de módulos, clases o funciones."""
+    h = _digest()
+    for obj in objects:
+        try:
+            h.update(inspect.getsource(obj).encode())
+        except (OSError, TypeError):
+            h.update(repr(obj).encode())
+    return h.hexdigest()
+
+
+def params_hash(params):
+    return hashlib.blake2b(json.dumps(params, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+def make_key(*parts):
+    """Clave compuesta (partes ya hasheadas o textos cortos)."""
+    return hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+def _to_json(value):
+    return json.dumps(value, default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, (np.integer,)): return int(value)
+    if isinstance(value, (np.floating,)): return float(value)
+    if isinstance(value, (np.bool_,)): return bool(value)
+    if isinstance(value, (pd.Timestamp, np.datetime64)): return str(pd.Timestamp(value))
+    if isinstance(value, np.ndarray): return value.tolist()
+    return str(value)
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, created REAL, summary TEXT, trades TEXT, equity TEXT)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS frames (
+            key TEXT PRIMARY KEY, created REAL, data BLOB)''')
+        self.db.commit()
+
+    # --- Resultados ---
+
+    def get(self, key):
+        """{'summary', 'trades', 'equity'} o None."""
+        row = self.db.execute('SELECT summary, trades, equity FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        summary, trades, equity = (json.loads(x) if x is not None else None for x in row)
+        return {'summary': summary, 'trades': trades, 'equity': equity}
+
+    def put(self, key, summary, trades=None, equity=None):
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                        (key, time.time(), _to_json(summary),
+                         _to_json(trades) if trades is not None else None,
+                         _to_json(equity) if equity is not None else None))
+        self.db.commit()
+
+    def get_many(self, keys):
+        """{key: summary} de las claves que ya están (para filtrar tareas de un sweep)."""
+        found = {}
+        keys = list(keys)
+        for lo in range(0, len(keys), 500):
+            chunk = keys[lo:lo + 500]
+            rows = self.db.execute(f"SELECT key, summary FROM results WHERE key IN ({','.join('?' * len(chunk))})",
+                                   chunk).fetchall()
+            found.update((k, json.loads(s)) for k, s in rows)
+        return found
+
+    # --- DataFrames de indicadores ---
+
+    def get_frame(self, key):
+        row = self.db.execute('SELECT data FROM frames WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with np.load(io.BytesIO(row[0]), allow_pickle=False) as npz:
+            meta = json.loads(str(npz['__meta__']))
+            index = pd.Index(npz['__index__'], name=meta['index_name'])
+            return pd.DataFrame({col: npz[f"c{i}"] for i, col in enumerate(meta['columns'])}, index=index)
+
+    def put_frame(self, key, df):
+        """Guarda un DataFrame de columnas numéricas/bool/fechas (sin objetos)."""
+        arrays = {f"c{i}": df[col].to_numpy() for i, col in enumerate(df.columns)}
+        if any(a.dtype == object for a in arrays.values()):
+            return False
+        meta = {'columns': list(df.columns), 'index_name': df.index.name}
+        buf = io.BytesIO()
+        np.savez(buf, __meta__=np.array(json.dumps(meta)), __index__=np.asarray(df.index.values), **arrays)
+        self.db.execute('INSERT OR REPLACE INTO frames VALUES (?, ?, ?)', (key, time.time(), buf.getvalue()))
+        self.db.commit()
+        return True
+
+    def close(self):
+        self.db.close()
+
+
+_CACHE = None
+
+
+def get_cache():
+    """Caché compartido del proceso (desactivable con BACKTEST_CACHE=0)."""
+    global _CACHE
+    if os.environ.get('BACKTEST_CACHE', '1') == '0':
+        return None
+    if _CACHE is None:
+        _CACHE = ResultCache()
+    return _CACHE
+
+
+def cached_indicators(df, compute, *sources, cache=None):
+    """
+    compute(df) con caché: clave = contenido de df + fuente de 'compute' (y 'sources').
+    Sin caché (BACKTEST_CACHE=0) simplemente calcula.
+    """
+    cache = cache or get_cache()
+    if cache is None:
+        return compute(df)
+    key = make_key('frame', data_hash(df), source_hash(compute, *sources))
+    frame = cache.get_frame(key)
+    if frame is None:
+        frame = compute(df)
+        cache.put_frame(key, frame)
+    return frame
+
+
+def cached_result(key, compute, cache=None):
+    """
+    compute() -> (summary, trades, equity). Si la clave ya está, no se corre nada.
+    Devuelve {'summary', 'trades', 'equity'} (siempre en su forma JSON, con o sin caché).
+    """
+    cache = cache or get_cache()
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    summary, trades, equity = compute()
+    if cache is None:
+        return {name: json.loads(_to_json(value)) if value is not None else None
+                for name, value in (('summary', summary), ('trades', trades), ('equity', equity))}
+    cache.put(key, summary, trades, equity)
+    return cache.get(key)
@@ -0,0 +1,245 @@
+# shared/sweep.py
+"""
+Barrido de parámetros en paralelo (pool de procesos) para labs y backtests.
+
+- Las grillas son dicts {param: [valores]}; se expanden a todas las combinaciones.
+- Los arrays de velas/indicadores de cada símbolo se copian UNA vez a memoria
+  compartida (multiprocessing.shared_memory): los workers los mapean sin
+  recargar ni recalcular nada.
+- Cada resultado se agrega como una línea JSON al archivo de resultados
+  apenas llega. Si la corrida se corta (Ctrl+C, corte de luz), al relanzarla
+  se saltean las combinaciones que ya están en el archivo.
+- Cada línea lleva un 'stamp' (hash de las velas del dataset + version). Solo
+  cuentan como hechas (y solo entran en ranking) las líneas con el stamp
+  actual: si cambian las velas o el código, se vuelve a evaluar todo.
+- Una combinación que tiró excepción queda como {'error': ...} pero no cuenta
+  como hecha: se reintenta en la próxima corrida y la línea nueva reemplaza a
+  la del error.
+
+La función de evaluación es evaluate(arrays, params) -> dict de métricas, a nivel
+de módulo (el pool la importa por nombre) y sin estado global.
+
+Con version= (hash del código de la simulación) las métricas además se guardan
+en el caché de resultados (shared.result_cache) por contenido de los arrays +
+versión + parámetros: otro sweep sobre las mismas velas no recalcula nada,
+aunque el JSONL sea nuevo; si cambian las velas o el código, la clave cambia.
+"""
+import os
+import json
+import time
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from shared.candle_store import PROJECT_ROOT
+from shared.result_cache import get_cache, make_key, data_hash, params_hash
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'backtesting', 'data', 'sweeps')
+
+# Estado de cada worker (se carga en el initializer)
+_ARRAYS = {}
+_EVALUATE = None
+_HANDLES = []
+
+
+def expand_grid(grid):
+    """{'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def task_key(dataset, params):
+    """Clave estable de una combinación (para saltear las ya hechas)."""
+    return f"{dataset}|{json.dumps(params, sort_keys=True)}"
+
+
+class SharedArrays:
+    """
+    {dataset: {columna: ndarray}} copiado a bloques de memoria compartida.
+    'spec' es lo único que viaja a los workers (nombres, dtype y shape).
+    """
+    def __init__(self, datasets):
+        self.blocks = []
+        self.spec = {}
+        for name, columns in datasets.items():
+            self.spec[name] = {}
+            for col, values in columns.items():
+                values = np.ascontiguousarray(values)
+                shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+                self.blocks.append(shm)
+                self.spec[name][col] = (shm.name, values.dtype.str, values.shape)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec):
+    """Mapea los bloques de 'spec' como arrays de solo lectura (sin copiar)."""
+    arrays = {}
+    for name, columns in spec.items():
+        arrays[name] = {}
+        for col, (shm_name, dtype, shape) in columns.items():
+            # Los workers comparten el resource tracker del padre: el unlink lo hace SharedArrays.close()
+            shm = shared_memory.SharedMemory(name=shm_name)
+            _HANDLES.append(shm)
+            values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            values.flags.writeable = False
+            arrays[name][col] = values
+    return arrays
+
+
+def _init_worker(spec, evaluate):
+    global _ARRAYS, _EVALUATE
+    _ARRAYS = attach(spec)
+    _EVALUATE = evaluate
+
+
+def _run_task(task):
+    dataset, params = task
+    try:
+        metrics = _EVALUATE(_ARRAYS[dataset], params)
+    except Exception as e:
+        metrics = {'error': f"{type(e).__name__}: {e}"}
+    return dataset, params, metrics
+
+
+def results_path(name):
+    """Archivo JSONL de resultados de un sweep ('breakout_1h' -> .../sweeps/breakout_1h.jsonl)."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    return os.path.join(RESULTS_DIR, f"{name}.jsonl")
+
+
+def _repair(path):
+    """Corta una última línea a medio escribir antes de seguir agregando."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        raw = f.read()
+        if raw and not raw.endswith(b'\n'):
+            f.truncate(raw.rfind(b'\n') + 1)
+
+
+def load_results(path):
+    """Resultados guardados (ignora una última línea cortada por un corte)."""
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path) as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def current_results(path, stamps=None):
+    """
+    Resultados con el stamp vigente de cada dataset: el de 'stamps' o, si no se
+    pasa, el de la última línea escrita para ese dataset (la corrida más nueva).
+    Si una combinación aparece más de una vez (reintento de un error), queda la última.
+    """
+    rows = load_results(path)
+    if stamps is None:
+        stamps = {r['dataset']: r.get('stamp') for r in rows}
+    latest = {task_key(r['dataset'], r['params']): r for r in rows
+              if r['dataset'] in stamps and r.get('stamp') == stamps[r['dataset']]}
+    return list(latest.values())
+
+
+def ranking(path, metric, top=20, min_trades=0):
+    """Tabla ordenada por 'metric' (desc) con una columna por parámetro y métrica."""
+    rows = [{'dataset': r['dataset'], **r['params'], **r['metrics']}
+            for r in current_results(path) if 'error' not in r['metrics']]
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    if min_trades and 'trades' in df:
+        df = df[df['trades'] >= min_trades]
+    return df.sort_values(metric, ascending=False).head(top).reset_index(drop=True)
+
+
+def _cache_keys(hashes, tasks, version):
+    return {(name, task_key(name, params)): make_key('sweep', hashes[name], version, params_hash(params))
+            for name, params in tasks}
+
+
+def run_sweep(datasets, grid, evaluate, path, workers=None, chunksize=4,
+              metric=None, report_every=200, version=None):
+    """
+    Evalúa cada (dataset x combinación de 'grid') en un pool de 'workers'
+    procesos y va agregando los resultados a 'path' (JSONL).
+    version: hash del código evaluado; habilita el caché de resultados y
+    entra en el stamp de cada línea (cambiar el código invalida el JSONL).
+    Devuelve la cantidad de combinaciones evaluadas en esta corrida.
+    """
+    combos = expand_grid(grid) if isinstance(grid, dict) else list(grid)
+    _repair(path)
+    hashes = {name: data_hash(columns) for name, columns in datasets.items()}
+    stamps = {name: make_key(hashes[name], version) for name in datasets}
+    # Las que fallaron no cuentan como hechas: se vuelven a correr
+    done = {task_key(r['dataset'], r['params']) for r in current_results(path, stamps)
+            if 'error' not in r['metrics']}
+    tasks = [(name, params) for name in datasets for params in combos
+             if task_key(name, params) not in done]
+    total = len(datasets) * len(combos)
+
+    cache = get_cache() if version is not None else None
+    keys = {}
+    if cache is not None and tasks:
+        keys = _cache_keys(hashes, tasks, version)
+        hits = cache.get_many(keys.values())
+        if hits:
+            with open(path, 'a') as out:
+                for name, params in tasks:
+                    metrics = hits.get(keys[(name, task_key(name, params))])
+                    if metrics is not None:
+                        out.write(json.dumps({'dataset': name, 'params': params, 'metrics': metrics,
+                                              'stamp': stamps[name]}) + '\n')
+            tasks = [(name, params) for name, params in tasks
+                     if keys[(name, task_key(name, params))] not in hits]
+            print(f"💾 {len(hits)} combinaciones recuperadas del caché de resultados")
+
+    print(f"🧮 Sweep: {total} combinaciones ({total - len(tasks)} ya hechas, {len(tasks)} pendientes)")
+    if not tasks:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    finished = 0
+    best = None
+    t0 = time.perf_counter()
+    with SharedArrays(datasets) as shared, open(path, 'a') as out:
+        with mp.Pool(workers, initializer=_init_worker, initargs=(shared.spec, evaluate)) as pool:
+            try:
+                for dataset, params, metrics in pool.imap_unordered(_run_task, tasks, chunksize):
+                    out.write(json.dumps({'dataset': dataset, 'params': params, 'metrics': metrics,
+                                          'stamp': stamps[dataset]}) + '\n')
+                    out.flush()
+                    if keys and 'error' not in metrics:
+                        cache.put(keys[(dataset, task_key(dataset, params))], metrics)
+                    finished += 1
+                    if metric and metric in metrics and (best is None or metrics[metric] > best[2][metric]):
+                        best = (dataset, params, metrics)
+                    if finished % report_every == 0 or finished == len(tasks):
+                        rate = finished / (time.perf_counter() - t0)
+                        line = f"   ⏳ {finished}/{len(tasks)} ({rate:.1f}/s)"
+                        if best:
+                            line += f" | mejor {metric}: {best[2][metric]:.2f} ({best[0]})"
+                        print(line)
+            except KeyboardInterrupt:
+                pool.terminate()
+                print(f"\n⏹️ Sweep interrumpido: {finished} resultados guardados en {path}")
+    return finished
@@ -0,0 +1,58 @@
+# shared/timeline.py
+"""
+Eje de tiempo común para simular una cartera de varios símbolos.
+
+Todos los símbolos se alinean sobre un único eje int64 (ms) = unión de sus
+velas nativas. En vez de resamplear a 1h con ffill (copias) y buscar fechas en
+cada índice de pandas en cada paso, se precalcula con searchsorted:
+  pos[s, t]    -> índice de la vela nativa vigente en t (-1 si todavía no hay)
+  valid[s, t]  -> en t abre una vela nueva del símbolo (hay que evaluarlo)
+  values[s, t, f] -> campo f de esa vela (NaN antes de la primera)
+Así el bucle de cartera trabaja solo con enteros, y la estrategia recibe la
+ventana nativa como vista (shared.bar_view) sin cortar DataFrames.
+"""
+import numpy as np
+import pandas as pd
+
+from shared.bar_view import BarFrame
+
+
+def index_to_ms(index):
+    """DatetimeIndex -> np.int64 en ms."""
+    return np.asarray(index.values.astype('datetime64[ms]').astype(np.int64))
+
+
+class Timeline:
+    def __init__(self, frames, fields=('Open', 'High', 'Low', 'Close')):
+        """frames: {symbol: DataFrame con índice de fechas (ordenado, sin duplicados)}."""
+        self.symbols = list(frames)
+        self.fields = list(fields)
+        self.frames = [BarFrame(df) for df in frames.values()]
+
+        native = [index_to_ms(df.index) for df in frames.values()]
+        self.ts = np.unique(np.concatenate(native)) if native else np.empty(0, dtype=np.int64)
+        self.dates = pd.to_datetime(self.ts, unit='ms').tolist()
+
+        shape = (len(self.symbols), len(self.ts))
+        self.pos = np.empty(shape, dtype=np.int64)
+        self.valid = np.zeros(shape, dtype=bool)
+        self.values = np.full(shape + (len(self.fields),), np.nan)
+        for k, (ts, df) in enumerate(zip(native, frames.values())):
+            pos = np.searchsorted(ts, self.ts, side='right') - 1
+            seen = pos >= 0
+            self.pos[k] = pos
+            self.valid[k] = seen & (ts[np.maximum(pos, 0)] == self.ts) if len(ts) else False
+            for f, field in enumerate(self.fields):
+                if field in df.columns:
+                    self.values[k, seen, f] = df[field].to_numpy(dtype=float)[pos[seen]]
+
+    def __len__(self):
+        return len(self.ts)
+
+    def field(self, name):
+        """Matriz (símbolos x tiempo) de un campo (vista, sin copiar)."""
+        return self.values[:, :, self.fields.index(name)]
+
+    def window(self, k, t):
+        """Velas nativas del símbolo k hasta la vigente en t (como df.iloc[:pos+1])."""
+        return self.frames[k].window(int(self.pos[k, t]))
@@ -0,0 +1,129 @@
+# shared/walk_forward.py
+"""
+Walk-forward: optimizar en una ventana de train, validar en la siguiente de
+test y encadenar los tramos de test en una sola curva out-of-sample.
+
+Los indicadores se calculan UNA vez sobre todo el historial de cada símbolo
+(todas las ventanas que comparten velas comparten el cálculo, y ninguna
+arranca "en frío") y viajan a los workers en memoria compartida vía
+shared.sweep. Cada ventana es una tarea del pool: corre la grilla completa
+en train, elige la mejor combinación y la evalúa en test. Los resultados van
+al mismo JSONL reanudable del sweep, con una versión que incluye la grilla,
+la métrica, min_trades y el código de la simulación: si cambia cualquiera,
+las ventanas se vuelven a correr en vez de servir el "mejor" viejo.
+
+Contrato de la simulación: simulate(arrays, params, lo, hi) -> [(índice, r, ...)]
+con entradas en las velas [lo, hi) de los arrays (que incluyen 'timestamp' en ms).
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from shared.candle_format import to_ms
+from shared.sweep import expand_grid, run_sweep, current_results
+from shared.result_cache import make_key, params_hash, source_hash
+
+
+def make_windows(start, end, train, test, step=None, anchored=False):
+    """
+    Ventanas [train_start, train_end) + [train_end, test_end) en ms.
+    train/test/step: offsets de pandas ('180D', '8W', ...); step = test por defecto.
+    anchored=True: el train siempre arranca en 'start' y va creciendo.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    train, test = to_offset(train), to_offset(test)
+    step = to_offset(step) if step else test
+    windows = []
+    cursor = start
+    while True:
+        train_start = start if anchored else cursor
+        train_end = cursor + train
+        if train_end >= end:
+            break
+        test_end = min(train_end + test, end)
+        windows.append({'train': [to_ms(train_start), to_ms(train_end)],
+                        'test': [to_ms(train_end), to_ms(test_end)]})
+        cursor += step
+    return windows
+
+
+def summarize(r):
+    """Métricas de una lista de R por trade."""
+    r = np.asarray(r, dtype=float)
+    if not len(r):
+        return {'trades': 0, 'net_r': 0.0, 'win_rate': 0.0, 'avg_r': 0.0}
+    return {'trades': len(r), 'net_r': float(r.sum()),
+            'win_rate': float((r > 0).mean()), 'avg_r': float(r.mean())}
+
+
+def _bounds(timestamps, span):
+    lo, hi = np.searchsorted(timestamps, span, side='left')
+    return int(lo), int(hi)
+
+
+def run_window(arrays, window, simulate, grid, metric='net_r', min_trades=0):
+    """Una ventana (corre en un worker): grilla en train, la mejor en test."""
+    ts = arrays['timestamp']
+    train_lo, train_hi = _bounds(ts, window['train'])
+    test_lo, test_hi = _bounds(ts, window['test'])
+
+    best, best_train = None, None
+    for params in expand_grid(grid):
+        stats = summarize([t[1] for t in simulate(arrays, params, train_lo, train_hi)])
+        if stats['trades'] < min_trades:
+            continue
+        if best_train is None or stats[metric] > best_train[metric]:
+            best, best_train = params, stats
+    if best is None:
+        return {'best': None, 'train': summarize([]), 'test': summarize([]), 'oos': []}
+
+    trades = simulate(arrays, best, test_lo, test_hi)
+    oos = [[int(ts[t[0]]), float(t[1])] for t in trades]
+    return {'best': best, 'train': best_train, 'test': summarize([r for _, r in oos]), 'oos': oos}
+
+
+def walk_forward(datasets, windows, simulate, grid, path, metric='net_r', min_trades=0, workers=None,
+                 version=None):
+    """
+    Corre todas las ventanas de todos los datasets en paralelo (reanudable).
+    version: hash del código de la simulación (por defecto el fuente de 'simulate';
+    pasarlo si simulate depende de otros módulos).
+    Devuelve (resumen por ventana, curva OOS encadenada).
+    """
+    task = functools.partial(run_window, simulate=simulate, grid=grid, metric=metric, min_trades=min_trades)
+    version = make_key('walk_forward', version or source_hash(simulate), source_hash(run_window),
+                       params_hash(grid), metric, min_trades)
+    run_sweep(datasets, windows, task, path, workers=workers, version=version)
+    return report(path, datasets, windows)
+
+
+def report(path, datasets=None, windows=None):
+    """Resumen por ventana y curva OOS (R acumulado, ordenado por tiempo)."""
+    keys = {(w['train'][0], w['test'][0]) for w in windows} if windows else None
+    rows, oos = [], []
+    for r in current_results(path):
+        if datasets is not None and r['dataset'] not in datasets: continue
+        window, result = r['params'], r['metrics']
+        if keys is not None and (window['train'][0], window['test'][0]) not in keys: continue
+        if 'error' in result:
+            print(f"   ❌ {r['dataset']} {window}: {result['error']}")
+            continue
+        rows.append({'dataset': r['dataset'],
+                     'test_start': pd.to_datetime(window['test'][0], unit='ms'),
+                     'test_end': pd.to_datetime(window['test'][1], unit='ms'),
+                     'best': result['best'],
+                     **{f"train_{k}": v for k, v in result['train'].items()},
+                     **{f"test_{k}": v for k, v in result['test'].items()}})
+        oos += [(r['dataset'], ts, value) for ts, value in result['oos']]
+
+    summary = pd.DataFrame(rows)
+    if not summary.empty:
+        summary = summary.sort_values(['test_start', 'dataset']).reset_index(drop=True)
+    curve = pd.DataFrame(oos, columns=['dataset', 'timestamp', 'r'])
+    if not curve.empty:
+        curve['timestamp'] = pd.to_datetime(curve['timestamp'], unit='ms')
+        curve = curve.sort_values(['timestamp', 'dataset'], kind='stable').reset_index(drop=True)
+        curve['cum_r'] = curve['r'].cumsum()
+    return summary, curve
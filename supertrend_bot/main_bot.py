@@ -5,12 +5,20 @@ import numpy as np
 import talib
 import time
 import os
+import sys
 import requests
 import json
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.resample import resample_frame
+from shared.kline_feed import KlineFeed
+from shared.bar_scheduler import BarScheduler
+from shared.account_snapshot import AccountSnapshot
+from shared.market_cache import load_markets
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -46,6 +54,9 @@ SL_ATR_MULT = 3.0
 
 # --- SISTEMA ---
 DRY_RUN = False        # ¡DINERO REAL!
+KLINE_FEED = True      # Velas 1H por WebSocket (REST de respaldo si el feed no está conectado)
+HISTORY = 1000
+BAR_SETTLE = 10        # Segundos tras el cierre de la vela 1H antes de analizar
 STATE_FILE = "bot_state.json"
 
 # ======================================================
@@ -78,29 +89,30 @@ def get_exchange():
         'options': {'defaultType': 'future'},
         'enableRateLimit': True
     })
-    exchange.load_markets()
+    load_markets(exchange).start()   # caché en disco + refresco de fondo
     return exchange
 
 # ======================================================
 #  LÓGICA CORE (CEREBRO)
 # ======================================================
 
-def analyze_symbol(exchange, symbol):
+def analyze_symbol(exchange, symbol, feed=None):
     print(f"🔍 Analizando {symbol}...")
-    try:
-        # Descarga con margen suficiente
-        ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=1000)
-    except Exception as e:
-        print(f"Error descargando {symbol}: {e}")
-        return None
+    df = feed.frame(symbol, TIMEFRAME) if feed is not None and feed.connected.is_set() else None
+    if df is None:
+        try:
+            # Descarga con margen suficiente
+            ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME, limit=HISTORY)
+        except Exception as e:
+            print(f"Error descargando {symbol}: {e}")
+            return None
 
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
     df.set_index('timestamp', inplace=True)
 
-    # Resampling 4H
-    ohlc_dict = {'open':'first', 'high':'max', 'low':'min', 'close':'last', 'volume':'sum'}
-    df_4h = df.resample(RESAMPLE_TF).agg(ohlc_dict).dropna()
+    # Resampling 4H (mismo agregador que los derivados de backtest)
+    df_4h = resample_frame(df, RESAMPLE_TF)
 
     # Indicadores
     df_4h['ema_fast'] = talib.EMA(df_4h['close'], timeperiod=FAST_EMA)
@@ -137,19 +149,15 @@ def analyze_symbol(exchange, symbol):
 #  EJECUCIÓN DE ÓRDENES (AUDITED)
 # ======================================================
 
-def execute_logic(exchange, data):
+def execute_logic(exchange, data, account):
     symbol = data['symbol']
     price = data['price']
     
     # --- FIX 2: LECTURA ROBUSTA DE POSICIÓN ---
     pos_amt = 0.0
     try:
-        positions = exchange.fetch_positions([symbol])
-        target_pos = None
-        for p in positions:
-            if p['symbol'] == symbol:
-                target_pos = p
-                break
+        # Desde la foto de la cuenta del ciclo (sin fetch_positions por símbolo)
+        target_pos = account.position(symbol)
         
         # Lectura segura: Si es None o vacío, devuelve 0
         if target_pos:
@@ -190,7 +198,7 @@ def execute_logic(exchange, data):
         
         if not DRY_RUN:
             try:
-                balance = exchange.fetch_balance()['USDT']['free']
+                balance = account.balance('USDT', 'free')
                 risk_amt = balance * RISK_PER_TRADE
                 
                 sl_dist = data['atr'] * SL_ATR_MULT
@@ -218,6 +226,7 @@ def execute_logic(exchange, data):
                 # 1. MARKET BUY
                 print(f"   🛒 Enviando Market Buy: {qty_contracts}")
                 order = exchange.create_market_buy_order(symbol, qty_contracts)
+                account.invalidate()    # ya hay posición aunque falle el SL
                 
                 # --- FIX 4: CÁLCULO DE SL POST-ENTRY ---
                 # Usamos el precio real de ejecución ('average'), no el del ticker
@@ -249,6 +258,7 @@ def execute_logic(exchange, data):
             try:
                 # 1. Close Position
                 exchange.create_market_sell_order(symbol, pos_amt, {'reduceOnly': True})
+                account.invalidate()
                 # 2. Cancelar SL pendiente
                 exchange.cancel_all_orders(symbol)
                 
@@ -266,24 +276,25 @@ def main():
     send_telegram("🤖 **Bot Iniciado (Audit Version)**\nModo: DINERO REAL")
     
     exchange = get_exchange()
+    feed = KlineFeed([(s, TIMEFRAME) for s in SYMBOLS], rest=exchange, history=HISTORY).start() if KLINE_FEED else None
+    
+    scheduler = BarScheduler(TIMEFRAME, offset=BAR_SETTLE)
+    account = AccountSnapshot(exchange)
     
     while True:
         try:
-            print(f"\n🕒 Scan: {datetime.now().strftime('%H:%M')}")
+            # Una vez por vela 1H cerrada
+            wake = scheduler.wait()
+            print(f"\n🕒 Scan: {datetime.now().strftime('%H:%M')} (despertar +{wake.late:.1f}s)")
             
             for symbol in SYMBOLS:
-                data = analyze_symbol(exchange, symbol)
+                data = analyze_symbol(exchange, symbol, feed)
                 if data:
-                    execute_logic(exchange, data)
-                time.sleep(2) # Respetar rate limits
+                    execute_logic(exchange, data, account)
+                if feed is None: time.sleep(2) # Respetar rate limits
             
             print("😴 Durmiendo...")
             
-            # Sincronización precisa con la vela de 1H
-            now = datetime.now()
-            sleep_sec = 3600 - (now.minute * 60 + now.second) + 10 # +10s buffer
-            time.sleep(sleep_sec)
-            
         except KeyboardInterrupt:
             print("\n🛑 Detenido.")
             break